@@ -0,0 +1,130 @@
+"""
+Operations of aki batch: aki commands read from a file and run in one process.
+Copies that do not depend on each other run in parallel, container restarts are done once at the end.
+"""
+import argparse
+import shlex
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Union
+
+from aki.error import ScriptError
+from aki.volume import Volume
+
+DEFAULT_BATCH_PARALLEL = 4
+
+BATCH_FORBIDDEN_ACTIONS = ['batch', 'watch', 'completion', 'version']
+# Value of the source of cp that reads the current volume, the copy depends on what ran before
+_CURRENT_SOURCE = '_current'
+
+
+@dataclass(frozen=True)
+class BatchOperation:
+    line_number: int
+    line: str
+    arguments: argparse.Namespace
+
+    def __str__(self):
+        return f'[{self.line_number}] {self.line}'
+
+
+class DeferredRestart:
+    """
+    Container restarts requested by the operations of a batch, done once when the batch ends
+    """
+
+    def __init__(self):
+        self.is_pending = False
+
+
+class VolumeListCache:
+    """
+    Volumes listed once by type for the whole batch, updated by the volumes aki creates and removes
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._volumes_by_type: Dict[str, Dict[str, Volume]] = {}
+
+    def fetch_volumes(self, volume_type: str) -> Union[List[Volume], None]:
+        """
+        Return volumes of the type, None if they are not listed yet
+        """
+        with self._lock:
+            volumes = self._volumes_by_type.get(volume_type)
+            return list(volumes.values()) if volumes is not None else None
+
+    def set_volumes(self, volume_type: str, volumes: Iterable[Volume]):
+        with self._lock:
+            self._volumes_by_type[volume_type] = {volume.aki_name: volume for volume in volumes}
+
+    def add(self, volume_type: str, volume: Volume):
+        with self._lock:
+            if volume_type in self._volumes_by_type:
+                self._volumes_by_type[volume_type][volume.aki_name] = volume
+
+    def remove(self, volume_type: str, volume: Volume):
+        with self._lock:
+            self._volumes_by_type.get(volume_type, {}).pop(volume.aki_name, None)
+
+
+def read_operations(lines: Iterable[str], parse: Callable[[List[str]], argparse.Namespace]) -> List[BatchOperation]:
+    """
+    Parse the lines of a batch, one aki command without `aki` by line. Empty lines and comments (#) are skipped
+    """
+    operations = []
+    for line_number, line in enumerate(lines, start=1):
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError as e:
+            raise ScriptError(f'Line {line_number} of batch is invalid : {e}')
+        if not tokens:
+            continue
+
+        try:
+            arguments = parse(tokens)
+        except ScriptError as e:
+            raise ScriptError(f'Line {line_number} of batch is invalid : {e}')
+
+        if arguments.action in BATCH_FORBIDDEN_ACTIONS:
+            raise ScriptError(f'Line {line_number} of batch is invalid : action {arguments.action} cannot be batched')
+        if arguments.file or arguments.workspace:
+            raise ScriptError(f'Line {line_number} of batch is invalid : options --file and --workspace apply to the '
+                              f'whole batch')
+        if arguments.action == 'cp' and not arguments.switch_to_copy:
+            # Nobody can answer the question, a batch copy keeps the current volume unless asked
+            arguments.no_switch_to_copy = True
+
+        operations.append(BatchOperation(line_number, line.strip(), arguments))
+
+    return operations
+
+
+def plan_stages(operations: List[BatchOperation]) -> List[List[BatchOperation]]:
+    """
+    Split operations in stages run one after the other. Consecutive copies that neither read nor write the volumes
+    written by the others share a stage and run in parallel, any other operation is a stage on its own
+    """
+    stages: List[List[BatchOperation]] = []
+    sources = set()
+    destinations = set()
+    for operation in operations:
+        if _is_parallel_copy(operation) and stages and all(_is_parallel_copy(other) for other in stages[-1]) \
+                and operation.arguments.source not in destinations \
+                and operation.arguments.destination not in sources | destinations:
+            stages[-1].append(operation)
+        else:
+            stages.append([operation])
+            sources = set()
+            destinations = set()
+
+        if operation.arguments.action == 'cp':
+            sources.add(operation.arguments.source)
+            destinations.add(operation.arguments.destination)
+
+    return stages
+
+
+def _is_parallel_copy(operation: BatchOperation) -> bool:
+    arguments = operation.arguments
+    return arguments.action == 'cp' and not arguments.switch_to_copy and arguments.source != _CURRENT_SOURCE
@@ -0,0 +1,111 @@
+from typing import Dict, Iterable, Iterator, List, Union
+
+from aki.volume import Volume
+
+
+def volume_sort_key(aki_name: str):
+    """
+    Order of volumes printed to the user
+    """
+    return aki_name.casefold(), aki_name
+
+
+class CatalogEntry:
+    """
+    Volumes of an aki name. Bit i of presence is set if the volume exists for the type i of the catalog
+    """
+    __slots__ = ('aki_name', 'presence', 'volumes')
+
+    def __init__(self, aki_name: str, type_count: int):
+        self.aki_name = aki_name
+        self.presence = 0
+        self.volumes: List[Union[Volume, None]] = [None] * type_count
+
+    def __repr__(self):
+        return f'CatalogEntry({self.aki_name!r}, {self.presence:#b})'
+
+
+class VolumeCatalog:
+    """
+    Volumes of a command indexed by aki name and type, built once from the fetched volumes
+    """
+
+    def __init__(self, volume_types: Iterable[str]):
+        self.volume_types: List[str] = list(volume_types)
+        self._index_by_type: Dict[str, int] = {volume_type: index for index, volume_type in enumerate(self.volume_types)}
+        self._all_types_presence = (1 << len(self.volume_types)) - 1
+        self._entry_by_aki_name: Dict[str, CatalogEntry] = {}
+
+    def add(self, volume_type: str, volume: Volume):
+        index = self._index_by_type[volume_type]
+        entry = self._entry_by_aki_name.get(volume.aki_name)
+        if entry is None:
+            entry = CatalogEntry(volume.aki_name, len(self.volume_types))
+            self._entry_by_aki_name[volume.aki_name] = entry
+
+        entry.volumes[index] = volume
+        entry.presence |= 1 << index
+
+    def add_all(self, volume_type: str, volumes: Iterable[Volume]):
+        for volume in volumes:
+            self.add(volume_type, volume)
+
+    def __len__(self):
+        return len(self._entry_by_aki_name)
+
+    def __contains__(self, aki_name: str):
+        return aki_name in self._entry_by_aki_name
+
+    def entry(self, aki_name: str) -> Union[CatalogEntry, None]:
+        return self._entry_by_aki_name.get(aki_name)
+
+    def volume(self, aki_name: str, volume_type: str) -> Union[Volume, None]:
+        entry = self._entry_by_aki_name.get(aki_name)
+        return entry.volumes[self._index_by_type[volume_type]] if entry else None
+
+    def volume_by_type(self, entry: CatalogEntry) -> Dict[str, Volume]:
+        return {
+            volume_type: volume
+            for volume_type, volume in zip(self.volume_types, entry.volumes)
+            if volume is not None
+        }
+
+    def type_presence(self, volume_types: Iterable[str]) -> int:
+        """
+        Presence bits of the types
+        """
+        presence = 0
+        for volume_type in volume_types:
+            presence |= 1 << self._index_by_type[volume_type]
+        return presence
+
+    def missing_types(self, aki_name: str) -> List[str]:
+        """
+        Types that do not have a volume named aki_name
+        """
+        entry = self._entry_by_aki_name.get(aki_name)
+        presence = entry.presence if entry else 0
+        if presence == self._all_types_presence:
+            return []
+
+        return [volume_type for index, volume_type in enumerate(self.volume_types) if not presence & (1 << index)]
+
+    def entries(self) -> Iterator[CatalogEntry]:
+        return iter(self._entry_by_aki_name.values())
+
+    def sorted_entries(self) -> List[CatalogEntry]:
+        return sorted(self._entry_by_aki_name.values(), key=lambda entry: volume_sort_key(entry.aki_name))
+
+    def volumes(self, volume_type: str) -> Iterator[Volume]:
+        index = self._index_by_type[volume_type]
+        bit = 1 << index
+        return (entry.volumes[index] for entry in self._entry_by_aki_name.values() if entry.presence & bit)
+
+    def volumes_by_type(self) -> Dict[str, List[Volume]]:
+        """
+        Volumes grouped by type, as given to actions of use not found
+        """
+        return {volume_type: list(self.volumes(volume_type)) for volume_type in self.volume_types}
+
+    def is_empty(self) -> bool:
+        return not self._entry_by_aki_name
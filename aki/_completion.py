@@ -0,0 +1,252 @@
+"""
+Shell completion of aki. Volume names are read from a cache in aki state folder, written by every command that lists,
+copies or removes volumes: completion neither loads the aki file nor contacts docker. This module only imports the
+standard library, aki-complete starts in a few milliseconds.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Union
+
+COMPLETION_FILE_NAME = 'completion.json'
+DEFAULT_COMPLETION_TTL = 3600.0
+COMPLETION_SHELLS = ['bash', 'zsh', 'fish']
+
+# _config.STATE_FOLDER_NAME, _config imports docker and yaml
+_STATE_FOLDER_NAME = '.aki'
+_AKI_FILE_NAMES = ['aki.yaml', 'aki.yml']
+# An expired cache is refreshed in background once in this duration, seconds
+_REFRESH_INTERVAL = 60
+
+ACTIONS = ['ls', 'use', 'cp', 'rm', 'gc', 'flatten', 'watch', 'batch', 'completion', 'version']
+# Actions whose positional arguments are volume names, and the number of them, None if any
+_NAME_COUNT_BY_ACTION = {'use': 1, 'cp': 2, 'rm': None, 'flatten': None}
+_CURRENT_SOURCE = '_current'
+
+# Options followed by a value, before the action and after it
+GLOBAL_OPTIONS_WITH_VALUE = {'--volume', '-v', '--file', '-f', '--workspace', '-w', '--log-file'}
+ACTION_OPTIONS_WITH_VALUE = {'--io-priority', '--nice', '--bandwidth', '--workers', '--format', '--freeze',
+                             '--max-size', '--keep', '--older-than', '--parallel', '-p', '--debounce'}
+
+_BASH_SCRIPT = '''_aki() {
+    local IFS=$'\\n'
+    COMPREPLY=($(aki-complete "${COMP_WORDS[@]:0:COMP_CWORD+1}" 2>/dev/null))
+}
+complete -o default -F _aki aki
+'''
+
+_ZSH_SCRIPT = '''#compdef aki
+_aki() {
+    local -a candidates
+    candidates=("${(@f)$(aki-complete "${(@)words[1,CURRENT]}" 2>/dev/null)}")
+    if [[ -n ${candidates[1]} ]]; then
+        compadd -a candidates
+    else
+        _files
+    fi
+}
+compdef _aki aki
+'''
+
+_FISH_SCRIPT = '''complete -c aki -f -a '(aki-complete (commandline -opc) (commandline -ct) 2>/dev/null)'
+complete -c aki -s f -l file -r -F
+complete -c aki -s w -l workspace -r -F
+complete -c aki -l log-file -r -F
+'''
+
+_SCRIPT_BY_SHELL = {'bash': _BASH_SCRIPT, 'zsh': _ZSH_SCRIPT, 'fish': _FISH_SCRIPT}
+
+
+class CompletionCache:
+    """
+    aki names of the volumes of a project by volume type, stored in a JSON file in aki state folder. Names older than
+    the ttl are still completed, they are refreshed in background
+    """
+    _lock = threading.Lock()
+
+    def __init__(self, state_path: Path, ttl: float = DEFAULT_COMPLETION_TTL):
+        self.path = state_path / COMPLETION_FILE_NAME
+        self.ttl = ttl
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path, 'r') as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+        return content if isinstance(content, dict) and isinstance(content.get('names'), dict) else {}
+
+    def _write(self, content: Dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Completions read a complete file while another aki process writes it
+        temporary_path = self.path.with_name(f'{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(temporary_path, 'w') as file:
+            json.dump(content, file)
+        os.replace(temporary_path, self.path)
+
+    def fetch_names(self, volume_types: Union[Iterable[str], None] = None) -> Union[List[str], None]:
+        """
+        Return names of the volume types, of every type if None. None if names have never been written
+        """
+        names_by_type = self._load().get('names')
+        if names_by_type is None:
+            return None
+
+        types = names_by_type if volume_types is None else [name for name in volume_types if name in names_by_type]
+        return sorted({name for volume_type in types for name in names_by_type[volume_type]})
+
+    def is_expired(self, volume_types: Union[Iterable[str], None] = None) -> bool:
+        """
+        True if names of one of the volume types, of every type if None, have not been listed within the ttl
+        """
+        content = self._load()
+        updated_at_by_type = content.get('updated_at')
+        # Files written before listings were dated by type are refreshed
+        if not isinstance(updated_at_by_type, dict):
+            return True
+
+        types = content['names'] if volume_types is None else volume_types
+        expired_at = time.time() - content.get('ttl', self.ttl)
+        return any(updated_at_by_type.get(volume_type, 0) < expired_at for volume_type in types)
+
+    def set_names(self, names_by_type: Dict[str, Iterable[str]]):
+        """
+        Replace names of the volume types by a complete listing, names of the other types keep their date
+        """
+        with self._lock:
+            content = self._load()
+            names = content.get('names', {})
+            names.update({volume_type: sorted(set(type_names)) for volume_type, type_names in names_by_type.items()})
+            updated_at_by_type = content.get('updated_at')
+            if not isinstance(updated_at_by_type, dict):
+                updated_at_by_type = {}
+            now = time.time()
+            updated_at_by_type.update({volume_type: now for volume_type in names_by_type})
+            self._write({'updated_at': updated_at_by_type, 'ttl': self.ttl, 'names': names})
+
+    def add(self, volume_type: str, name: str):
+        self._update_names(volume_type, lambda names: names | {name})
+
+    def remove(self, volume_type: str, name: str):
+        self._update_names(volume_type, lambda names: names - {name})
+
+    def _update_names(self, volume_type: str, update):
+        with self._lock:
+            content = self._load()
+            # A type never listed stays unknown, a partial listing would hide its other volumes
+            if volume_type not in content.get('names', {}):
+                return
+            content['names'][volume_type] = sorted(update(set(content['names'][volume_type])))
+            self._write(content)
+
+
+def completion_script(shell: str) -> str:
+    """
+    Script that completes aki in shell, to be sourced by its rc file
+    """
+    return _SCRIPT_BY_SHELL[shell]
+
+
+def complete(words: List[str], folder: Union[Path, None] = None) -> List[str]:
+    """
+    Return candidates of the last word of the command line words, the first one being aki. Paths of the aki file are
+    relative to folder, the current folder if None
+    """
+    *previous_words, current_word = words[1:] or ['']
+    aki_file: Union[Path, None] = None
+    volume_types: List[str] = []
+    action: Union[str, None] = None
+    arguments: List[str] = []
+    pending_option: Union[str, None] = None
+
+    for word in previous_words:
+        if pending_option:
+            if pending_option in ('--file', '-f'):
+                aki_file = Path(word)
+            elif pending_option in ('--volume', '-v'):
+                volume_types.append(word)
+            pending_option = None
+        elif word.startswith('-'):
+            option, has_value, value = word.partition('=')
+            options_with_value = ACTION_OPTIONS_WITH_VALUE if action else GLOBAL_OPTIONS_WITH_VALUE
+            if option in options_with_value and not has_value:
+                pending_option = option
+            elif not action and option == '--file' and has_value:
+                aki_file = Path(value)
+            elif not action and option == '--volume' and has_value:
+                volume_types.append(value)
+        elif action is None:
+            action = word
+        else:
+            arguments.append(word)
+
+    # Values of options and options are completed by the shell
+    if pending_option or current_word.startswith('-'):
+        return []
+    if action is None:
+        return [candidate for candidate in ACTIONS if candidate.startswith(current_word)]
+
+    name_count = _NAME_COUNT_BY_ACTION.get(action, 0)
+    if action not in _NAME_COUNT_BY_ACTION or (name_count is not None and len(arguments) >= name_count):
+        return []
+
+    aki_file = _find_aki_file(aki_file, folder or Path())
+    if aki_file is None:
+        return []
+
+    cache = CompletionCache(aki_file.parent.resolve() / _STATE_FOLDER_NAME)
+    names = cache.fetch_names(volume_types or None)
+    if names is None or cache.is_expired(volume_types or None):
+        _refresh_in_background(cache, aki_file)
+    names = names or []
+    if action == 'cp' and not arguments:
+        names.append(_CURRENT_SOURCE)
+
+    return sorted(name for name in names if name.startswith(current_word) and name not in arguments)
+
+
+def _find_aki_file(aki_file: Union[Path, None], folder: Path) -> Union[Path, None]:
+    if aki_file:
+        aki_file = aki_file if aki_file.is_absolute() else folder / aki_file
+        return aki_file if aki_file.exists() else None
+
+    return next((folder / name for name in _AKI_FILE_NAMES if (folder / name).exists()), None)
+
+
+def _refresh_in_background(cache: CompletionCache, aki_file: Path):
+    """
+    Start a detached aki ls that writes the cache, unless one has been started recently
+    """
+    marker_path = cache.path.with_name(f'{cache.path.name}.refresh')
+    try:
+        if time.time() - marker_path.stat().st_mtime < _REFRESH_INTERVAL:
+            return
+    except OSError:
+        pass
+
+    import subprocess
+    try:
+        marker_path.parent.mkdir(parents=True, exist_ok=True)
+        marker_path.touch()
+        subprocess.Popen([sys.executable, '-m', 'aki.cli', '--file', str(aki_file.resolve()), 'ls'],
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+    except OSError:
+        pass
+
+
+def main():
+    """
+    Print candidates of the command line in arguments, one by line
+    """
+    for candidate in complete(sys.argv[1:]):
+        print(candidate)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
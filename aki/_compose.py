@@ -0,0 +1,351 @@
+"""
+Compose model of a project, resolved once by `docker compose config` and cached in aki state folder.
+
+aki variables are resolved as placeholders so that a single model serves every volume: the cache key hashes the compose
+files and the .env file without aki variables. A container of a managed service can then be recreated through the
+docker API when only its volume changes. Services that use options aki does not model are left to docker compose.
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Tuple, Union
+
+import docker.types
+from docker import DockerClient
+
+from aki._print import print_verbose
+
+COMPOSE_CACHE_FOLDER_NAME = 'compose'
+COMPOSE_LABEL_PREFIX = 'com.docker.compose.'
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+COMPOSE_SERVICE_LABEL = 'com.docker.compose.service'
+
+# Models of other branches are kept, switching back to a branch finds its model
+_MAX_CACHED_MODELS = 8
+# Files referenced by compose files are not hashed, their models are not cached
+_UNCACHEABLE_KEY_REGEX = re.compile(r'^\s*(include|extends|env_file)\s*:', re.MULTILINE)
+_VARIABLE_REGEX = re.compile(r'\$\{?([A-Za-z_][A-Za-z0-9_]*)')
+# Environment variables read by docker compose itself
+_COMPOSE_ENV_PREFIXES = ('COMPOSE_', 'DOCKER_')
+
+# Keys of a service copied as is to docker containers.create options
+_OPTION_BY_SERVICE_KEY = {
+    'image': 'image',
+    'container_name': 'name',
+    'command': 'command',
+    'entrypoint': 'entrypoint',
+    'working_dir': 'working_dir',
+    'user': 'user',
+    'hostname': 'hostname',
+    'tty': 'tty',
+    'stdin_open': 'stdin_open',
+    'privileged': 'privileged',
+    'shm_size': 'shm_size',
+    'stop_signal': 'stop_signal',
+    'cap_add': 'cap_add',
+    'cap_drop': 'cap_drop',
+    'network_mode': 'network_mode',
+}
+# Keys of a service translated to docker options, or without effect on the container (depends_on)
+_TRANSLATED_SERVICE_KEYS = {'environment', 'ports', 'volumes', 'networks', 'restart', 'labels', 'healthcheck',
+                            'depends_on'}
+_DURATION_REGEX = re.compile(r'(\d+(?:\.\d+)?)(ns|us|µs|ms|s|m|h)')
+_NANOSECONDS_BY_UNIT = {'ns': 1, 'us': 1e3, 'µs': 1e3, 'ms': 1e6, 's': 1e9, 'm': 60e9, 'h': 3600e9}
+
+
+class UnsupportedServiceError(Exception):
+    """
+    The service uses an option aki does not model, docker compose has to create its container
+    """
+    pass
+
+
+@dataclass(frozen=True)
+class ContainerSpec:
+    """
+    Options of docker containers.create and networks the container joins, with their aliases
+    """
+    options: Dict[str, Any]
+    networks: List[Tuple[str, List[str]]] = field(default_factory=list)
+
+
+class ComposeModel:
+    """
+    Project resolved by docker compose config, aki variables are placeholders replaced by render
+    """
+
+    def __init__(self, data: Dict, variables: Iterable[str]):
+        self.data = data
+        # Longest names first, a variable never replaces the placeholder of another one
+        self.variables = sorted(variables, key=len, reverse=True)
+
+    @property
+    def name(self) -> str:
+        return self.data.get('name', '')
+
+    def service_names(self) -> List[str]:
+        return list(self.data.get('services') or {})
+
+    def find_service(self, container_name: str) -> Union[str, None]:
+        """
+        Return the service that runs container_name, its container name is a placeholder if it contains a variable
+        """
+        for service_name, service in (self.data.get('services') or {}).items():
+            if service.get('container_name') == container_name:
+                return service_name
+
+        return None
+
+    def render(self, value: Any, value_by_variable: Mapping[str, str]) -> Any:
+        """
+        Replace placeholders of aki variables in value, lists and dicts included
+        """
+        if isinstance(value, str):
+            for variable in self.variables:
+                value = value.replace(format_placeholder(variable), value_by_variable.get(variable, ''))
+            return value
+        if isinstance(value, list):
+            return [self.render(item, value_by_variable) for item in value]
+        if isinstance(value, dict):
+            return {key: self.render(item, value_by_variable) for key, item in value.items()}
+
+        return value
+
+    def container_spec(self, service_name: str, value_by_variable: Mapping[str, str]) -> ContainerSpec:
+        """
+        Translate a service in docker options, raise UnsupportedServiceError if a service option cannot be translated
+        """
+        service = self.render(self.data['services'][service_name], value_by_variable)
+        unsupported_keys = sorted(key for key, value in service.items()
+                                  if value is not None and key not in _OPTION_BY_SERVICE_KEY
+                                  and key not in _TRANSLATED_SERVICE_KEYS)
+        if unsupported_keys:
+            raise UnsupportedServiceError(f'service {service_name} uses {", ".join(unsupported_keys)}')
+
+        options: Dict[str, Any] = {
+            option: service[key]
+            for key, option in _OPTION_BY_SERVICE_KEY.items()
+            if service.get(key) is not None
+        }
+        options['environment'] = {key: value for key, value in (service.get('environment') or {}).items()
+                                  if value is not None}
+        options['labels'] = dict(service.get('labels') or {})
+        options['ports'] = _translate_ports(service.get('ports') or [])
+        options['mounts'] = self._translate_volumes(service.get('volumes') or [], value_by_variable)
+        restart_policy = _translate_restart(service.get('restart'))
+        if restart_policy:
+            options['restart_policy'] = restart_policy
+        if service.get('healthcheck'):
+            options['healthcheck'] = _translate_healthcheck(service['healthcheck'])
+
+        networks = []
+        if 'network_mode' not in options:
+            aliases = [service_name, *([service['container_name']] if service.get('container_name') else [])]
+            for network_key, network in (service.get('networks') or {'default': None}).items():
+                network_name = self._network_name(network_key, value_by_variable)
+                networks.append((network_name, [*aliases, *((network or {}).get('aliases') or [])]))
+
+        return ContainerSpec(options, networks)
+
+    def _network_name(self, network_key: str, value_by_variable: Mapping[str, str]) -> str:
+        network = (self.data.get('networks') or {}).get(network_key) or {}
+        return self.render(network.get('name'), value_by_variable) or f'{self.name}_{network_key}'
+
+    def _translate_volumes(self, volumes: List[Dict], value_by_variable: Mapping[str, str]) -> List[docker.types.Mount]:
+        mounts = []
+        for volume in volumes:
+            volume_type = volume.get('type')
+            read_only = bool(volume.get('read_only'))
+            if volume_type == 'volume' and volume.get('source') and not (volume.get('volume') or {}).get('subpath'):
+                top_level_volume = (self.data.get('volumes') or {}).get(volume['source']) or {}
+                volume_name = self.render(top_level_volume.get('name'), value_by_variable) or volume['source']
+                mounts.append(docker.types.Mount(volume['target'], volume_name, type='volume', read_only=read_only,
+                                                 no_copy=bool((volume.get('volume') or {}).get('nocopy'))))
+            elif volume_type == 'bind' and os.path.exists(volume.get('source', '')):
+                mounts.append(docker.types.Mount(volume['target'], volume['source'], type='bind', read_only=read_only,
+                                                 propagation=(volume.get('bind') or {}).get('propagation')))
+            elif volume_type == 'tmpfs':
+                mounts.append(docker.types.Mount(volume['target'], None, type='tmpfs',
+                                                 tmpfs_size=(volume.get('tmpfs') or {}).get('size')))
+            else:
+                # Anonymous volumes are kept by docker compose when it recreates a container, missing bind folders
+                # are created by it
+                raise UnsupportedServiceError(f'volume {volume.get("target")} of type {volume_type} is not supported')
+
+        return mounts
+
+
+def format_placeholder(variable: str) -> str:
+    # Valid in volume names and paths
+    return f'aki-{variable}-placeholder'
+
+
+def fetch_compose_model(docker_command: List[str], compose_paths: List[Path], env_path: Path,
+                        value_by_variable: Mapping[str, str], env: Mapping[str, str],
+                        cache_folder: Path) -> Union[ComposeModel, None]:
+    """
+    Return the model of the project, from the cache if compose files and .env did not change except aki variables.
+    None if docker compose cannot resolve it
+    """
+    variables = sorted(value_by_variable)
+    cache_key = compute_cache_key(docker_command, compose_paths, env_path, variables, env)
+    cache_path = cache_folder / f'{cache_key}.json' if cache_key else None
+    if cache_path and cache_path.exists():
+        try:
+            model = ComposeModel(json.loads(cache_path.read_text()), variables)
+            print_verbose('compose model found in cache %s', cache_path.name)
+            return model
+        except (OSError, ValueError) as e:
+            print_verbose('cannot read compose model %s : %s', cache_path, e)
+
+    cmd = [
+        *docker_command,
+        '--env-file', str(env_path),
+        *[argument for compose_path in compose_paths for argument in ('--file', str(compose_path))],
+        'config', '--format', 'json'
+    ]
+    # Variables of the environment take priority over the .env file
+    cmd_env = {**env, **{variable: format_placeholder(variable) for variable in variables}}
+    print_verbose('executing command %s', ' '.join(cmd))
+    try:
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=cmd_env)
+    except OSError as e:
+        print_verbose('cannot run docker compose config : %s', e)
+        return None
+    if process.returncode != 0:
+        print_verbose('docker compose config failed - code %s - %s', process.returncode, process.stderr.decode())
+        return None
+
+    try:
+        data = json.loads(process.stdout)
+    except ValueError as e:
+        print_verbose('invalid output of docker compose config : %s', e)
+        return None
+
+    if cache_path:
+        _write_cache(cache_path, process.stdout)
+    return ComposeModel(data, variables)
+
+
+def compute_cache_key(docker_command: List[str], compose_paths: List[Path], env_path: Path, variables: List[str],
+                      env: Mapping[str, str]) -> Union[str, None]:
+    """
+    Hash of what the model depends on: compose files, .env file without aki variables and variables of the
+    environment used by compose files. None if the model cannot be cached
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([docker_command, variables]).encode())
+
+    compose_contents = []
+    for compose_path in compose_paths:
+        try:
+            content = compose_path.read_text()
+        except OSError:
+            return None
+        if _UNCACHEABLE_KEY_REGEX.search(content):
+            print_verbose('%s references other files, its model is not cached', compose_path)
+            return None
+        compose_contents.append(content)
+        digest.update(f'{compose_path.resolve()}\0{content}\0'.encode())
+
+    try:
+        env_lines = env_path.read_text().splitlines()
+    except OSError:
+        env_lines = []
+    for line in env_lines:
+        if line.split('=', 1)[0].strip() not in variables:
+            digest.update(f'{line}\n'.encode())
+
+    referenced_variables = {name for content in compose_contents for name in _VARIABLE_REGEX.findall(content)}
+    for name in sorted(env):
+        if name not in variables and (name in referenced_variables or name.startswith(_COMPOSE_ENV_PREFIXES)):
+            digest.update(f'{name}={env[name]}\0'.encode())
+
+    return digest.hexdigest()[:32]
+
+
+def _write_cache(cache_path: Path, content: bytes):
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = cache_path.with_suffix(f'.{os.getpid()}.tmp')
+        temporary_path.write_bytes(content)
+        temporary_path.replace(cache_path)
+
+        cached_paths = sorted(cache_path.parent.glob('*.json'), key=lambda path: path.stat().st_mtime, reverse=True)
+        for old_path in cached_paths[_MAX_CACHED_MODELS:]:
+            old_path.unlink()
+    except OSError as e:
+        print_verbose('cannot write compose model cache %s : %s', cache_path, e)
+
+
+def create_service_container(docker_client: DockerClient, spec: ContainerSpec, labels: Mapping[str, str]):
+    """
+    Create and start the container of a service, labels identify it as a container of the compose project
+    """
+    options = {**spec.options, 'labels': {**labels, **spec.options.get('labels', {})}}
+    if spec.networks:
+        network_name, aliases = spec.networks[0]
+        options['network'] = network_name
+        options['networking_config'] = {network_name: docker_client.api.create_endpoint_config(aliases=aliases)}
+
+    container = docker_client.containers.create(**options)
+    for network_name, aliases in spec.networks[1:]:
+        docker_client.networks.get(network_name).connect(container, aliases=aliases)
+    container.start()
+
+
+def _translate_ports(ports: List[Dict]) -> Dict[str, Any]:
+    bindings_by_port: Dict[str, List] = {}
+    for port in ports:
+        published = str(port.get('published') or '')
+        if '-' in published or port.get('mode', 'ingress') not in ('ingress', 'host'):
+            raise UnsupportedServiceError(f'port {port} is not supported')
+
+        host_port = int(published) if published else None
+        binding = (port['host_ip'], host_port) if port.get('host_ip') else host_port
+        bindings_by_port.setdefault(f'{port["target"]}/{port.get("protocol", "tcp")}', []).append(binding)
+
+    return {key: bindings[0] if len(bindings) == 1 else bindings for key, bindings in bindings_by_port.items()}
+
+
+def _translate_restart(restart: Union[str, None]) -> Union[Dict, None]:
+    if not restart or restart == 'no':
+        return None
+
+    name, _, maximum_retry_count = restart.partition(':')
+    if name not in ('always', 'unless-stopped', 'on-failure'):
+        raise UnsupportedServiceError(f'restart {restart} is not supported')
+
+    return {'Name': name, 'MaximumRetryCount': int(maximum_retry_count or 0)}
+
+
+def _translate_healthcheck(healthcheck: Dict) -> Dict:
+    if healthcheck.get('disable'):
+        return {'test': ['NONE']}
+
+    result: Dict[str, Any] = {'test': healthcheck.get('test')}
+    for key in ('interval', 'timeout', 'start_period', 'start_interval'):
+        if healthcheck.get(key):
+            result[key] = parse_go_duration(healthcheck[key])
+    if healthcheck.get('retries') is not None:
+        result['retries'] = healthcheck['retries']
+
+    return result
+
+
+def parse_go_duration(value: Union[str, int]) -> int:
+    """
+    Parse a duration written by docker compose, e.g. 1m30s, in nanoseconds
+    """
+    if isinstance(value, int):
+        return value
+
+    parts = _DURATION_REGEX.findall(value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value:
+        raise UnsupportedServiceError(f'duration {value} is not supported')
+
+    return int(sum(float(number) * _NANOSECONDS_BY_UNIT[unit] for number, unit in parts))
@@ -1,7 +1,7 @@
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Callable
+from typing import Dict, List, Callable, Union
 
 import docker
 import yaml
@@ -9,12 +9,31 @@ from docker import DockerClient
 
 from aki.action import CopyAction, UseAction, ErrorAction, ACTION_COPY, ACTION_USE, ACTION_ERROR, \
     ACTION_PY, PyCodeAction, ACTION_RM, RemoveAction, Action
+from aki._completion import DEFAULT_COMPLETION_TTL
 from aki.config_key import ConfigKey
 from aki.error import ScriptError
-from aki.volume import AkiHostVolume, AkiDockerVolume, KEY_VOLUME_HOST, KEY_VOLUME_DOCKER, AkiVolume, Volume
+from aki._format import parse_size, parse_duration
+from aki._gc import GcPolicy
+from aki._lock import DEFAULT_LOCK_TIMEOUT
+from aki._io_policy import IoPolicy, IO_PRIORITIES, IO_PRIORITY_NORMAL, IO_PRIORITY_LOW, IO_PRIORITY_IDLE, MAX_NICE
+from aki.volume import AkiHostVolume, AkiDockerVolume, AkiOverlayVolume, KEY_VOLUME_HOST, KEY_VOLUME_DOCKER, \
+    KEY_VOLUME_OVERLAY, AkiVolume, Volume, COPY_ENGINES, COPY_ENGINE_AUTO, LABEL_AKI_PROJECT, LABEL_AKI_TYPE
 import aki._dict_parse_utils as dict_parse_utils
 
 
+STATE_FOLDER_NAME = '.aki'
+
+DEFAULT_GC_PARALLEL = 4
+
+TRASH_PURGE_BACKGROUND = 'background'
+TRASH_PURGE_MANUAL = 'manual'
+
+# How a live copy stops writes to its source while the changes are copied
+COPY_FREEZE_STOP = 'stop'
+COPY_FREEZE_PAUSE = 'pause'
+COPY_FREEZES = [COPY_FREEZE_STOP, COPY_FREEZE_PAUSE]
+
+
 @dataclass
 class Config:
     docker_client: DockerClient
@@ -24,6 +43,19 @@ class Config:
     docker_env: Path
     docker_compose_cli_version: str
     use_not_found_action_fn: Callable[[str, Dict[str, List[Volume]], Dict[str, Volume]], List[Action]]
+    aki_file: Path = None
+    trash_enabled: bool = True
+    trash_purge: str = TRASH_PURGE_BACKGROUND
+    state_path: Path = None  # folder of files written by aki (index, ...)
+    gc_policy: GcPolicy = GcPolicy()
+    gc_parallel: int = DEFAULT_GC_PARALLEL
+    copy_max_duration: Union[float, None] = None  # seconds, ask before a copy estimated longer
+    io_policy: IoPolicy = IoPolicy()  # scheduling of copies and removals, also set on aki_volumes
+    lock_timeout: float = DEFAULT_LOCK_TIMEOUT  # seconds to wait for another aki process
+    copy_live: bool = False  # copy while containers run, they are stopped to copy the changes only
+    copy_freeze: str = COPY_FREEZE_STOP  # one of COPY_FREEZES
+    completion_ttl: float = DEFAULT_COMPLETION_TTL  # seconds before volume names of completion are refreshed
+    not_found_sources: List[str] = field(default_factory=list)  # sources of the copies of aki.use.not_found
 
 KEY_DOCKER_COMPOSE = ConfigKey('docker_compose')
 KEY_DOCKER_COMPOSE_PATH = ConfigKey('path', KEY_DOCKER_COMPOSE.path)
@@ -39,6 +71,35 @@ KEY_VOLUME_CONTAINER = ConfigKey('container_name', KEY_VOLUMES.path)
 KEY_VOLUME_FOLDER = ConfigKey('folder', KEY_VOLUMES.path)
 KEY_VOLUME_EXCLUDE = ConfigKey('exclude', KEY_VOLUMES.path)
 KEY_VOLUME_PREFIX = ConfigKey('prefix', KEY_VOLUMES.path)
+KEY_VOLUME_COPY_ENGINE = ConfigKey('copy_engine', KEY_VOLUMES.path)
+
+KEY_TRASH = ConfigKey('trash', KEY_AKI.path)
+KEY_TRASH_ENABLED = ConfigKey('enabled', KEY_TRASH.path)
+KEY_TRASH_PURGE = ConfigKey('purge', KEY_TRASH.path)
+
+KEY_GC = ConfigKey('gc', KEY_AKI.path)
+KEY_GC_MAX_SIZE = ConfigKey('max_size', KEY_GC.path)
+KEY_GC_KEEP = ConfigKey('keep', KEY_GC.path)
+KEY_GC_OLDER_THAN = ConfigKey('older_than', KEY_GC.path)
+KEY_GC_PARALLEL = ConfigKey('parallel', KEY_GC.path)
+
+KEY_COPY = ConfigKey('copy', KEY_AKI.path)
+KEY_COPY_MAX_DURATION = ConfigKey('max_duration', KEY_COPY.path)
+KEY_COPY_LIVE = ConfigKey('live', KEY_COPY.path)
+KEY_COPY_FREEZE = ConfigKey('freeze', KEY_COPY.path)
+
+KEY_IO = ConfigKey('io', KEY_AKI.path)
+KEY_IO_PRIORITY = ConfigKey('priority', KEY_IO.path)
+KEY_IO_NICE = ConfigKey('nice', KEY_IO.path)
+KEY_IO_BANDWIDTH = ConfigKey('bandwidth', KEY_IO.path)
+KEY_IO_DEVICE = ConfigKey('device', KEY_IO.path)
+KEY_IO_WORKERS = ConfigKey('workers', KEY_IO.path)
+
+KEY_LOCK = ConfigKey('lock', KEY_AKI.path)
+KEY_LOCK_TIMEOUT = ConfigKey('timeout', KEY_LOCK.path)
+
+KEY_COMPLETION = ConfigKey('completion', KEY_AKI.path)
+KEY_COMPLETION_TTL = ConfigKey('ttl', KEY_COMPLETION.path)
 
 KEY_USE = ConfigKey('use', KEY_AKI.path)
 KEY_USE_NOT_FOUND = ConfigKey('not_found', KEY_USE.path)
@@ -50,26 +111,39 @@ KEY_NOT_FOUND_ACTIONS_USE_VOLUME = ConfigKey('volume', KEY_NOT_FOUND_ACTIONS.pat
 KEY_NOT_FOUND_ACTIONS_RM_VOLUMES = ConfigKey('volumes', KEY_NOT_FOUND_ACTIONS.path)
 
 
-def import_config(yaml_file: Path) -> Config:
+def import_config(yaml_file: Path, docker_client: Union[DockerClient, None] = None) -> Config:
+    """
+    Load an aki file, docker_client is shared by the projects of a workspace and created if None
+    """
     if yaml_file and not yaml_file.exists():
         raise ScriptError(f'No such file or directory: {yaml_file}')
     elif not yaml_file:
-        yaml_file = _fetch_default_aki_path()
+        yaml_file = fetch_default_aki_path()
 
     with open(yaml_file.resolve(), 'r') as stream:
         config: Dict = yaml.load(stream, Loader=yaml.Loader)
 
-    docker_client: DockerClient = docker.from_env()
+    docker_client: DockerClient = docker_client or docker.from_env()
     base_path = yaml_file.parent.resolve()
-    aki_volumes = _get_volumes_from_config(base_path, config, docker_client)
+    io_policy = _get_io_policy_from_config(config)
+    aki_volumes = _get_volumes_from_config(base_path, config, docker_client, io_policy)
     docker_composes, docker_env_path, docker_compose_cli_version = _get_docker_compose_from_config(base_path, config)
     use_not_found_action_fn = _create_use_not_found_action_fn_from_config(base_path, config)
+    trash_enabled, trash_purge = _get_trash_from_config(config)
+    gc_policy, gc_parallel = _get_gc_from_config(config)
+    copy_max_duration = _get_copy_max_duration_from_config(config)
+    lock_timeout = _get_lock_timeout_from_config(config)
+    copy_live, copy_freeze = _get_live_copy_from_config(config)
+    completion_ttl = _get_completion_ttl_from_config(config)
+    not_found_sources = _get_not_found_sources_from_config(config)
 
     return Config(docker_client, base_path, aki_volumes, docker_composes, docker_env_path, docker_compose_cli_version,
-                  use_not_found_action_fn)
+                  use_not_found_action_fn, yaml_file.resolve(), trash_enabled, trash_purge,
+                  base_path / STATE_FOLDER_NAME, gc_policy, gc_parallel, copy_max_duration, io_policy,
+                  lock_timeout, copy_live, copy_freeze, completion_ttl, not_found_sources)
 
 
-def _get_volumes_from_config(base_path, config, docker_client):
+def _get_volumes_from_config(base_path, config, docker_client, io_policy: IoPolicy = IoPolicy()):
     aki_volumes: Dict[str, AkiVolume] = {}
 
     volumes_config: Dict = dict_parse_utils.get_deep_dict(KEY_VOLUMES.path, config)
@@ -81,13 +155,16 @@ def _get_volumes_from_config(base_path, config, docker_client):
         volume_type = dict_parse_utils.get_str(volume_type_key_config, volume)
 
         if volume_type == KEY_VOLUME_HOST:
-            volume_spec = _create_host_volume_from_config(volume, docker_client, base_path)
+            volume_spec = _create_host_volume_from_config(volume, docker_client, base_path, io_policy)
         elif volume_type == KEY_VOLUME_DOCKER:
-            volume_spec = _create_docker_volume_from_config(volume, docker_client)
+            volume_spec = _create_docker_volume_from_config(volume_name, volume, docker_client, base_path, io_policy)
+        elif volume_type == KEY_VOLUME_OVERLAY:
+            volume_spec = _create_docker_volume_from_config(volume_name, volume, docker_client, base_path, io_policy,
+                                                            AkiOverlayVolume)
         else:
             raise ScriptError(
-                f'Key \'{volume_type_key_config.path}\' is \'{volume_type}\' but possible values are \'host\' or '
-                f'\'docker\''
+                f'Key \'{volume_type_key_config.path}\' is \'{volume_type}\' but possible values are \'host\', '
+                f'\'docker\' or \'overlay\''
             )
 
         aki_volumes.setdefault(volume_name, volume_spec)
@@ -102,20 +179,29 @@ def _get_volume_common_config(volume: Dict):
     return env_variable, container_name
 
 
-def _create_host_volume_from_config(volume: Dict, docker_client, base_path: Path):
+def _create_host_volume_from_config(volume: Dict, docker_client, base_path: Path, io_policy: IoPolicy):
     env_variable, container_name = _get_volume_common_config(volume)
     folder = dict_parse_utils.get_path(base_path, KEY_VOLUME_FOLDER, volume)
     exclude = dict_parse_utils.get_list(KEY_VOLUME_EXCLUDE, volume, mandatory=False)
+    copy_engine = dict_parse_utils.get_str(KEY_VOLUME_COPY_ENGINE, volume, mandatory=False) or COPY_ENGINE_AUTO
+    if copy_engine not in COPY_ENGINES:
+        raise ScriptError(
+            f'Key \'{KEY_VOLUME_COPY_ENGINE.path}\' is \'{copy_engine}\' but possible values are \'auto\', '
+            f'\'native\' or \'container\''
+        )
 
-    return AkiHostVolume(docker_client, container_name, env_variable, folder, exclude)
+    return AkiHostVolume(docker_client, container_name, env_variable, folder, exclude, copy_engine, io_policy)
 
 
-def _create_docker_volume_from_config(volume: Dict, docker_client):
+def _create_docker_volume_from_config(volume_name: str, volume: Dict, docker_client, base_path: Path,
+                                      io_policy: IoPolicy, volume_class=AkiDockerVolume):
     env_variable, container_name = _get_volume_common_config(volume)
     prefix = dict_parse_utils.get_str(KEY_VOLUME_PREFIX, volume)
     exclude = dict_parse_utils.get_list(KEY_VOLUME_EXCLUDE, volume, mandatory=False)
+    # The project is the folder of the aki file, as for docker compose
+    labels = {LABEL_AKI_PROJECT: base_path.name, LABEL_AKI_TYPE: volume_name}
 
-    return AkiDockerVolume(docker_client, container_name, env_variable, prefix, exclude)
+    return volume_class(docker_client, container_name, env_variable, prefix, exclude, io_policy, labels)
 
 
 def _fetch_default_docker_compose(base_path: Path):
@@ -161,8 +247,119 @@ def _get_docker_compose_from_config(base_path, config):
     return docker_composes, docker_env_path, docker_compose_cli_version
 
 
-def _fetch_default_aki_path():
-    base_path = Path().resolve()
+def _get_trash_from_config(config):
+    trash_config = dict_parse_utils.get_deep_dict(KEY_TRASH.path, config, mandatory=False)
+    trash_enabled = dict_parse_utils.get_bool(KEY_TRASH_ENABLED, trash_config, mandatory=False)
+    trash_purge = dict_parse_utils.get_str(KEY_TRASH_PURGE, trash_config, mandatory=False) or TRASH_PURGE_BACKGROUND
+
+    if trash_purge not in [TRASH_PURGE_BACKGROUND, TRASH_PURGE_MANUAL]:
+        raise ScriptError(
+            f'Key \'{KEY_TRASH_PURGE.path}\' is \'{trash_purge}\' but possible values are '
+            f'\'{TRASH_PURGE_BACKGROUND}\' or \'{TRASH_PURGE_MANUAL}\''
+        )
+
+    return trash_enabled is not False, trash_purge
+
+
+def _get_gc_from_config(config):
+    gc_config = dict_parse_utils.get_deep_dict(KEY_GC.path, config, mandatory=False)
+
+    max_size = gc_config.get(KEY_GC_MAX_SIZE.key)
+    older_than = gc_config.get(KEY_GC_OLDER_THAN.key)
+    try:
+        max_size = parse_size(max_size) if max_size is not None else None
+        older_than = parse_duration(older_than) if older_than is not None else None
+    except ValueError as e:
+        raise ScriptError(f'Key \'{KEY_GC.path}\' is invalid : {e}')
+
+    keep = dict_parse_utils.get_int(KEY_GC_KEEP, gc_config, mandatory=False)
+    if keep is not None and keep < 0:
+        raise ScriptError(f'Key \'{KEY_GC_KEEP.path}\' is \'{keep}\' but it must be at least 0')
+    parallel = dict_parse_utils.get_int(KEY_GC_PARALLEL, gc_config, mandatory=False)
+    if parallel is not None and parallel < 1:
+        raise ScriptError(f'Key \'{KEY_GC_PARALLEL.path}\' is \'{parallel}\' but it must be at least 1')
+
+    return GcPolicy(max_size, keep, older_than), parallel or DEFAULT_GC_PARALLEL
+
+
+def _get_copy_max_duration_from_config(config):
+    copy_config = dict_parse_utils.get_deep_dict(KEY_COPY.path, config, mandatory=False)
+    max_duration = copy_config.get(KEY_COPY_MAX_DURATION.key)
+
+    try:
+        return parse_duration(max_duration) if max_duration is not None else None
+    except ValueError as e:
+        raise ScriptError(f'Key \'{KEY_COPY_MAX_DURATION.path}\' is invalid : {e}')
+
+
+def _get_live_copy_from_config(config):
+    copy_config = dict_parse_utils.get_deep_dict(KEY_COPY.path, config, mandatory=False)
+    live = dict_parse_utils.get_bool(KEY_COPY_LIVE, copy_config, mandatory=False)
+    freeze = dict_parse_utils.get_str(KEY_COPY_FREEZE, copy_config, mandatory=False) or COPY_FREEZE_STOP
+
+    if freeze not in COPY_FREEZES:
+        raise ScriptError(
+            f'Key \'{KEY_COPY_FREEZE.path}\' is \'{freeze}\' but possible values are \'{COPY_FREEZE_STOP}\' or '
+            f'\'{COPY_FREEZE_PAUSE}\''
+        )
+
+    return live is True, freeze
+
+
+def _get_lock_timeout_from_config(config):
+    lock_config = dict_parse_utils.get_deep_dict(KEY_LOCK.path, config, mandatory=False)
+    timeout = lock_config.get(KEY_LOCK_TIMEOUT.key)
+
+    try:
+        return parse_duration(timeout) if timeout is not None else DEFAULT_LOCK_TIMEOUT
+    except ValueError as e:
+        raise ScriptError(f'Key \'{KEY_LOCK_TIMEOUT.path}\' is invalid : {e}')
+
+
+def _get_completion_ttl_from_config(config):
+    completion_config = dict_parse_utils.get_deep_dict(KEY_COMPLETION.path, config, mandatory=False)
+    ttl = completion_config.get(KEY_COMPLETION_TTL.key)
+
+    try:
+        return parse_duration(ttl) if ttl is not None else DEFAULT_COMPLETION_TTL
+    except ValueError as e:
+        raise ScriptError(f'Key \'{KEY_COMPLETION_TTL.path}\' is invalid : {e}')
+
+
+def _get_io_policy_from_config(config) -> IoPolicy:
+    io_config = dict_parse_utils.get_deep_dict(KEY_IO.path, config, mandatory=False)
+
+    priority = dict_parse_utils.get_str(KEY_IO_PRIORITY, io_config, mandatory=False)
+    if priority is not None and priority not in IO_PRIORITIES:
+        raise ScriptError(
+            f'Key \'{KEY_IO_PRIORITY.path}\' is \'{priority}\' but possible values are \'{IO_PRIORITY_NORMAL}\', '
+            f'\'{IO_PRIORITY_LOW}\' or \'{IO_PRIORITY_IDLE}\''
+        )
+
+    nice = dict_parse_utils.get_int(KEY_IO_NICE, io_config, mandatory=False)
+    if nice is not None and not 0 <= nice <= MAX_NICE:
+        raise ScriptError(f'Key \'{KEY_IO_NICE.path}\' is \'{nice}\' but it must be between 0 and {MAX_NICE}')
+
+    bandwidth = io_config.get(KEY_IO_BANDWIDTH.key)
+    try:
+        bandwidth = parse_size(bandwidth) if bandwidth is not None else None
+    except ValueError as e:
+        raise ScriptError(f'Key \'{KEY_IO_BANDWIDTH.path}\' is invalid : {e}')
+
+    device = dict_parse_utils.get_str(KEY_IO_DEVICE, io_config, mandatory=False)
+
+    workers = dict_parse_utils.get_int(KEY_IO_WORKERS, io_config, mandatory=False)
+    if workers is not None and workers < 1:
+        raise ScriptError(f'Key \'{KEY_IO_WORKERS.path}\' is \'{workers}\' but it must be at least 1')
+
+    return IoPolicy(priority, nice, bandwidth, device, workers)
+
+
+def fetch_default_aki_path(folder: Path = None) -> Path:
+    """
+    Return aki.yaml or aki.yml of folder, the current folder if None
+    """
+    base_path = (folder or Path()).resolve()
     for aki_file in [base_path / 'aki.yaml', base_path / 'aki.yml']:
         if aki_file.exists():
             return aki_file
@@ -170,6 +367,21 @@ def _fetch_default_aki_path():
     raise ScriptError(f'Cannot find aki.yaml or aki.yml file in folder {base_path}')
 
 
+def _get_not_found_sources_from_config(config) -> List[str]:
+    """
+    Return sources of the copy actions of aki.use.not_found, sources returned by python actions are unknown
+    """
+    sources = []
+    for actions_config in dict_parse_utils.get_deep_list(KEY_USE_NOT_FOUND.path, config):
+        for action_config in dict_parse_utils.get_list(KEY_NOT_FOUND_ACTIONS, actions_config, mandatory=False):
+            if dict_parse_utils.get_str(KEY_NOT_FOUND_ACTIONS_ACTION, action_config, mandatory=False) == ACTION_COPY:
+                source = dict_parse_utils.get_str(KEY_NOT_FOUND_ACTIONS_COPY_SOURCE, action_config, mandatory=False)
+                if source and source not in sources:
+                    sources.append(source)
+
+    return sources
+
+
 def _create_use_not_found_action_fn_from_config(base_path, config):
     actions_configs = dict_parse_utils.get_deep_list(KEY_USE_NOT_FOUND.path, config)
 
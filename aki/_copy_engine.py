@@ -0,0 +1,473 @@
+"""
+Native copy engine for host volumes.
+
+Copy a folder like `cp -a source/. destination` does but in process: files are copied concurrently with
+copy_file_range (or sendfile) and holes of sparse files are kept. Hardlinks, symlinks, ownership, permissions,
+extended attributes and timestamps are preserved.
+"""
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+from aki import platform_info
+from aki._journal import CopyJournal
+from aki._print import print_verbose
+from aki._progress import CopyProgress
+
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+# Size of a copy_file_range / sendfile call and of the buffer used when no zero copy syscall is available
+_CHUNK_SIZE = 64 * 1024 * 1024
+_BUFFER_SIZE = 1024 * 1024
+# Smallest chunk copied at once when the bandwidth is limited
+_MIN_THROTTLED_CHUNK_SIZE = 64 * 1024
+
+# errno raised by copy_file_range / sendfile when they cannot be used between two file descriptors
+_ZERO_COPY_UNSUPPORTED_ERRNO = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ENOTSOCK}
+# errno raised when an extended attribute cannot be set on destination (unsupported or protected namespace)
+_XATTR_IGNORED_ERRNO = {errno.ENOTSUP, errno.EOPNOTSUPP, errno.EPERM, errno.EACCES}
+
+
+class _Throttle:
+    """
+    Bandwidth shared by copy threads: a chunk waits for its turn, chunks are spaced by the time they take at the rate
+    """
+
+    def __init__(self, bytes_per_second: int):
+        self.bytes_per_second = bytes_per_second
+        # A tenth of second of data by call keeps the pace smooth
+        self.chunk_size = max(_MIN_THROTTLED_CHUNK_SIZE, min(_CHUNK_SIZE, bytes_per_second // 10))
+        self._lock = threading.Lock()
+        self._next_start = time.monotonic()
+
+    def wait(self, size: int):
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_start, now)
+            self._next_start = start + size / self.bytes_per_second
+
+        if start > now:
+            time.sleep(start - now)
+
+
+def can_copy_natively(source: Path) -> bool:
+    """
+    True if aki has enough permission to copy the folder itself: aki runs as root or owns the source folder
+    """
+    if _is_root():
+        return True
+
+    try:
+        source_stat = os.stat(source)
+    except OSError:
+        return False
+
+    return source_stat.st_uid == os.geteuid() and os.access(source, os.R_OK | os.X_OK)
+
+
+def copy_tree(source: Path, destination: Path, workers: int = DEFAULT_WORKERS,
+              journal: Union[CopyJournal, None] = None, bytes_per_second: Union[int, None] = None,
+              progress: Union[CopyProgress, None] = None, keep_ownership: bool = False,
+              worker_initializer: Union[Callable[[], None], None] = None):
+    """
+    Copy content and metadata of folder source into folder destination.
+    Destination must not exist. With a journal, completed files are recorded to it and destination may be an empty
+    folder or the partial result of the copy interrupted with this journal: files recorded and not changed since are
+    skipped, a partial destination of another source folder is copied again. bytes_per_second limits the bandwidth of
+    all workers together.
+    Bytes are added to progress as they are copied, a file once it is complete.
+    As cp -a, a non root user owns the copy of files of other users unless keep_ownership is set: PermissionError is
+    raised instead. worker_initializer is run by each worker thread before it copies, e.g. to lower its priorities
+    """
+    throttle = _Throttle(bytes_per_second) if bytes_per_second else None
+    keep_ownership = keep_ownership or _is_root()
+    # The source folder is recorded by the journal once a copy has started writing the destination
+    is_resume = journal is not None and journal.source_root is not None and os.path.isdir(destination)
+    directories: List[Tuple[str, str, os.stat_result]] = []
+    hardlinks: List[Tuple[str, str]] = []
+    first_link_by_inode: Dict[Tuple[int, int], str] = {}
+
+    def make_directory(path: str):
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            if not is_resume:
+                raise
+            if not os.path.isdir(path) or os.path.islink(path):
+                # A file of the interrupted copy is a folder in source now
+                os.unlink(path)
+                os.mkdir(path, 0o700)
+
+    def remove_partial(path: str):
+        # A resumed copy replaces entries that are not recorded as completed or changed since
+        if is_resume and os.path.lexists(path):
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.unlink(path)
+
+    def copy_file(source_path: str, destination_path: str, relative_path: str, source_stat: os.stat_result):
+        remove_partial(destination_path)
+        _copy_file(source_path, destination_path, source_stat, keep_ownership, throttle, progress)
+        if journal:
+            journal.record(relative_path, source_stat.st_size, source_stat.st_mtime_ns, source_stat.st_ctime_ns)
+        if progress:
+            progress.add(0, 1)
+
+    print_verbose('native copy %s to %s with %s workers - %s bytes/s', source, destination, workers,
+                  bytes_per_second if throttle else 'unlimited')
+    if is_resume:
+        print_verbose('resume after %s files', len(journal.completed_files))
+    source_stat = os.stat(source)
+    if journal:
+        source_root = [source_stat.st_dev, source_stat.st_ino, source_stat.st_ctime_ns]
+        if is_resume and journal.source_root != source_root:
+            # Files recorded by the journal may come from a folder since removed or changed, copy from scratch
+            print_verbose('%s changed since the interrupted copy, copy it again', source)
+            shutil.rmtree(destination)
+            journal.restart()
+            is_resume = False
+        journal.set_source_root(source_root)
+    if journal and not is_resume and os.path.isdir(destination) and not os.path.islink(destination):
+        # Empty folder created with the volume, a folder with content raises as an existing destination
+        try:
+            os.rmdir(destination)
+        except OSError:
+            raise FileExistsError(errno.EEXIST, 'Destination exists', str(destination))
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aki_copy', initializer=worker_initializer)
+    futures = []
+    try:
+        make_directory(str(destination))
+        directories.append((str(source), str(destination), source_stat))
+
+        # Walk the tree in the main thread, directories are created before their content is submitted
+        folders_to_walk = [(str(source), str(destination), '')]
+        while folders_to_walk:
+            source_folder, destination_folder, relative_folder = folders_to_walk.pop()
+            if is_resume:
+                _remove_entries_not_in_source(source_folder, destination_folder)
+            with os.scandir(source_folder) as entries:
+                for entry in entries:
+                    destination_path = os.path.join(destination_folder, entry.name)
+                    relative_path = f'{relative_folder}/{entry.name}' if relative_folder else entry.name
+                    entry_stat = entry.stat(follow_symlinks=False)
+
+                    if stat.S_ISDIR(entry_stat.st_mode):
+                        make_directory(destination_path)
+                        directories.append((entry.path, destination_path, entry_stat))
+                        folders_to_walk.append((entry.path, destination_path, relative_path))
+                    elif stat.S_ISREG(entry_stat.st_mode):
+                        if entry_stat.st_nlink > 1:
+                            inode = (entry_stat.st_dev, entry_stat.st_ino)
+                            if inode in first_link_by_inode:
+                                hardlinks.append((first_link_by_inode[inode], destination_path))
+                                continue
+                            first_link_by_inode[inode] = destination_path
+
+                        if is_resume and journal.is_completed(relative_path, entry_stat.st_size, entry_stat.st_mtime_ns,
+                                                              entry_stat.st_ctime_ns):
+                            continue
+
+                        futures.append(executor.submit(copy_file, entry.path, destination_path, relative_path,
+                                                       entry_stat))
+                    else:
+                        remove_partial(destination_path)
+                        _copy_special_file(entry.path, destination_path, entry_stat, keep_ownership)
+
+        for future in futures:
+            future.result()
+    except BaseException as e:
+        # Do not wait for queued files on error or interruption, only for files being copied
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        if isinstance(e, Exception):
+            # A sync completes the copy, it only copies again the entries changed since: folders need their metadata
+            _copy_folders_metadata(directories, keep_ownership)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        if journal:
+            journal.flush()
+
+    for first_link, destination_path in hardlinks:
+        remove_partial(destination_path)
+        os.link(first_link, destination_path)
+
+    # Directories metadata are set once their content is written, deepest directories first
+    for source_path, destination_path, directory_stat in reversed(directories):
+        _copy_metadata(source_path, destination_path, directory_stat, keep_ownership)
+
+
+def _copy_folders_metadata(directories: List[Tuple[str, str, os.stat_result]], keep_ownership: bool):
+    """
+    Set metadata of the folders of a failed copy, as far as possible: the error of the copy is the one reported
+    """
+    for source_path, destination_path, directory_stat in reversed(directories):
+        try:
+            _copy_metadata(source_path, destination_path, directory_stat, keep_ownership)
+        except OSError as e:
+            print_verbose('cannot copy metadata of %s : %s', source_path, e)
+
+
+def sync_tree(source: Path, destination: Path, since_ns: int, keep_ownership: bool = False):
+    """
+    Make destination, a copy of folder source started at since_ns, the same as source again: entries changed since are
+    copied again and entries removed from source are removed. Change times of source entries tell what changed, nobody
+    must write source during the sync. keep_ownership as copy_tree
+    """
+    keep_ownership = keep_ownership or _is_root()
+    first_link_by_inode: Dict[Tuple[int, int], str] = {}
+    changed_folders: List[Tuple[str, str, os.stat_result]] = []
+    copied_count = 0
+    removed_count = 0
+
+    folders_to_walk = [(str(source), str(destination), os.stat(source))]
+    while folders_to_walk:
+        source_folder, destination_folder, folder_stat = folders_to_walk.pop()
+        with os.scandir(destination_folder) as entries:
+            destination_entries = {entry.name: entry for entry in entries}
+
+        is_changed = folder_stat.st_ctime_ns >= since_ns
+        with os.scandir(source_folder) as entries:
+            for entry in entries:
+                destination_entry = destination_entries.pop(entry.name, None)
+                destination_path = os.path.join(destination_folder, entry.name)
+                entry_stat = entry.stat(follow_symlinks=False)
+                is_folder = stat.S_ISDIR(entry_stat.st_mode)
+
+                if destination_entry is not None and is_folder == destination_entry.is_dir(follow_symlinks=False):
+                    if is_folder:
+                        folders_to_walk.append((entry.path, destination_path, entry_stat))
+                        continue
+                    if entry_stat.st_ctime_ns < since_ns:
+                        continue
+
+                if destination_entry is not None:
+                    _remove_entry(destination_entry)
+                is_changed = True
+                copied_count += 1
+
+                if is_folder:
+                    copy_tree(Path(entry.path), Path(destination_path), workers=1, keep_ownership=keep_ownership)
+                elif stat.S_ISREG(entry_stat.st_mode):
+                    # Links of a changed file are changed too, the first one is copied and the others link to it
+                    inode = (entry_stat.st_dev, entry_stat.st_ino)
+                    if entry_stat.st_nlink > 1 and inode in first_link_by_inode:
+                        os.link(first_link_by_inode[inode], destination_path)
+                        continue
+                    first_link_by_inode[inode] = destination_path
+                    _copy_file(entry.path, destination_path, entry_stat, keep_ownership)
+                else:
+                    _copy_special_file(entry.path, destination_path, entry_stat, keep_ownership)
+
+        for destination_entry in destination_entries.values():
+            _remove_entry(destination_entry)
+            is_changed = True
+            removed_count += 1
+
+        if is_changed or source_folder == str(source):
+            changed_folders.append((source_folder, destination_folder, folder_stat))
+
+    # Writing a folder changes its dates, metadata are set again deepest folders first
+    for source_path, destination_path, directory_stat in reversed(changed_folders):
+        _copy_metadata(source_path, destination_path, directory_stat, keep_ownership)
+
+    print_verbose('sync %s to %s - %s entries copied, %s removed', source, destination, copied_count, removed_count)
+
+
+def _remove_entries_not_in_source(source_folder: str, destination_folder: str):
+    """
+    Remove entries of a partial destination folder removed from source since the interrupted copy
+    """
+    source_names = set(os.listdir(source_folder))
+    with os.scandir(destination_folder) as entries:
+        for entry in entries:
+            if entry.name not in source_names:
+                _remove_entry(entry)
+
+
+def _is_root() -> bool:
+    return not hasattr(os, 'geteuid') or os.geteuid() == 0
+
+
+def _remove_entry(entry: os.DirEntry):
+    if entry.is_dir(follow_symlinks=False):
+        shutil.rmtree(entry.path)
+    else:
+        os.unlink(entry.path)
+
+
+def _copy_special_file(source_path: str, destination_path: str, source_stat: os.stat_result, keep_ownership: bool):
+    """
+    Copy a symlink, fifo or device. Sockets belong to the process that listens on them, they are not copied
+    """
+    if stat.S_ISLNK(source_stat.st_mode):
+        os.symlink(os.readlink(source_path), destination_path)
+    elif stat.S_ISSOCK(source_stat.st_mode):
+        print_verbose('skip socket %s', source_path)
+        return
+    else:
+        os.mknod(destination_path, source_stat.st_mode, source_stat.st_rdev)
+
+    _copy_metadata(source_path, destination_path, source_stat, keep_ownership)
+
+
+def _copy_file(source_path: str, destination_path: str, source_stat: os.stat_result, keep_ownership: bool,
+               throttle: Union[_Throttle, None] = None, progress: Union[CopyProgress, None] = None):
+    source_fd = os.open(source_path, os.O_RDONLY)
+    try:
+        destination_fd = os.open(destination_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            # Set the final size first, ranges never written stay holes
+            os.ftruncate(destination_fd, source_stat.st_size)
+            for offset, length in _data_segments(source_fd, source_stat.st_size):
+                _copy_range(source_fd, destination_fd, offset, length, throttle, progress)
+        except BaseException:
+            # A partial file has the final size, a sync would take it for a complete one
+            os.close(destination_fd)
+            os.unlink(destination_path)
+            raise
+        else:
+            os.close(destination_fd)
+    finally:
+        os.close(source_fd)
+
+    _copy_metadata(source_path, destination_path, source_stat, keep_ownership)
+
+
+def _data_segments(fd: int, size: int):
+    """
+    Yield (offset, length) of data segments of a file, holes are skipped when the file system supports SEEK_DATA
+    """
+    if size == 0:
+        return
+
+    if not hasattr(os, 'SEEK_DATA'):
+        yield 0, size
+        return
+
+    offset = 0
+    while offset < size:
+        try:
+            data_start = os.lseek(fd, offset, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno == errno.ENXIO:
+                # No more data after offset, the end of the file is a hole
+                return
+            if e.errno == errno.EINVAL and offset == 0:
+                yield 0, size
+                return
+            raise
+
+        data_end = os.lseek(fd, data_start, os.SEEK_HOLE)
+        yield data_start, min(data_end, size) - data_start
+        offset = data_end
+
+
+def _copy_range(source_fd: int, destination_fd: int, offset: int, length: int,
+                throttle: Union[_Throttle, None] = None, progress: Union[CopyProgress, None] = None):
+    end = offset + length
+    chunk_size = throttle.chunk_size if throttle else _CHUNK_SIZE
+    buffer_size = min(_BUFFER_SIZE, chunk_size)
+
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < end:
+                size = _next_chunk_size(chunk_size, end - offset, throttle)
+                copied = os.copy_file_range(source_fd, destination_fd, size, offset, offset)
+                if copied == 0:
+                    return
+                offset += copied
+                if progress:
+                    progress.add(copied)
+            return
+        except OSError as e:
+            if e.errno not in _ZERO_COPY_UNSUPPORTED_ERRNO:
+                raise
+
+    # Only linux sends a file to a file, macOS and BSD send to sockets
+    if hasattr(os, 'sendfile') and platform_info.is_linux():
+        try:
+            os.lseek(destination_fd, offset, os.SEEK_SET)
+            while offset < end:
+                size = _next_chunk_size(chunk_size, end - offset, throttle)
+                copied = os.sendfile(destination_fd, source_fd, offset, size)
+                if copied == 0:
+                    return
+                offset += copied
+                if progress:
+                    progress.add(copied)
+            return
+        except OSError as e:
+            if e.errno not in _ZERO_COPY_UNSUPPORTED_ERRNO:
+                raise
+
+    while offset < end:
+        buffer = os.pread(source_fd, _next_chunk_size(buffer_size, end - offset, throttle), offset)
+        if not buffer:
+            return
+        written = os.pwrite(destination_fd, buffer, offset)
+        offset += written
+        if progress:
+            progress.add(written)
+
+
+def _next_chunk_size(chunk_size: int, remaining: int, throttle: Union[_Throttle, None]) -> int:
+    size = min(chunk_size, remaining)
+    if throttle:
+        throttle.wait(size)
+    return size
+
+
+def _copy_metadata(source_path: str, destination_path: str, source_stat: os.stat_result, keep_ownership: bool):
+    """
+    Copy ownership, permissions, extended attributes and timestamps. Symlinks are never followed
+    """
+    is_link = stat.S_ISLNK(source_stat.st_mode)
+
+    if hasattr(os, 'lchown'):
+        try:
+            os.lchown(destination_path, source_stat.st_uid, source_stat.st_gid)
+        except PermissionError:
+            # As cp -a, a non root user keeps ownership of the copy
+            if keep_ownership:
+                raise
+
+    if not is_link:
+        os.chmod(destination_path, stat.S_IMODE(source_stat.st_mode))
+    elif os.chmod in os.supports_follow_symlinks:
+        try:
+            os.chmod(destination_path, stat.S_IMODE(source_stat.st_mode), follow_symlinks=False)
+        except (NotImplementedError, OSError):
+            pass
+
+    if hasattr(os, 'listxattr'):
+        _copy_xattrs(source_path, destination_path)
+
+    os.utime(destination_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns), follow_symlinks=False)
+
+
+def _copy_xattrs(source_path: str, destination_path: str):
+    try:
+        names = os.listxattr(source_path, follow_symlinks=False)
+    except OSError as e:
+        if e.errno in _XATTR_IGNORED_ERRNO:
+            return
+        raise
+
+    for name in names:
+        try:
+            os.setxattr(destination_path, name, os.getxattr(source_path, name, follow_symlinks=False),
+                        follow_symlinks=False)
+        except OSError as e:
+            if e.errno not in _XATTR_IGNORED_ERRNO:
+                raise
+            print_verbose('cannot copy extended attribute %s of %s : %s', name, source_path, e)
@@ -25,6 +25,18 @@ def get_str(key: ConfigKey, dictionary: Dict, mandatory=True):
     return value_str
 
 
+def get_int(key: ConfigKey, dictionary: Dict, mandatory=True):
+    value_int = get_value(key, dictionary, mandatory)
+
+    if not mandatory and value_int is None:
+        return None
+
+    if not isinstance(value_int, int) or isinstance(value_int, bool):
+        raise DictParseScriptError(f'key \'{key.path}\' is not an integer')
+
+    return value_int
+
+
 def get_dict(key: ConfigKey, dictionary: Dict, mandatory=True) -> Dict:
     value_dict = get_value(key, dictionary, mandatory)
 
@@ -0,0 +1,68 @@
+import os
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import NamedTuple, Set, Tuple
+
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+
+class DiskUsage(NamedTuple):
+    size: int  # bytes allocated on disk, holes of sparse files are not counted
+    files: int
+
+
+def measure_tree(path: Path, workers: int = DEFAULT_WORKERS) -> DiskUsage:
+    """
+    Measure a folder with scandir, each top level folder is walked by a worker.
+    Files with several hardlinks are counted once
+    """
+    seen_inodes: Set[Tuple[int, int]] = set()
+    seen_inodes_lock = threading.Lock()
+
+    def entry_usage(entry_stat: os.stat_result) -> int:
+        if entry_stat.st_nlink > 1 and not stat.S_ISDIR(entry_stat.st_mode):
+            with seen_inodes_lock:
+                inode = (entry_stat.st_dev, entry_stat.st_ino)
+                if inode in seen_inodes:
+                    return 0
+                seen_inodes.add(inode)
+
+        blocks = getattr(entry_stat, 'st_blocks', None)
+        return blocks * 512 if blocks is not None else entry_stat.st_size
+
+    def walk(folder: str) -> DiskUsage:
+        size = 0
+        files = 0
+        folders_to_walk = [folder]
+        while folders_to_walk:
+            with os.scandir(folders_to_walk.pop()) as entries:
+                for entry in entries:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                    size += entry_usage(entry_stat)
+                    if stat.S_ISDIR(entry_stat.st_mode):
+                        folders_to_walk.append(entry.path)
+                    else:
+                        files += 1
+
+        return DiskUsage(size, files)
+
+    size = entry_usage(os.stat(path))
+    files = 0
+    top_level_folders = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            entry_stat = entry.stat(follow_symlinks=False)
+            size += entry_usage(entry_stat)
+            if stat.S_ISDIR(entry_stat.st_mode):
+                top_level_folders.append(entry.path)
+            else:
+                files += 1
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='aki_du') as executor:
+        for usage in executor.map(walk, top_level_folders):
+            size += usage.size
+            files += usage.files
+
+    return DiskUsage(size, files)
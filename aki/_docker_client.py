@@ -1,5 +1,36 @@
+import threading
 import uuid
+import weakref
+
+import docker.errors
+from docker import DockerClient
+
+from aki._print import print_info, print_verbose
+
+# Image of the short lived containers aki runs to copy, remove or measure volumes
+HELPER_IMAGE = 'busybox'
+
+_helper_image_lock = threading.Lock()
+_clients_with_helper_image = weakref.WeakSet()
 
 
 def format_aki_container_name(fragment_name: str):
     return f'aki_{fragment_name}_{uuid.uuid4().hex}'
+
+
+def ensure_helper_image(docker_client: DockerClient) -> str:
+    """
+    Pull the helper image if missing and return its name.
+    The image is checked once by docker client, projects of a workspace share the check
+    """
+    with _helper_image_lock:
+        if docker_client not in _clients_with_helper_image:
+            try:
+                docker_client.images.get(HELPER_IMAGE)
+                print_verbose('helper image %s found', HELPER_IMAGE)
+            except docker.errors.ImageNotFound:
+                print_info(f'Pulling {HELPER_IMAGE}')
+                docker_client.images.pull(HELPER_IMAGE)
+            _clients_with_helper_image.add(docker_client)
+
+    return HELPER_IMAGE
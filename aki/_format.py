@@ -0,0 +1,79 @@
+from typing import Union
+
+_SIZE_UNITS = ['B', 'K', 'M', 'G', 'T', 'P']
+
+
+def format_size(size: Union[int, None]) -> str:
+    """
+    Format a size in bytes with a binary unit, e.g. 1536 -> 1.5K
+    """
+    if size is None:
+        return '-'
+
+    value = float(size)
+    for unit in _SIZE_UNITS:
+        if abs(value) < 1024 or unit == _SIZE_UNITS[-1]:
+            return f'{value:.0f}{unit}' if unit == 'B' else f'{value:.1f}{unit}'
+        value /= 1024
+
+
+def format_elapsed(seconds: Union[float, None]) -> str:
+    """
+    Format an elapsed time with its biggest unit, e.g. 7200 -> 2h ago
+    """
+    if seconds is None:
+        return '-'
+
+    for unit, unit_seconds in [('d', 86400), ('h', 3600), ('m', 60)]:
+        if seconds >= unit_seconds:
+            return f'{int(seconds // unit_seconds)}{unit} ago'
+
+    return 'now'
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration with its two biggest units, e.g. 3725 -> 1h 02m
+    """
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m'
+    elif seconds >= 60:
+        return f'{seconds // 60}m {seconds % 60:02d}s'
+
+    return f'{seconds}s'
+
+
+def parse_size(value: str) -> int:
+    """
+    Parse a size with an optional binary unit, e.g. 10G -> 10737418240
+    """
+    size_str = str(value).strip().upper().rstrip('B') or '0'
+    multiplier = 1
+    if size_str[-1] in _SIZE_UNITS:
+        multiplier = 1024 ** _SIZE_UNITS.index(size_str[-1])
+        size_str = size_str[:-1]
+
+    try:
+        return int(float(size_str) * multiplier)
+    except ValueError:
+        raise ValueError(f'\'{value}\' is not a size, e.g. 500M or 10G')
+
+
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(value: str) -> float:
+    """
+    Parse a duration in seconds with an optional unit (s, m, h, d or w), e.g. 30d -> 2592000
+    """
+    duration_str = str(value).strip().lower()
+    multiplier = 1
+    if duration_str and duration_str[-1] in _DURATION_UNITS:
+        multiplier = _DURATION_UNITS[duration_str[-1]]
+        duration_str = duration_str[:-1]
+
+    try:
+        return float(duration_str) * multiplier
+    except ValueError:
+        raise ValueError(f'\'{value}\' is not a duration, e.g. 90s, 12h or 30d')
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from typing import Dict, List, Set, Union
+
+from aki._format import format_size, format_elapsed
+
+
+@dataclass(frozen=True)
+class GcPolicy:
+    """
+    Rules that select volumes to evict, a rule set to None is not applied
+    """
+    max_size: Union[int, None] = None  # bytes, total size of volumes to keep
+    keep: Union[int, None] = None  # number of most recently used volumes to keep
+    older_than: Union[float, None] = None  # seconds, evict volumes not used since
+
+    def is_empty(self) -> bool:
+        return self.max_size is None and self.keep is None and self.older_than is None
+
+
+@dataclass(frozen=True)
+class GcUsage:
+    """
+    Usage of an aki name, all volume types merged
+    """
+    aki_name: str
+    size: Union[int, None]  # None if never measured
+    last_used_at: Union[float, None]  # None if never used by aki
+
+
+@dataclass(frozen=True)
+class GcEviction:
+    usage: GcUsage
+    reason: str
+
+
+def plan_eviction(usages: List[GcUsage], protected_names: Set[str], policy: GcPolicy, now: float) -> List[GcEviction]:
+    """
+    Return volumes to evict, from the least to the most recently used.
+    Protected volumes are never evicted but count in the number and size of kept volumes.
+    A volume without known last use is the least recently used but is never evicted by age
+    """
+    # Most recently used first
+    ranked_usages = sorted(usages, key=lambda usage: (usage.last_used_at is not None, usage.last_used_at or 0,
+                                                      usage.aki_name), reverse=True)
+    reason_by_aki_name: Dict[str, str] = {}
+
+    for rank, usage in enumerate(ranked_usages):
+        if usage.aki_name in protected_names:
+            continue
+
+        if policy.keep is not None and rank >= policy.keep:
+            reason_by_aki_name[usage.aki_name] = f'keep {policy.keep} most recently used'
+        elif policy.older_than is not None and usage.last_used_at is not None \
+                and now - usage.last_used_at > policy.older_than:
+            reason_by_aki_name[usage.aki_name] = f'not used since {format_elapsed(now - usage.last_used_at)}'
+
+    if policy.max_size is not None:
+        kept_size = sum(usage.size or 0 for usage in ranked_usages if usage.aki_name not in reason_by_aki_name)
+        for usage in reversed(ranked_usages):
+            if kept_size <= policy.max_size:
+                break
+
+            if usage.aki_name in protected_names or usage.aki_name in reason_by_aki_name or not usage.size:
+                continue
+
+            reason_by_aki_name[usage.aki_name] = f'total size above {format_size(policy.max_size)}'
+            kept_size -= usage.size
+
+    return [
+        GcEviction(usage, reason_by_aki_name[usage.aki_name])
+        for usage in reversed(ranked_usages)
+        if usage.aki_name in reason_by_aki_name
+    ]
@@ -0,0 +1,206 @@
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Union
+
+from aki._print import print_verbose
+from aki.volume import Volume
+
+INDEX_FILE_NAME = 'index.sqlite'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS volume (
+    volume_type TEXT NOT NULL,
+    aki_name TEXT NOT NULL,
+    external_name TEXT NOT NULL,
+    created_at REAL,
+    last_used_at REAL,
+    source TEXT,
+    size INTEGER,
+    PRIMARY KEY (volume_type, aki_name)
+);
+CREATE TABLE IF NOT EXISTS copy_stat (
+    volume_type TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    copied_at REAL NOT NULL
+);
+'''
+
+# Number of recent copies used to compute the throughput of a volume type
+THROUGHPUT_COPY_COUNT = 10
+
+
+@dataclass(frozen=True)
+class VolumeMetadata:
+    """
+    What aki knows about a volume it does not read from docker or the file system
+    """
+    volume_type: str
+    aki_name: str
+    external_name: str
+    created_at: Union[float, None]  # None if the volume has not been created by aki
+    last_used_at: Union[float, None]
+    source: Union[str, None]  # aki name of the volume copied to create this one
+    size: Union[int, None]  # bytes, None if never measured
+
+
+class VolumeIndex:
+    """
+    Persistent index of the volumes of a project, stored in a sqlite file in aki state folder.
+    The index is reconciled with the volumes listed by docker and the file system, it never is the source of truth
+    of volumes existence.
+    """
+
+    def __init__(self, state_path: Path):
+        self._path = state_path / INDEX_FILE_NAME
+        self._lock = threading.Lock()
+        self._connection: Union[sqlite3.Connection, None] = None
+        self._is_disabled = False
+
+    def _connect(self) -> Union[sqlite3.Connection, None]:
+        if self._connection is None and not self._is_disabled:
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                self._connection = sqlite3.connect(str(self._path), timeout=10, check_same_thread=False,
+                                                   isolation_level=None)
+                self._connection.executescript(_SCHEMA)
+            except (OSError, sqlite3.Error) as e:
+                # aki works without its index, only metadata are lost
+                print_verbose('cannot open volume index %s : %s', self._path, e)
+                self._is_disabled = True
+                self._connection = None
+
+        return self._connection
+
+    def _execute(self, sql: str, parameters: Iterable = ()):
+        with self._lock:
+            connection = self._connect()
+            if connection:
+                connection.execute(sql, tuple(parameters))
+
+    def reconcile(self, volume_type: str, volumes: Iterable[Volume]):
+        """
+        Add volumes unknown to the index and forget indexed volumes that do not exist anymore. Added volumes keep the
+        creation date and source read with them, volumes created by another worktree or before the index are dated
+        """
+        volume_by_aki_name = {volume.aki_name: volume for volume in volumes}
+
+        with self._lock:
+            connection = self._connect()
+            if not connection:
+                return
+
+            rows = connection.execute('SELECT aki_name FROM volume WHERE volume_type = ?', (volume_type,))
+            indexed_names = {row[0] for row in rows}
+            names_to_add = volume_by_aki_name.keys() - indexed_names
+            names_to_remove = indexed_names - volume_by_aki_name.keys()
+            if not names_to_add and not names_to_remove:
+                return
+
+            print_verbose('index %s - add %s - remove %s', volume_type, sorted(names_to_add), sorted(names_to_remove))
+            with connection:
+                connection.execute('BEGIN')
+                connection.executemany(
+                    'INSERT INTO volume (volume_type, aki_name, external_name, created_at, source) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [
+                        (volume_type, name, volume_by_aki_name[name].external_name,
+                         volume_by_aki_name[name].created_at, volume_by_aki_name[name].source)
+                        for name in names_to_add
+                    ]
+                )
+                connection.executemany(
+                    'DELETE FROM volume WHERE volume_type = ? AND aki_name = ?',
+                    [(volume_type, name) for name in names_to_remove]
+                )
+
+    def mark_created(self, volume_type: str, volume: Volume, source: Union[str, None] = None,
+                     size: Union[int, None] = None):
+        self._execute(
+            'INSERT OR REPLACE INTO volume (volume_type, aki_name, external_name, created_at, source, size) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (volume_type, volume.aki_name, volume.external_name, time.time(), source, size)
+        )
+
+    def mark_used(self, volume_type: str, volume: Volume):
+        # Not an upsert, INSERT ... ON CONFLICT needs SQLite 3.24 that older python builds do not ship
+        with self._lock:
+            connection = self._connect()
+            if not connection:
+                return
+
+            used_at = time.time()
+            with connection:
+                connection.execute('BEGIN')
+                connection.execute(
+                    'INSERT OR IGNORE INTO volume (volume_type, aki_name, external_name) VALUES (?, ?, ?)',
+                    (volume_type, volume.aki_name, volume.external_name)
+                )
+                connection.execute('UPDATE volume SET last_used_at = ? WHERE volume_type = ? AND aki_name = ?',
+                                   (used_at, volume_type, volume.aki_name))
+
+    def set_size(self, volume_type: str, aki_name: str, size: int):
+        self._execute('UPDATE volume SET size = ? WHERE volume_type = ? AND aki_name = ?',
+                      (size, volume_type, aki_name))
+
+    def remove(self, volume_type: str, aki_name: str):
+        self._execute('DELETE FROM volume WHERE volume_type = ? AND aki_name = ?', (volume_type, aki_name))
+
+    def add_copy_stat(self, volume_type: str, size: int, duration: float):
+        """
+        Record a copy of size bytes that lasted duration seconds, only the most recent copies are kept
+        """
+        with self._lock:
+            connection = self._connect()
+            if not connection:
+                return
+
+            with connection:
+                connection.execute('BEGIN')
+                connection.execute('INSERT INTO copy_stat (volume_type, size, duration, copied_at) VALUES (?, ?, ?, ?)',
+                                   (volume_type, size, duration, time.time()))
+                connection.execute(
+                    'DELETE FROM copy_stat WHERE volume_type = ? AND rowid NOT IN '
+                    '(SELECT rowid FROM copy_stat WHERE volume_type = ? ORDER BY copied_at DESC LIMIT ?)',
+                    (volume_type, volume_type, THROUGHPUT_COPY_COUNT)
+                )
+
+    def fetch_throughput(self, volume_type: str) -> Union[float, None]:
+        """
+        Bytes per second of recent copies, None if no copy has been recorded
+        """
+        with self._lock:
+            connection = self._connect()
+            if not connection:
+                return None
+
+            size, duration = connection.execute(
+                'SELECT SUM(size), SUM(duration) FROM copy_stat WHERE volume_type = ?', (volume_type,)
+            ).fetchone()
+
+        return size / duration if size and duration else None
+
+    def fetch(self, volume_type: str) -> Dict[str, VolumeMetadata]:
+        """
+        Return metadata of the volumes of a type by aki name
+        """
+        with self._lock:
+            connection = self._connect()
+            if not connection:
+                return {}
+
+            rows = connection.execute(
+                'SELECT volume_type, aki_name, external_name, created_at, last_used_at, source, size FROM volume '
+                'WHERE volume_type = ?', (volume_type,)
+            ).fetchall()
+
+        return {row[1]: VolumeMetadata(*row) for row in rows}
+
+    def close(self):
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
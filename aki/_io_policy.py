@@ -0,0 +1,131 @@
+import ctypes
+import os
+import platform
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, TypeVar, Union
+
+from aki._print import print_verbose
+
+IO_PRIORITY_NORMAL = 'normal'
+IO_PRIORITY_LOW = 'low'
+IO_PRIORITY_IDLE = 'idle'
+IO_PRIORITIES = [IO_PRIORITY_NORMAL, IO_PRIORITY_LOW, IO_PRIORITY_IDLE]
+
+MAX_NICE = 19
+
+# ionice class and level: low is the lowest level of best effort class, idle only gets the disk when nobody uses it
+_IONICE_BY_PRIORITY = {IO_PRIORITY_LOW: (2, 7), IO_PRIORITY_IDLE: (3, 0)}
+# Docker blkio weight, from 10 to 1000, containers are started with 500
+_BLKIO_WEIGHT_BY_PRIORITY = {IO_PRIORITY_LOW: 100, IO_PRIORITY_IDLE: 10}
+# Number of the ioprio_set syscall by machine, python does not expose it
+_IOPRIO_SET_SYSCALL_BY_MACHINE = {'x86_64': 251, 'i686': 289, 'aarch64': 30, 'armv7l': 314, 'ppc64le': 273,
+                                  's390x': 282, 'riscv64': 30}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class IoPolicy:
+    """
+    Scheduling of copies and removals so that they do not slow down running databases.
+    None values are not set, see override
+    """
+    priority: Union[str, None] = None  # one of IO_PRIORITIES
+    nice: Union[int, None] = None  # cpu nice, from 0 to 19
+    bandwidth: Union[int, None] = None  # bytes per second read and written by a copy, 0 is unlimited
+    device: Union[str, None] = None  # block device of docker volumes on docker host, to limit containers bandwidth
+    workers: Union[int, None] = None  # files copied at the same time by a copy, default of the copy engine if None
+
+    def override(self, other: 'IoPolicy') -> 'IoPolicy':
+        """
+        Policy with the values set in other, values of self otherwise
+        """
+        return IoPolicy(
+            other.priority if other.priority is not None else self.priority,
+            other.nice if other.nice is not None else self.nice,
+            other.bandwidth if other.bandwidth is not None else self.bandwidth,
+            other.device if other.device is not None else self.device,
+            other.workers if other.workers is not None else self.workers,
+        )
+
+    @property
+    def bytes_per_second(self) -> Union[int, None]:
+        return self.bandwidth or None
+
+    def wrap_command(self, command: str) -> str:
+        """
+        Run the command of a helper container with ionice and nice, busybox provides both
+        """
+        prefix = ''
+        if self.priority in _IONICE_BY_PRIORITY:
+            ionice_class, ionice_level = _IONICE_BY_PRIORITY[self.priority]
+            prefix += f'ionice -c {ionice_class} -n {ionice_level} '
+        if self.nice:
+            prefix += f'nice -n {self.nice} '
+
+        return prefix + command
+
+    def container_options(self) -> Dict:
+        """
+        Options of docker containers.run, docker needs the block device to limit the bandwidth
+        """
+        options = {}
+        if self.priority in _BLKIO_WEIGHT_BY_PRIORITY:
+            options['blkio_weight'] = _BLKIO_WEIGHT_BY_PRIORITY[self.priority]
+        if self.nice:
+            # The kernel gives about 1.25 times less cpu to each nice level
+            options['cpu_shares'] = max(2, int(1024 / 1.25 ** self.nice))
+        if self.bytes_per_second:
+            if self.device:
+                rates: List[Dict] = [{'Path': self.device, 'Rate': self.bytes_per_second}]
+                options['device_read_bps'] = rates
+                options['device_write_bps'] = rates
+            else:
+                print_verbose('bandwidth of containers is not limited, aki.io.device is not set')
+
+        return options
+
+    def has_priorities(self) -> bool:
+        return bool(self.nice) or self.priority in _IONICE_BY_PRIORITY
+
+    def run_in_thread(self, fn: Callable[[], T]) -> T:
+        """
+        Return fn() run by a thread with the priorities of the policy, the calling thread keeps its own
+        """
+        if not self.has_priorities():
+            return fn()
+
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='aki_io',
+                                initializer=self.apply_to_current_thread) as executor:
+            return executor.submit(fn).result()
+
+    def apply_to_current_thread(self):
+        """
+        Set nice and io priority of the calling thread, threads and processes it starts inherit them.
+        Priorities can only be lowered, the thread keeps them until it exits: only threads that copy or remove volumes
+        apply them, e.g. as initializer of their pool
+        """
+        if self.nice and hasattr(os, 'setpriority'):
+            try:
+                # On linux, PRIO_PROCESS 0 is the calling thread
+                os.setpriority(os.PRIO_PROCESS, 0, max(os.getpriority(os.PRIO_PROCESS, 0), self.nice))
+            except OSError as e:
+                print_verbose('cannot set nice %s (%s)', self.nice, e)
+
+        if self.priority in _IONICE_BY_PRIORITY:
+            _set_io_priority(*_IONICE_BY_PRIORITY[self.priority])
+
+
+def _set_io_priority(ionice_class: int, ionice_level: int):
+    syscall_number = _IOPRIO_SET_SYSCALL_BY_MACHINE.get(platform.machine())
+    if platform.system() != 'Linux' or syscall_number is None:
+        print_verbose('io priority is not supported on %s %s', platform.system(), platform.machine())
+        return
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    ioprio = (ionice_class << _IOPRIO_CLASS_SHIFT) | ionice_level
+    if libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, 0, ioprio) < 0:
+        print_verbose('cannot set io priority (%s)', os.strerror(ctypes.get_errno()))
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from aki._print import print_verbose
+
+JOURNAL_FOLDER_NAME = 'journal'
+
+# Completed files are written to disk every _FLUSH_RECORDS records or _FLUSH_SECONDS seconds
+_FLUSH_RECORDS = 256
+_FLUSH_SECONDS = 1.0
+
+
+class CopyJournal:
+    """
+    Progress of a copy to a destination volume, stored in aki state folder.
+    The first line describes the copy, each next line is a completed file with its size and times, or the source folder
+    the copy started from. The journal exists while the copy is not complete: a destination with a journal is
+    incomplete and the copy can be resumed from it.
+    """
+
+    def __init__(self, state_path: Path, volume_type: str, aki_name: str):
+        self.path = state_path / JOURNAL_FOLDER_NAME / volume_type / f'{aki_name}.journal'
+        self.source: Union[str, None] = None
+        self.is_resumable = True
+        # size, mtime and ctime in ns of completed files by relative path
+        self.completed_files: Dict[str, Tuple[int, int, int]] = {}
+        self.completed_bytes = 0
+        # device, inode and ctime in ns of the source folder
+        self.source_root: Union[List[int], None] = None
+        self._pending_lines = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return
+
+        try:
+            header = json.loads(lines[0])
+            self.source = header['source']
+            self.is_resumable = header.get('resumable', True)
+        except (IndexError, ValueError, KeyError, TypeError):
+            print_verbose('ignore corrupted copy journal %s', self.path)
+            return
+
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    self.source_root = record['root']
+                    continue
+                size, mtime_ns, ctime_ns, relative_path = record
+            except (ValueError, KeyError, TypeError):
+                # Last line may be truncated if aki has been killed while writing it
+                continue
+            self._add(relative_path, size, mtime_ns, ctime_ns)
+
+    def is_in_progress(self) -> bool:
+        return self.source is not None
+
+    def start(self, source: str, is_resumable: bool = True):
+        """
+        Start a copy from source, progress of a previous copy from the same source is kept. The destination of a copy
+        that is not resumable is removed if it is interrupted
+        """
+        if self.source == source and self.is_resumable:
+            print_verbose('resume copy journal %s - %s files done', self.path, len(self.completed_files))
+            return
+
+        self.source = source
+        self.is_resumable = is_resumable
+        self.completed_files = {}
+        self.completed_bytes = 0
+        self.source_root = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w') as file:
+            header = {'source': source, 'started_at': time.time()}
+            if not is_resumable:
+                header['resumable'] = False
+            file.write(json.dumps(header) + '\n')
+
+    def restart(self):
+        """
+        Forget the progress, the destination is copied again from scratch
+        """
+        source = self.source
+        self.discard()
+        self.start(source)
+
+    def set_source_root(self, source_root: List[int]):
+        """
+        Record the device, inode and ctime of the source folder. A copy is resumed only from the same source folder
+        """
+        with self._lock:
+            self.source_root = source_root
+            self._pending_lines.append(json.dumps({'root': source_root}) + '\n')
+            self._flush()
+
+    def is_completed(self, relative_path: str, size: int, mtime_ns: int, ctime_ns: int) -> bool:
+        """
+        True if the file has been copied and has not changed since
+        """
+        return self.completed_files.get(relative_path) == (size, mtime_ns, ctime_ns)
+
+    def record(self, relative_path: str, size: int, mtime_ns: int, ctime_ns: int):
+        """
+        Record a completed file, safe to call from several threads
+        """
+        with self._lock:
+            self._add(relative_path, size, mtime_ns, ctime_ns)
+            self._pending_lines.append(json.dumps([size, mtime_ns, ctime_ns, relative_path]) + '\n')
+
+            if len(self._pending_lines) >= _FLUSH_RECORDS or time.monotonic() - self._last_flush >= _FLUSH_SECONDS:
+                self._flush()
+
+    def _add(self, relative_path: str, size: int, mtime_ns: int, ctime_ns: int):
+        # A file changed after it has been copied is copied and recorded again
+        previous = self.completed_files.get(relative_path)
+        if previous:
+            self.completed_bytes -= previous[0]
+        self.completed_files[relative_path] = size, mtime_ns, ctime_ns
+        self.completed_bytes += size
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._pending_lines and self.source is not None:
+            with open(self.path, 'a') as file:
+                file.writelines(self._pending_lines)
+        self._pending_lines = []
+        self._last_flush = time.monotonic()
+
+    def complete(self):
+        """
+        The copy is done, the destination is complete
+        """
+        self.discard()
+
+    def discard(self):
+        with self._lock:
+            self._pending_lines = []
+            self.source = None
+            self.is_resumable = True
+            self.completed_files = {}
+            self.completed_bytes = 0
+            self.source_root = None
+            self.path.unlink(missing_ok=True)
@@ -0,0 +1,165 @@
+"""
+Locks shared by aki processes. A lock is a file locked with flock, the kernel releases it when the process exits.
+Lock files are in a folder shared by the projects of the user as containers and volumes are shared by them.
+"""
+import contextlib
+import fcntl
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+from aki.error import LockTimeoutScriptError
+from aki._print import print_info, print_verbose
+
+DEFAULT_LOCK_TIMEOUT = 600.0  # seconds, a copy holds its locks until it is done
+LOCK_FOLDER_ENV = 'AKI_LOCK_FOLDER'
+
+_RETRY_DELAY = 0.1
+
+
+class _HeldLocks(threading.local):
+    """
+    Locks held by the current thread: fd, count and flock mode, a thread can take the same lock again
+    """
+    def __init__(self):
+        self.by_key: Dict[str, Tuple[int, int, int]] = {}
+
+
+_held_locks = _HeldLocks()
+
+
+def env_lock_key(env_path: Path) -> str:
+    return f'env:{env_path.resolve()}'
+
+
+def container_lock_key(container_name: str) -> str:
+    return f'container:{container_name}'
+
+
+def volume_lock_key(external_name: str) -> str:
+    return f'volume:{external_name}'
+
+
+def overlay_layers_lock_key(prefix_name: str) -> str:
+    return f'layers:{prefix_name}'
+
+
+def fetch_lock_folder() -> Path:
+    folder = os.environ.get(LOCK_FOLDER_ENV)
+    if folder:
+        return Path(folder)
+
+    return Path(tempfile.gettempdir()) / f'aki-locks-{os.getuid()}'
+
+
+@contextlib.contextmanager
+def hold_locks(keys: Iterable[str], timeout: float = DEFAULT_LOCK_TIMEOUT, shared_keys: Iterable[str] = ()):
+    """
+    Hold the locks of keys, waiting up to timeout seconds for each one. Locks are taken in the order of keys so that
+    two processes that need the same locks do not wait for each other.
+    Locks of shared_keys are shared with other readers, e.g. the source of several copies
+    """
+    keys = set(keys)
+    mode_by_key = {key: fcntl.LOCK_SH for key in set(shared_keys) - keys}
+    mode_by_key.update({key: fcntl.LOCK_EX for key in keys})
+
+    acquired: List[str] = []
+    try:
+        for key in sorted(mode_by_key):
+            _acquire(key, timeout, mode_by_key[key])
+            acquired.append(key)
+        yield
+    finally:
+        for key in reversed(acquired):
+            _release(key)
+
+
+def fetch_held_locks() -> Dict[str, Tuple[int, int, int]]:
+    """
+    Locks held by the current thread, to be used by worker threads with use_held_locks
+    """
+    return dict(_held_locks.by_key)
+
+
+@contextlib.contextmanager
+def use_held_locks(held_locks: Mapping[str, Tuple[int, int, int]]):
+    """
+    Let the current thread use locks held by another thread, that thread keeps them until it releases them
+    """
+    previous_by_key = _held_locks.by_key
+    # One more count than released by the current thread, its releases never close the file
+    _held_locks.by_key = {key: (fd, count + 1, mode) for key, (fd, count, mode) in held_locks.items()}
+    try:
+        yield
+    finally:
+        _held_locks.by_key = previous_by_key
+
+
+def _lock_path(key: str) -> Path:
+    # Keys contain paths, the hash keeps file names unique and short
+    readable_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', key)[-80:]
+    return fetch_lock_folder() / f'{readable_name}.{hashlib.sha1(key.encode()).hexdigest()[:12]}.lock'
+
+
+def _acquire(key: str, timeout: float, mode: int = fcntl.LOCK_EX):
+    if key in _held_locks.by_key:
+        fd, count, held_mode = _held_locks.by_key[key]
+        if mode == fcntl.LOCK_EX and held_mode == fcntl.LOCK_SH:
+            # The upgrade is kept until the lock is released by every holder of the thread. flock releases the shared
+            # lock before taking the exclusive one, two threads upgrading the same lock do not wait for each other
+            _wait_for_lock(key, fd, timeout, mode)
+            held_mode = mode
+        _held_locks.by_key[key] = fd, count + 1, held_mode
+        return
+
+    path = _lock_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        _wait_for_lock(key, fd, timeout, mode)
+    except BaseException:
+        os.close(fd)
+        raise
+
+    _held_locks.by_key[key] = fd, 1, mode
+
+
+def _wait_for_lock(key: str, fd: int, timeout: float, mode: int):
+    start = time.monotonic()
+    is_waiting = False
+    while not _try_lock(fd, mode):
+        wait_duration = time.monotonic() - start
+        if wait_duration >= timeout:
+            raise LockTimeoutScriptError(f'Timeout after {wait_duration:.0f}s waiting for {key}, '
+                                         f'another aki process uses it')
+
+        if not is_waiting:
+            print_info(f'Waiting for {key}, another aki process or project uses it')
+            is_waiting = True
+        time.sleep(_RETRY_DELAY)
+
+    print_verbose('lock %s acquired after %.3fs', key, time.monotonic() - start)
+
+
+def _release(key: str):
+    fd, count, mode = _held_locks.by_key[key]
+    if count > 1:
+        _held_locks.by_key[key] = fd, count - 1, mode
+        return
+
+    del _held_locks.by_key[key]
+    # Closing the file releases the lock
+    os.close(fd)
+
+
+def _try_lock(fd: int, mode: int) -> bool:
+    try:
+        fcntl.flock(fd, mode | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
@@ -0,0 +1,178 @@
+"""
+Log of aki: verbose messages and operations, with the time elapsed since aki started and the context of the thread
+(project, volume type, container...).
+
+Messages use %-style arguments, they are formatted only if the log is read: verbose mode prints debug messages of the
+threads where it is on, the log file receives every message as a JSON object by line. Without both, nothing is
+formatted.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+# Log file of the command line when --log-file is not set
+LOG_FILE_ENV = 'AKI_LOG_FILE'
+
+_START = time.monotonic()
+
+logger = logging.getLogger('aki')
+logger.setLevel(logging.DEBUG)
+# Handlers of the application that imports aki do not receive its log
+logger.propagate = False
+logger.addHandler(logging.NullHandler())
+
+_is_verbose_by_default = False
+_file_handler: Union[logging.Handler, None] = None
+
+# Verbose mode and context of the current thread
+_thread_state = threading.local()
+
+# Attributes of log records that are not context
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'elapsed', 'context'}
+
+
+def set_verbose(is_verbose: bool):
+    """
+    Set verbose mode of threads that do not set their own
+    """
+    global _is_verbose_by_default
+    _is_verbose_by_default = is_verbose
+
+
+def is_verbose() -> bool:
+    is_thread_verbose = getattr(_thread_state, 'is_verbose', None)
+    return _is_verbose_by_default if is_thread_verbose is None else is_thread_verbose
+
+
+def is_debug_enabled() -> bool:
+    """
+    True if a debug message of the current thread is read, by verbose mode or the log file
+    """
+    return _file_handler is not None or is_verbose()
+
+
+def is_file_enabled() -> bool:
+    return _file_handler is not None
+
+
+@contextmanager
+def verbose(is_verbose_in_thread: Union[bool, None]):
+    """
+    Set verbose mode of the current thread while in the context, None uses the mode of aki
+    """
+    previous = getattr(_thread_state, 'is_verbose', None)
+    _thread_state.is_verbose = is_verbose_in_thread
+    try:
+        yield
+    finally:
+        _thread_state.is_verbose = previous
+
+
+def open_log_file(path: Union[Path, str, None]):
+    """
+    Append the log of aki to the file path, a JSON object by line. None closes the log file
+    """
+    global _file_handler
+    if _file_handler:
+        logger.removeHandler(_file_handler)
+        _file_handler.close()
+        _file_handler = None
+
+    if path:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(_JsonFormatter())
+        logger.addHandler(handler)
+        _file_handler = handler
+
+
+def current_context() -> Dict[str, str]:
+    return getattr(_thread_state, 'context', {})
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    Add fields to the context of the messages of the current thread while in the context
+    """
+    previous = current_context()
+    _thread_state.context = {**previous, **{key: value for key, value in fields.items() if value is not None}}
+    try:
+        yield
+    finally:
+        _thread_state.context = previous
+
+
+@contextmanager
+def log_operation(name: str, **fields):
+    """
+    Log the start and the end of operation name with its duration, fields are added to the context while it runs
+    """
+    with log_context(operation=name, **fields):
+        start = time.monotonic()
+        logger.debug('%s started', name)
+        is_success = False
+        try:
+            yield
+            is_success = True
+        finally:
+            duration = time.monotonic() - start
+            logger.debug('%s %s in %.3fs', name, 'done' if is_success else 'failed', duration,
+                         extra={'duration': round(duration, 6), 'success': is_success})
+
+
+def fetch_log_state() -> Tuple[Union[bool, None], Dict[str, str]]:
+    """
+    Return verbose mode and context of the current thread, for use_log_state in a worker thread
+    """
+    return getattr(_thread_state, 'is_verbose', None), current_context()
+
+
+@contextmanager
+def use_log_state(state: Tuple[Union[bool, None], Dict[str, str]]):
+    is_verbose_in_thread, context = state
+    with verbose(is_verbose_in_thread), log_context(**context):
+        yield
+
+
+def format_verbose(record: logging.LogRecord) -> str:
+    """
+    Line of a message printed in verbose mode, prefixed with the seconds elapsed since aki started
+    """
+    return f'[{record.elapsed:8.3f}] {record.getMessage()}'
+
+
+class _ContextFilter(logging.Filter):
+    """
+    Add elapsed time and context of the current thread to the records
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.elapsed = time.monotonic() - _START
+        record.context = current_context()
+        return True
+
+
+class _JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': round(record.created, 6),
+            'elapsed': round(record.elapsed, 6),
+            'level': record.levelname.lower(),
+            'pid': record.process,
+            'thread': record.threadName,
+            **record.context,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+logger.addFilter(_ContextFilter())
@@ -0,0 +1,166 @@
+"""
+Streaming output of aki ls. Rows are written one by one as they are merged from the sorted volumes of each type: the
+rows, with their sizes and dates, are not kept.
+"""
+import heapq
+import itertools
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Union
+
+from aki._catalog import volume_sort_key
+from aki._colorize import colorize_in_green
+from aki._format import format_size, format_elapsed
+from aki._print import print_info
+from aki.volume import Volume
+
+LS_FORMAT_TABLE = 'table'
+LS_FORMAT_PROGRESSIVE = 'progressive'
+LS_FORMAT_JSON = 'json'
+LS_FORMAT_NDJSON = 'ndjson'
+LS_FORMAT_TSV = 'tsv'
+LS_FORMATS = [LS_FORMAT_TABLE, LS_FORMAT_PROGRESSIVE, LS_FORMAT_JSON, LS_FORMAT_NDJSON, LS_FORMAT_TSV]
+# Formats read by programs, the rows of the projects of a workspace are written together
+LS_RECORD_FORMATS = [LS_FORMAT_JSON, LS_FORMAT_NDJSON]
+
+
+class VolumeRow(NamedTuple):
+    aki_name: str
+    volume_by_type: Dict[str, Volume]
+    current_types: List[str]  # types whose container uses the volume
+    size: Union[int, None] = None  # bytes, all types merged
+    last_used_at: Union[float, None] = None  # most recent use of a type
+
+
+def merge_volumes_by_aki_name(sorted_volumes_by_type: Dict[str, Iterable[Volume]]) -> Iterator[Dict[str, Volume]]:
+    """
+    Merge volumes of each type, sorted by volume_sort_key of their aki name, yield the volumes of an aki name by type
+    """
+    def typed_volumes(volume_type: str, volumes: Iterable[Volume]):
+        for volume in volumes:
+            yield volume_sort_key(volume.aki_name), volume_type, volume
+
+    merged_volumes = heapq.merge(*[typed_volumes(volume_type, volumes)
+                                   for volume_type, volumes in sorted_volumes_by_type.items()],
+                                 key=lambda typed_volume: typed_volume[0])
+
+    for _, group in itertools.groupby(merged_volumes, key=lambda typed_volume: typed_volume[0]):
+        yield {volume_type: volume for _, volume_type, volume in group}
+
+
+def write_rows(ls_format: str, volume_types: List[str], rows: Iterable[VolumeRow], external_name: bool = False,
+               details: bool = False):
+    """
+    Write rows in a streaming format, LS_FORMAT_TABLE needs every row and is not handled here
+    """
+    if ls_format == LS_FORMAT_PROGRESSIVE:
+        _write_progressive_table(volume_types, rows, external_name, details)
+    elif ls_format in LS_RECORD_FORMATS:
+        write_records(ls_format, (row_to_record(row, details) for row in rows))
+    elif ls_format == LS_FORMAT_TSV:
+        _write_tsv(volume_types, rows, details)
+    else:
+        raise ValueError(f'unknown ls format {ls_format}')
+
+
+def write_records(ls_format: str, records: Iterable[Dict]):
+    """
+    Write records of row_to_record in ls_format, one of LS_RECORD_FORMATS, as they come
+    """
+    if ls_format == LS_FORMAT_NDJSON:
+        for record in records:
+            print_info(json.dumps(record))
+    elif ls_format == LS_FORMAT_JSON:
+        # An array with a row by line, valid json that is still written progressively
+        print_info('[')
+        for index, record in enumerate(records):
+            print_info(('  ' if index == 0 else ', ') + json.dumps(record))
+        print_info(']')
+    else:
+        raise ValueError(f'ls format {ls_format} does not write records')
+
+
+def row_to_record(row: VolumeRow, details: bool, project_name: Union[str, None] = None) -> Dict:
+    """
+    Record of a row in LS_RECORD_FORMATS, with a project field if project_name is set, e.g. in a workspace
+    """
+    record = {'project': project_name} if project_name is not None else {}
+    record['name'] = row.aki_name
+    record['volumes'] = {
+        volume_type: {'name': volume.external_name, 'current': volume_type in row.current_types}
+        for volume_type, volume in row.volume_by_type.items()
+    }
+    if details:
+        record['size'] = row.size
+        record['last_used_at'] = row.last_used_at
+
+    return record
+
+
+def _write_tsv(volume_types: List[str], rows: Iterable[VolumeRow], details: bool):
+    """
+    A column by type contains the volume name in docker or its path, empty if the volume does not exist.
+    Column current lists the types whose container uses the volume, separated by a comma
+    """
+    header = ['volume', *volume_types, 'current']
+    if details:
+        header += ['size', 'last_used_at']
+    print_info('\t'.join(header))
+
+    for row in rows:
+        columns = [row.aki_name]
+        columns += [row.volume_by_type[volume_type].external_name if volume_type in row.volume_by_type else ''
+                    for volume_type in volume_types]
+        columns.append(','.join(row.current_types))
+        if details:
+            columns.append(str(row.size) if row.size is not None else '')
+            columns.append(f'{row.last_used_at:.0f}' if row.last_used_at is not None else '')
+        print_info('\t'.join(columns))
+
+
+def _write_progressive_table(volume_types: List[str], rows: Iterable[VolumeRow], external_name: bool, details: bool):
+    """
+    Same table as the default format but printed line by line: column sizes do not depend on the volume names, a
+    name longer than its column shifts the rest of its line
+    """
+    aki_name_column_size = 24
+    column_size_by_type = {
+        volume_type: max(len(volume_type) + 2, 40 if external_name else 0)
+        for volume_type in volume_types
+    }
+
+    header_template = f'{{:<{aki_name_column_size}}}' + ''.join(
+        f'{{:<{column_size}}}' for column_size in column_size_by_type.values()
+    )
+    header = ['VOLUME'] + [volume_type.upper() for volume_type in volume_types]
+    if details:
+        header_template += '{:<10}{:<12}'
+        header += ['SIZE', 'LAST USED']
+    print_info(header_template.format(*header))
+
+    now = time.time()
+    for row in rows:
+        is_current = len(row.current_types) > 0
+        line = _pad(colorize_in_green(row.aki_name) if is_current else row.aki_name, row.aki_name,
+                    aki_name_column_size)
+
+        for volume_type in volume_types:
+            volume = row.volume_by_type.get(volume_type)
+            if external_name:
+                text = volume.external_name if volume else '-'
+            else:
+                text = '\U00002714' if volume else 'x'
+
+            is_volume_current = volume_type in row.current_types
+            line += _pad(colorize_in_green(text) if is_volume_current else text, text,
+                         column_size_by_type[volume_type])
+
+        if details:
+            line += '{:<10}{:<12}'.format(format_size(row.size),
+                                          format_elapsed(now - row.last_used_at if row.last_used_at else None))
+        print_info(line)
+
+
+def _pad(text: str, visible_text: str, column_size: int) -> str:
+    # Colors are not visible, only visible characters count. Columns are separated by 2 spaces at least
+    return text + ' ' * max(column_size - len(visible_text), 2)
@@ -0,0 +1,60 @@
+import re
+from typing import Iterable
+
+from aki.error import ScriptError
+
+
+class VolumeMatcher:
+    """
+    Match aki names against several regex patterns or literal names in a single pass.
+    A name matches if it matches any pattern or any literal name, reverse_match keeps the names that match none
+    """
+
+    def __init__(self, patterns: Iterable[str] = (), names: Iterable[str] = (), reverse_match: bool = False):
+        self.names = frozenset(names)
+        self.reverse_match = reverse_match
+        self._regexes = _compile_patterns(list(patterns))
+
+    @classmethod
+    def from_patterns(cls, patterns: Iterable[str], reverse_match: bool = False) -> 'VolumeMatcher':
+        return cls(patterns=patterns, reverse_match=reverse_match)
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> 'VolumeMatcher':
+        return cls(names=names)
+
+    def match(self, aki_name: str) -> bool:
+        is_match = aki_name in self.names or any(regex.search(aki_name) for regex in self._regexes)
+        return not is_match if self.reverse_match else is_match
+
+    def __repr__(self):
+        patterns = [regex.pattern for regex in self._regexes]
+        return f'VolumeMatcher({patterns=}, names={sorted(self.names)}, reverse_match={self.reverse_match})'
+
+
+# Inline flags that apply to the whole regex, e.g. (?i). Python before 3.11 accepts them anywhere in a pattern: once
+# combined, the flags of a pattern would apply to the others
+_GLOBAL_FLAGS = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+def _compile_patterns(patterns):
+    """
+    Combine patterns in an alternation searched once by name. Patterns with groups keep their own regex as group
+    numbers of back references would change once combined, so do patterns with global flags
+    """
+    regexes = []
+    for pattern in patterns:
+        try:
+            regexes.append(re.compile(pattern))
+        except re.error as e:
+            raise ScriptError(f'Pattern \'{pattern}\' is invalid : {e}')
+
+    separate_regexes = [regex for regex in regexes if regex.groups or _GLOBAL_FLAGS.search(regex.pattern)]
+    combined_patterns = [regex.pattern for regex in regexes if regex not in separate_regexes]
+    if len(combined_patterns) < 2:
+        return regexes
+
+    try:
+        return [re.compile('|'.join(f'(?:{pattern})' for pattern in combined_patterns)), *separate_regexes]
+    except re.error:
+        return regexes
@@ -1,54 +1,108 @@
+import logging
 import sys
+import threading
+from contextlib import contextmanager
+from typing import TextIO, Union
 
 from aki._colorize import colorize_in_red, colorize_in_green
+from aki._log import logger, format_verbose, is_debug_enabled, is_file_enabled, is_verbose, set_verbose
 
-PRINT_VERBOSE = False
+# Output of the current thread when redirected, projects of a workspace print in their own buffer
+_thread_output = threading.local()
 
 
 def _set_print_verbose(new_print_verbose):
     """
     Set if the script can print verbose text
     """
-    global PRINT_VERBOSE
-    PRINT_VERBOSE = new_print_verbose
+    set_verbose(new_print_verbose)
+
+
+@contextmanager
+def redirect_output(file: Union[TextIO, None]):
+    """
+    Print texts of the current thread, errors included, to file. None restores stdout and stderr
+    """
+    previous_file = current_output()
+    _thread_output.file = file
+    try:
+        yield file
+    finally:
+        _thread_output.file = previous_file
+
+
+def current_output() -> Union[TextIO, None]:
+    """
+    Return the file the current thread is redirected to, None if it prints to stdout
+    """
+    return getattr(_thread_output, 'file', None)
 
 
 def print_info(text: str = '', **kwargs):
     """
     Print text
     """
-    print(text, **kwargs)
+    print(text, file=current_output() or sys.stdout, **kwargs)
+    _log_printed(logging.INFO, text)
+
+
+def print_output(text: str, is_error: bool = False):
+    """
+    Print the output of another thread, already logged. is_error prints it to sys.stderr
+    """
+    file = current_output() or (sys.stderr if is_error else sys.stdout)
+    print(text, end='' if text.endswith('\n') else '\n', file=file)
 
 
 def print_error(text, **kwargs):
     """
     Print error text to file sys.stderr
     """
-    print(colorize_in_red(text), file=sys.stderr, **kwargs)
+    print(colorize_in_red(text), file=current_output() or sys.stderr, **kwargs)
+    _log_printed(logging.ERROR, text)
 
 
 def print_success(text, **kwargs):
     """
     Print success text
     """
-    print(colorize_in_green(text), **kwargs)
+    print(colorize_in_green(text), file=current_output() or sys.stdout, **kwargs)
+    _log_printed(logging.INFO, text)
 
 
-def print_verbose(text='', **kwargs):
+def print_verbose(text='', *args):
     """
-    Print verbose text
+    Print verbose text, formatted with %-style args only if verbose mode or the log file reads it
     """
-    if PRINT_VERBOSE:
-        print(text, **kwargs)
-    else:
-        pass
+    if is_debug_enabled():
+        logger.debug(text, *args)
 
 
-def print_debug_def(fn, **kwargs):
+def print_debug_def(fn):
     """
     If verbose, execute function and print result
     """
-    if PRINT_VERBOSE:
-        print(fn(), **kwargs)
-    else:
-        pass
+    if is_debug_enabled():
+        logger.debug('%s', fn())
+
+
+def _log_printed(level: int, text):
+    # Printed texts are in the log file, the console already shows them
+    if is_file_enabled() and text != '':
+        logger.log(level, '%s', text)
+
+
+class _VerboseHandler(logging.Handler):
+    """
+    Print debug messages to the output of their thread, if its verbose mode is on
+    """
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno == logging.DEBUG and is_verbose():
+            print(format_verbose(record), file=current_output() or sys.stdout)
+
+
+logger.addHandler(_VerboseHandler())
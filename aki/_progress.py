@@ -0,0 +1,141 @@
+"""
+Progress of copies: bytes and files done, throughput and ETA.
+Copies add what they have done, a thread renders it periodically so copies never wait for the output. On a terminal
+the progress is a single line updated in place, otherwise a line is printed from time to time. A callback replaces
+the output for callers of the Python API.
+"""
+import sys
+import threading
+import time
+from typing import Callable, TextIO, Union
+
+from aki._format import format_duration, format_size
+from aki._print import current_output
+
+TTY_RENDER_INTERVAL = 0.5  # seconds between two updates of the progress line on a terminal
+LOG_RENDER_INTERVAL = 10.0  # seconds between two progress lines in a log
+
+
+class CopyProgress:
+    """
+    Progress of a copy shared by its threads. Use it as a context manager to render it while the copy runs.
+    total_bytes is the size of the source if known, done_bytes and done_files what a resumed copy already did.
+    callback receives the progress instead of printing it, the last time when the copy ends
+    """
+
+    def __init__(self, label: str, total_bytes: Union[int, None] = None, done_bytes: int = 0, done_files: int = 0,
+                 file: Union[TextIO, None] = None, callback: Union[Callable[['CopyProgress'], None], None] = None):
+        self.label = label
+        self.total_bytes = total_bytes
+        self.done_bytes = done_bytes
+        self.done_files = done_files
+        # The render thread prints to the output of the thread that created the progress, a workspace buffer included
+        self._file = file or current_output() or sys.stdout
+        self._is_tty = _is_tty(self._file)
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._start_bytes = done_bytes
+        self._start = time.monotonic()
+        self._stop_event = threading.Event()
+        self._render_thread: Union[threading.Thread, None] = None
+        self._line_length = 0
+
+    def add(self, size: int, files: int = 0):
+        """
+        Count bytes and files just copied
+        """
+        with self._lock:
+            self.done_bytes += size
+            self.done_files += files
+
+    def update(self, done_bytes: int, done_files: Union[int, None] = None):
+        """
+        Set bytes and files done, for copies that measure their destination
+        """
+        with self._lock:
+            self.done_bytes = done_bytes
+            if done_files is not None:
+                self.done_files = done_files
+
+    def throughput(self) -> Union[float, None]:
+        """
+        Bytes per second since the progress started, bytes done before a resume excluded
+        """
+        duration = time.monotonic() - self._start
+        return (self.done_bytes - self._start_bytes) / duration if duration > 0 else None
+
+    def eta(self) -> Union[float, None]:
+        """
+        Seconds before the copy is done at the current throughput, None if unknown
+        """
+        throughput = self.throughput()
+        if not self.total_bytes or not throughput:
+            return None
+
+        return max(self.total_bytes - self.done_bytes, 0) / throughput
+
+    def format(self) -> str:
+        with self._lock:
+            done_bytes = self.done_bytes
+            done_files = self.done_files
+
+        text = f'{self.label} - {format_size(done_bytes)}'
+        if self.total_bytes:
+            percent = min(done_bytes * 100 // self.total_bytes, 100)
+            text += f' / {format_size(self.total_bytes)} ({percent}%)'
+        text += f' - {done_files} files'
+
+        throughput = self.throughput()
+        if throughput is not None:
+            text += f' - {format_size(int(throughput))}/s'
+        eta = self.eta()
+        if eta is not None:
+            text += f' - ETA {format_duration(eta)}'
+
+        return text
+
+    def __enter__(self) -> 'CopyProgress':
+        self._start = time.monotonic()
+        self._stop_event.clear()
+        self._render_thread = threading.Thread(target=self._render_loop, name='aki_progress', daemon=True)
+        self._render_thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        if self._render_thread:
+            self._render_thread.join()
+            self._render_thread = None
+
+        if self._callback:
+            self._callback(self)
+        elif self._is_tty and self._line_length:
+            # Clear the line, the copy prints its own result
+            self._file.write('\r' + ' ' * self._line_length + '\r')
+            self._file.flush()
+
+    def _render_loop(self):
+        interval = TTY_RENDER_INTERVAL if self._is_tty or self._callback else LOG_RENDER_INTERVAL
+        while not self._stop_event.wait(interval):
+            self._render()
+
+    def _render(self):
+        if self._callback:
+            self._callback(self)
+            return
+
+        text = self.format()
+        if self._is_tty:
+            # Spaces erase the end of a longer previous line
+            self._file.write('\r' + text.ljust(self._line_length))
+            self._line_length = len(text)
+        else:
+            self._file.write(text + '\n')
+        self._file.flush()
+
+
+def _is_tty(file: TextIO) -> bool:
+    try:
+        return file.isatty()
+    except (AttributeError, ValueError):
+        return False
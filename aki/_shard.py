@@ -0,0 +1,233 @@
+"""
+Sharded copy of a volume in a helper container.
+
+A first container lists the source tree: size and number of entries of its folders, down to MAX_SPLIT_DEPTH. The tree
+is split in units balanced by size and file count, units are dealt to shards and a second container copies each shard
+with its own cp process. The result is the one of `cp -a /source/. /destination`: folders split between units are
+created first and get the metadata of their source once every shard is done.
+"""
+import math
+import posixpath
+import re
+import shlex
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Union
+
+DEFAULT_SHARD_WORKERS = 4
+
+# Folders deeper than this are copied as a whole, the listing stays small whatever the number of files
+MAX_SPLIT_DEPTH = 4
+
+# Printed by the listing when the tree cannot be split: shards would copy hardlinks as distinct files, and names with
+# a new line cannot be listed line by line
+_SINGLE_MARKER = 'aki-shard-single'
+_LISTING_PREFIX = 'aki-shard'
+# Bytes a file costs to copy besides its content: create, open and metadata
+_FILE_COST = 64 * 1024
+# A shard is split in this number of units at least, the last units fill the shards that finish first
+_UNITS_BY_SHARD = 4
+# Sub folders lighter than a unit divided by this are copied with the entries of their parent
+_MIN_UNIT_RATIO = 8
+
+# du -ak lists every entry after its content. A path is a folder if it was the parent of a previous entry. Entries are
+# counted on their folder, or on their ancestor at max_depth. Folder lines hold the size of their content, they only
+# count as an entry
+_LISTING_AWK = r'''
+BEGIN { FS = "\t" }
+!/^[0-9]+\t/ { invalid = 1; exit }
+{
+    path = substr($0, index($0, "\t") + 1)
+    if (path == ".") { next }
+    depth = gsub(/\//, "/", path)
+    owner = path
+    sub(/\/[^\/]*$/, "", owner)
+    parents[owner] = 1
+    is_folder = (path in parents)
+    delete parents[path]
+    if (is_folder && depth <= max_depth) { folders[path] = 1; next }
+    for (level = depth - 1; level > max_depth; level--) { sub(/\/[^\/]*$/, "", owner) }
+    if (!is_folder) { sizes[owner] += $1 }
+    counts[owner]++
+}
+END {
+    if (invalid) { print "SINGLE"; exit }
+    folders["."] = 1
+    for (folder in folders) { printf "PREFIX\t%.0f\t%.0f\t%s\n", sizes[folder], counts[folder], folder }
+}
+'''.replace('SINGLE', _SINGLE_MARKER).replace('PREFIX', _LISTING_PREFIX)
+
+
+@dataclass(frozen=True)
+class CopyUnit:
+    """
+    Part of a tree copied by one cp: the whole folder, or its entries except the excluded sub folders. Entries of a
+    folder may be spread over several units, part of part_count
+    """
+    path: str  # relative to the copied folder, '.' is the copied folder itself
+    weight: int
+    is_recursive: bool
+    excluded_names: Tuple[str, ...] = ()
+    part: int = 0
+    part_count: int = 1
+
+
+@dataclass(frozen=True)
+class CopyPlan:
+    shards: List[List[CopyUnit]]
+    split_folders: List[str]  # folders whose content is split between units, parents first
+
+
+def listing_command(source_folder: str = '/source') -> str:
+    """
+    Command of the container that lists source_folder, its output is read by parse_listing
+    """
+    script = (f'cd {shlex.quote(source_folder)} || exit 1\n'
+              f'if find . -type f -links +1 | grep -q .; then echo {_SINGLE_MARKER}; exit 0; fi\n'
+              f'du -ak . | awk -v max_depth={MAX_SPLIT_DEPTH} {shlex.quote(_LISTING_AWK)}')
+    return f'sh -c {shlex.quote(script)}'
+
+
+def parse_listing(output: str) -> Union[Dict[str, Tuple[int, int]], None]:
+    """
+    Return bytes and number of entries by folder of the listing, entries of sub folders of the listing excluded.
+    None if the tree cannot be split
+    """
+    listing = {}
+    for line in output.splitlines():
+        if line.strip() == _SINGLE_MARKER:
+            return None
+
+        parts = line.split('\t', 3)
+        if len(parts) != 4 or parts[0] != _LISTING_PREFIX:
+            continue
+        try:
+            listing[parts[3]] = (int(parts[1]) * 1024, int(parts[2]))
+        except ValueError:
+            return None
+
+    return listing if '.' in listing else None
+
+
+def plan_copy(listing: Union[Dict[str, Tuple[int, int]], None], workers: int) -> Union[CopyPlan, None]:
+    """
+    Split the tree of the listing in shards of about the same weight, one by worker. None if a single cp copies it as
+    fast: one worker, or a tree that does not split
+    """
+    if not listing or workers < 2:
+        return None
+
+    children_by_path: Dict[str, List[str]] = defaultdict(list)
+    for path in listing:
+        if path != '.':
+            children_by_path[posixpath.dirname(path)].append(path)
+
+    total_by_path: Dict[str, int] = {}
+
+    def total_weight(path: str) -> int:
+        if path not in total_by_path:
+            size, count = listing[path]
+            total_by_path[path] = size + count * _FILE_COST + sum(total_weight(child)
+                                                                   for child in children_by_path[path])
+        return total_by_path[path]
+
+    target = total_weight('.') / (workers * _UNITS_BY_SHARD)
+    units: List[CopyUnit] = []
+    split_folders: List[str] = []
+
+    def split(path: str):
+        weight = total_weight(path)
+        if weight <= target or not children_by_path[path]:
+            units.append(CopyUnit(path, weight, True))
+            return
+
+        split_folders.append(path)
+        children = sorted(children_by_path[path])
+        detached = [child for child in children if total_weight(child) >= target / _MIN_UNIT_RATIO]
+        for child in detached:
+            split(child)
+
+        loose_weight = weight - sum(total_weight(child) for child in detached)
+        loose_entries = listing[path][1] + len(children) - len(detached)
+        part_count = max(1, min(math.ceil(loose_weight / target), loose_entries))
+        excluded_names = tuple(posixpath.basename(child) for child in detached)
+        for part in range(part_count):
+            units.append(CopyUnit(path, loose_weight // part_count, False, excluded_names, part, part_count))
+
+    split('.')
+
+    # Heaviest units first, each to the lightest shard
+    shards: List[List[CopyUnit]] = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for unit in sorted(units, key=lambda u: u.weight, reverse=True):
+        index = loads.index(min(loads))
+        shards[index].append(unit)
+        loads[index] += unit.weight
+
+    shards = [shard for shard in shards if shard]
+    if len(shards) < 2:
+        return None
+
+    return CopyPlan(shards, split_folders)
+
+
+def copy_command(plan: Union[CopyPlan, None], source_folder: str = '/source',
+                 destination_folder: str = '/destination') -> str:
+    """
+    Command of the container that copies source_folder into destination_folder, with a cp by shard of the plan
+    """
+    if plan is None:
+        return f'cp -a {source_folder}/. {destination_folder}'
+
+    lines = ['status=0', 'pids=']
+    for path in plan.split_folders:
+        if path != '.':
+            lines.append(f'mkdir -p {_quote(destination_folder, path)} || exit 1')
+
+    for shard in plan.shards:
+        commands = ' && '.join(_unit_command(unit, source_folder, destination_folder) for unit in shard)
+        lines.append(f'( {commands} ) & pids="$pids $!"')
+    lines.append('for pid in $pids; do wait "$pid" || status=1; done')
+    lines.append('[ "$status" -eq 0 ] || exit "$status"')
+
+    # Content of split folders is written, their metadata can be set, deepest folders first
+    for path in reversed(plan.split_folders):
+        lines.append(f'{folder_metadata_command(_quote(source_folder, path), _quote(destination_folder, path))} '
+                     f'|| exit 1')
+
+    script = '\n'.join(lines)
+    return f'sh -c {shlex.quote(script)}'
+
+
+def folder_metadata_command(source: str, destination: str) -> str:
+    """
+    Shell command that sets owner, permissions and dates of folder source on folder destination, both already quoted
+    """
+    return (f'chown "$(stat -c %u:%g {source})" {destination} && chmod "$(stat -c %a {source})" {destination} && '
+            f'touch -r {source} {destination}')
+
+
+def _unit_command(unit: CopyUnit, source_folder: str, destination_folder: str) -> str:
+    source = posixpath.normpath(posixpath.join(source_folder, unit.path))
+    destination = _quote(destination_folder, unit.path)
+    if unit.is_recursive:
+        return f'cp -a {shlex.quote(source + "/.")} {destination}'
+
+    # Names have no new line, the listing checked it. The destination is $0 of the cp shell
+    command = f'cd {shlex.quote(source)} && find . -mindepth 1 -maxdepth 1'
+    for name in unit.excluded_names:
+        command += f' ! -name {shlex.quote(_escape_pattern(name))}'
+    if unit.part_count > 1:
+        command += f' | awk {shlex.quote(f"NR % {unit.part_count} == {unit.part}")}'
+    return command + f' | tr "\\n" "\\0" | xargs -0 -r sh -c \'exec cp -a "$@" "$0"\' {destination}'
+
+
+def _quote(folder: str, path: str) -> str:
+    return shlex.quote(posixpath.normpath(posixpath.join(folder, path)))
+
+
+def _escape_pattern(name: str) -> str:
+    """
+    Pattern of find -name that matches name only
+    """
+    return re.sub(r'([\[\]*?\\])', r'\\\1', name)
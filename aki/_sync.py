@@ -0,0 +1,98 @@
+"""
+Incremental sync of a copy in a helper container, the second phase of a live copy.
+
+The destination has been copied from the source while its container was running. Once the container is stopped or
+paused, source entries changed since the copy started, by their change time, are copied again and entries removed from
+the source are removed. busybox stat gives change times in seconds, entries changed in the second the copy started are
+copied again as well.
+"""
+import math
+import shlex
+
+from aki._shard import folder_metadata_command
+
+# The listing is read by awk in two files: kind and path of destination entries, then change time, kind and path of
+# source entries in the order of find, parents first. Operations are printed once both are read: removals of entries
+# missing from the source first, then copies of changed entries, then metadata of changed folders, deepest first
+_SYNC_AWK = r'''
+function parent(path) { sub(/\/[^\/]*$/, "", path); return path }
+FNR == NR {
+    split_at = index($0, "|")
+    is_destination_folder[substr($0, split_at + 1)] = (substr($0, 1, split_at - 1) == "directory")
+    next
+}
+{
+    split_at = index($0, "|")
+    head = substr($0, 1, split_at - 1)
+    path = substr($0, split_at + 1)
+    space_at = index(head, " ")
+    ctime = substr(head, 1, space_at - 1) + 0
+    is_folder = (substr(head, space_at + 1) == "directory")
+    seen[path] = 1
+    if (is_folder) { folder_at[FNR] = path; last_line = FNR }
+    if (copied_prefix != "" && index(path, copied_prefix) == 1) { next }
+
+    if (path in is_destination_folder && is_destination_folder[path] == is_folder) {
+        if (ctime < since) { next }
+        if (is_folder) { changed[path] = 1; next }
+        operations[++operation_count] = "R " path
+    } else if (path in is_destination_folder) {
+        operations[++operation_count] = "R " path
+    }
+    operations[++operation_count] = "C " path
+    changed[parent(path)] = 1
+    copied_prefix = is_folder ? path "/" : ""
+}
+END {
+    for (path in is_destination_folder) {
+        if (!(path in seen)) { removed[path] = 1; changed[parent(path)] = 1 }
+    }
+    for (path in removed) {
+        # Entries of a removed folder go with it
+        ancestor = parent(path)
+        while (ancestor != "." && !(ancestor in removed)) { ancestor = parent(ancestor) }
+        if (ancestor == ".") { print "R " path }
+    }
+    for (n = 1; n <= operation_count; n++) { print operations[n] }
+    for (line = last_line; line >= 1; line--) {
+        if ((line in folder_at) && (folder_at[line] in changed)) { print "M " folder_at[line] }
+    }
+    print "M ."
+}
+'''
+
+# Margin between the clock that dated the start of the copy and the clock of the file system, in seconds
+SYNC_CLOCK_MARGIN = 2
+
+
+def sync_command(since: float, source_folder: str = '/source', destination_folder: str = '/destination') -> str:
+    """
+    Command of the container that syncs destination_folder with source_folder, copied from it since the timestamp since
+    """
+    source = shlex.quote(source_folder)
+    destination = shlex.quote(destination_folder)
+    awk = shlex.quote(_SYNC_AWK)
+    script = f'''work=$(mktemp -d) || exit 1
+trap 'rm -rf "$work"' EXIT
+cd {source} || exit 1
+new_line='
+'
+if find . -name "*$new_line*" -o -type f -links +1 | grep -q .; then
+    # Hardlinks and names with a new line cannot be listed line by line, everything is copied again
+    find {destination} -mindepth 1 -maxdepth 1 -exec rm -rf {{}} + && cp -a {source}/. {destination}
+    exit $?
+fi
+find . -mindepth 1 -exec stat -c '%Z %F|%n' {{}} + > "$work/source" || exit 1
+cd {destination} && find . -mindepth 1 -exec stat -c '%F|%n' {{}} + > "$work/destination" || exit 1
+awk -v since={math.floor(since) - SYNC_CLOCK_MARGIN} {awk} "$work/destination" "$work/source" > "$work/sync" || exit 1
+status=0
+while IFS= read -r operation; do
+    path=${{operation#??}}
+    case $operation in
+        R*) rm -rf {destination}/"$path" || status=1 ;;
+        C*) cp -a {source}/"$path" {destination}/"$path" || status=1 ;;
+        M*) {folder_metadata_command(f'{source}/"$path"', f'{destination}/"$path"')} || status=1 ;;
+    esac
+done < "$work/sync"
+exit $status'''
+    return f'sh -c {shlex.quote(script)}'
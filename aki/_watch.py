@@ -0,0 +1,194 @@
+"""
+Watch the branch checked out in a git repository. Changes of HEAD are debounced, a rebase or several quick checkouts
+end up in a single notification of the final branch.
+"""
+import abc
+import ctypes
+import os
+import select
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Union
+
+from aki import platform_info
+from aki.error import ScriptError
+from aki._print import print_verbose
+
+DEFAULT_WATCH_DEBOUNCE = 2.0  # seconds without HEAD change before switching
+DEFAULT_WATCH_POLL_INTERVAL = 1.0  # seconds between two reads of HEAD when inotify is not available
+
+_HEAD_FILE_NAME = 'HEAD'
+_BRANCH_REF_PREFIX = 'ref: refs/heads/'
+
+# inotify constants, see inotify(7)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len followed by len bytes of name
+
+
+def find_git_head(folder: Path) -> Path:
+    """
+    Return the HEAD file of the git repository that contains folder, worktrees included
+    """
+    for parent in [folder, *folder.parents]:
+        git_path = parent / '.git'
+        if git_path.is_dir():
+            return git_path / _HEAD_FILE_NAME
+        if git_path.is_file():
+            # Worktree or submodule, .git contains the path of the real git folder
+            content = git_path.read_text().strip()
+            if content.startswith('gitdir:'):
+                git_folder = Path(content[len('gitdir:'):].strip())
+                return (parent / git_folder).resolve() / _HEAD_FILE_NAME
+
+    raise ScriptError(f'Cannot find a git repository that contains {folder}')
+
+
+def read_branch(head_path: Path) -> Union[str, None]:
+    """
+    Return the branch checked out, None if HEAD is detached as during a rebase
+    """
+    try:
+        content = head_path.read_text().strip()
+    except FileNotFoundError:
+        return None
+
+    return content[len(_BRANCH_REF_PREFIX):] if content.startswith(_BRANCH_REF_PREFIX) else None
+
+
+class HeadEvents(metaclass=abc.ABCMeta):
+    @abc.abstractmethod
+    def wait(self, timeout: Union[float, None]) -> bool:
+        """
+        Wait for a change of HEAD, return False if nothing changed before timeout. None waits forever
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class InotifyHeadEvents(HeadEvents):
+    """
+    Changes of HEAD notified by inotify. The git folder is watched as git replaces HEAD by renaming HEAD.lock
+    """
+
+    def __init__(self, head_path: Path):
+        # Symbols of libc are already loaded in the python process
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(self._fd, str(head_path.parent).encode(), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f'inotify_add_watch failed on {head_path.parent}')
+
+        self._name = head_path.name.encode()
+
+    def wait(self, timeout: Union[float, None]) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while True:
+            remaining = max(deadline - time.monotonic(), 0) if deadline is not None else None
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return False
+
+            if self._read_events():
+                return True
+
+    def _read_events(self) -> bool:
+        """
+        Read pending events, True if one of them is about HEAD
+        """
+        buffer = os.read(self._fd, 64 * 1024)
+        offset = 0
+        is_head_changed = False
+        while offset < len(buffer):
+            _, _, _, name_length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += _INOTIFY_EVENT.size
+            name = buffer[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            is_head_changed = is_head_changed or name == self._name
+
+        return is_head_changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingHeadEvents(HeadEvents):
+    """
+    Changes of HEAD found by reading it periodically, used when inotify is not available
+    """
+
+    def __init__(self, head_path: Path, interval: float = DEFAULT_WATCH_POLL_INTERVAL):
+        self._head_path = head_path
+        self._interval = interval
+        self._state = self._read_state()
+
+    def _read_state(self):
+        try:
+            head_stat = os.stat(self._head_path)
+            return head_stat.st_ino, head_stat.st_mtime_ns, self._head_path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def wait(self, timeout: Union[float, None]) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while True:
+            state = self._read_state()
+            if state != self._state:
+                self._state = state
+                return True
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+            time.sleep(self._interval if deadline is None else max(min(self._interval, deadline - time.monotonic()), 0))
+
+
+def create_head_events(head_path: Path) -> HeadEvents:
+    if platform_info.is_linux():
+        try:
+            return InotifyHeadEvents(head_path)
+        except (OSError, AttributeError) as e:
+            print_verbose('inotify is not available (%s), poll %s', e, head_path)
+
+    return PollingHeadEvents(head_path)
+
+
+def watch_branch(head_path: Path, on_branch: Callable[[str], None], debounce: float = DEFAULT_WATCH_DEBOUNCE,
+                 events: Union[HeadEvents, None] = None):
+    """
+    Call on_branch with the branch checked out each time it changes, until interrupted.
+    A change is handled once HEAD has not changed for debounce seconds, so a newer checkout cancels a pending one.
+    Changes that happen while on_branch runs are coalesced and handled when it returns
+    """
+    events = events or create_head_events(head_path)
+    current_branch = read_branch(head_path)
+    print_verbose('watch %s - current branch %s', head_path, current_branch)
+
+    try:
+        while True:
+            events.wait(None)
+            while events.wait(debounce):
+                print_verbose('HEAD changed again, postpone the switch')
+
+            branch = read_branch(head_path)
+            if branch is None:
+                print_verbose('HEAD is detached, wait for a branch')
+            elif branch == current_branch:
+                print_verbose('back to branch %s, nothing to do', branch)
+            else:
+                current_branch = branch
+                on_branch(branch)
+    finally:
+        events.close()
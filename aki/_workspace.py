@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+import docker
+import yaml
+from docker import DockerClient
+
+import aki._dict_parse_utils as dict_parse_utils
+from aki._config import fetch_default_aki_path
+from aki.config_key import ConfigKey
+from aki.error import ScriptError
+
+DEFAULT_WORKSPACE_PARALLEL = 4
+
+KEY_WORKSPACE = ConfigKey('workspace')
+KEY_WORKSPACE_PROJECTS = ConfigKey('projects', KEY_WORKSPACE.path)
+KEY_WORKSPACE_PARALLEL = ConfigKey('parallel', KEY_WORKSPACE.path)
+
+
+@dataclass(frozen=True)
+class WorkspaceProject:
+    name: str  # path of the project folder relative to the workspace file
+    aki_file: Path
+
+
+@dataclass
+class Workspace:
+    """
+    Several aki projects processed together, they share the docker client
+    """
+    docker_client: DockerClient
+    projects: List[WorkspaceProject]
+    parallel: int = DEFAULT_WORKSPACE_PARALLEL  # number of projects processed at the same time
+
+
+def import_workspace(yaml_file: Path) -> Workspace:
+    if not yaml_file.exists():
+        raise ScriptError(f'No such file or directory: {yaml_file}')
+
+    with open(yaml_file.resolve(), 'r') as stream:
+        config: Dict = yaml.load(stream, Loader=yaml.Loader) or {}
+
+    base_path = yaml_file.parent.resolve()
+    workspace_config = dict_parse_utils.get_dict(KEY_WORKSPACE, config)
+    projects = _get_projects_from_config(base_path, workspace_config)
+    parallel = dict_parse_utils.get_int(KEY_WORKSPACE_PARALLEL, workspace_config, mandatory=False) \
+        or DEFAULT_WORKSPACE_PARALLEL
+
+    return Workspace(docker.from_env(), projects, parallel)
+
+
+def _get_projects_from_config(base_path: Path, workspace_config: Dict) -> List[WorkspaceProject]:
+    projects = []
+    for path in dict_parse_utils.get_path_list(base_path, KEY_WORKSPACE_PROJECTS, workspace_config):
+        # A project is an aki file or a folder that contains one
+        aki_file = fetch_default_aki_path(path) if path.is_dir() else path
+        if not aki_file.exists():
+            raise ScriptError(f'Key \'{KEY_WORKSPACE_PROJECTS.path}\' - no such file or directory: {aki_file}')
+
+        try:
+            name = str(aki_file.parent.relative_to(base_path))
+        except ValueError:
+            name = str(aki_file.parent)
+        projects.append(WorkspaceProject(name if name != '.' else aki_file.parent.name, aki_file))
+
+    names = [project.name for project in projects]
+    duplicated_names = sorted({name for name in names if names.count(name) > 1})
+    if duplicated_names:
+        raise ScriptError(f'Key \'{KEY_WORKSPACE_PROJECTS.path}\' contains several times {", ".join(duplicated_names)}')
+
+    return projects
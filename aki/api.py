@@ -0,0 +1,136 @@
+"""
+Python API of aki: the operations of the command line run in the calling process and return their result instead of
+printing it. A session loads the aki file, the docker client and the volume index once, any number of operations
+reuse them.
+
+    with Session(Path('aki.yaml')) as session:
+        session.copy('dev', 'feature', switch_to_copy=True)
+        names = [row.aki_name for row in session.list_volumes()]
+
+Nothing is asked: operations that would ask raise ScriptError, their options answer instead.
+"""
+import io
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, TextIO, Union
+
+from docker import DockerClient
+
+import aki.cli as cli
+from aki._config import Config, import_config
+from aki._index import VolumeIndex
+from aki._log import verbose
+from aki._ls_format import VolumeRow
+from aki._print import redirect_output
+from aki._progress import CopyProgress
+from aki.volume import Volume
+
+__all__ = ['Session', 'UseResult', 'CopyResult', 'VolumeRow', 'CopyProgress']
+
+
+@dataclass(frozen=True)
+class UseResult:
+    name: str
+    is_switched: bool  # False if the containers already used the volume
+
+
+@dataclass(frozen=True)
+class CopyResult:
+    source: str
+    destination: str
+    copied_types: List[str]  # types without source volume or whose destination is kept are not copied
+
+
+class Session:
+    """
+    aki project whose operations run in process. State is kept by the session only: sessions of different projects
+    live side by side and threads may share a session, each operation runs in the thread that calls it.
+    output receives what the command line would print, it is discarded if None, verbose adds what --verbose prints.
+    config replaces the aki file
+    """
+
+    def __init__(self, aki_file: Union[Path, str, None] = None, docker_client: Union[DockerClient, None] = None,
+                 output: Union[TextIO, None] = None, config: Union[Config, None] = None, is_verbose: bool = False):
+        self.config = config or import_config(Path(aki_file) if aki_file else None, docker_client)
+        self._volume_index = VolumeIndex(self.config.state_path)
+        self._output = output
+        self._is_verbose = is_verbose
+
+    def list_volumes(self, pattern: Union[str, None] = None, reverse_match: bool = False,
+                     types: Union[List[str], None] = None, details: bool = False) -> List[VolumeRow]:
+        """
+        Return volumes by name, only those matching the regex pattern if any. details adds size and last use
+        """
+        with self._bind():
+            return cli.list_volumes(cli.select_aki_volumes(types), pattern, reverse_match, details)
+
+    def use(self, name: str, types: Union[List[str], None] = None) -> UseResult:
+        """
+        Switch containers to the volume and restart them
+        """
+        with self._bind():
+            is_switched = cli.use_volume(cli.select_aki_volumes(types), name)
+
+        return UseResult(name, is_switched)
+
+    def copy(self, source: str, destination: str, types: Union[List[str], None] = None, override: bool = False,
+             switch_to_copy: bool = False, restart_containers: bool = True,
+             progress: Union[Callable[[CopyProgress], None], None] = None, live: Union[bool, None] = None,
+             freeze: Union[str, None] = None) -> CopyResult:
+        """
+        Copy the source volume to destination, _current copies the volume used by containers. override replaces an
+        existing destination, otherwise the copy fails. progress is called periodically with the progress of each
+        volume type, from another thread. live copies while containers run and freeze them, stop or pause, to copy the
+        changes, both default to the config
+        """
+        with self._bind(progress):
+            copied_types = cli.copy_volume(cli.select_aki_volumes(types), source, destination, override,
+                                           switch_to_copy, restart_containers, live, freeze)
+
+        return CopyResult(source, destination, copied_types)
+
+    def remove(self, names: List[str], types: Union[List[str], None] = None, is_pattern: bool = False,
+               reverse_match: bool = False) -> Dict[str, List[Volume]]:
+        """
+        Remove volumes by name, or those matching any regex pattern. Return removed volumes by type
+        """
+        with self._bind():
+            catalog = cli.remove_volumes_by_name_or_pattern(cli.select_aki_volumes(types), names, is_pattern,
+                                                            reverse_match, is_force=True)
+
+        return catalog.volumes_by_type()
+
+    def close(self):
+        self._volume_index.close()
+
+    def __enter__(self) -> 'Session':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextmanager
+    def _bind(self, progress_callback: Union[Callable[[CopyProgress], None], None] = None):
+        """
+        Run an operation of the session in the current thread, the previous project of the thread is restored after
+        """
+        state = cli.project
+        saved = (state.config, state.volume_index, state.is_trash_filled, state.is_interactive,
+                 state.deferred_restart, state.volume_cache, state.progress_callback)
+        state.config, state.volume_index, state.is_trash_filled, state.is_interactive = \
+            self.config, self._volume_index, False, False
+        state.deferred_restart, state.volume_cache, state.progress_callback = None, None, progress_callback
+        try:
+            with redirect_output(self._output or _DiscardedOutput()), verbose(self._is_verbose):
+                yield
+                cli.purge_filled_trash()
+        finally:
+            (state.config, state.volume_index, state.is_trash_filled, state.is_interactive,
+             state.deferred_restart, state.volume_cache, state.progress_callback) = saved
+
+
+class _DiscardedOutput(io.TextIOBase):
+
+    def write(self, text: str) -> int:
+        return len(text)
@@ -1,27 +1,73 @@
 #!/usr/bin/env python
+import io
 import os
+import queue
 import subprocess
 import sys
 import argparse
+import threading
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, replace
 from functools import reduce
 from pathlib import Path
 from textwrap import dedent
-from typing import Dict, List, Set, Union
+from typing import Callable, Dict, Iterator, List, Tuple, Union
 
-from docker.errors import DockerException
+from docker.errors import ContainerError, DockerException
 from dotenv import dotenv_values
 
 import aki._config as config_importer
+from aki._config import COPY_FREEZE_PAUSE, COPY_FREEZES
 from aki.action import CopyAction, UseAction, ErrorAction, PyCodeAction, Action, RemoveAction
-from aki._colorize import colorize_in_green
+from aki._batch import DEFAULT_BATCH_PARALLEL, BatchOperation, DeferredRestart, VolumeListCache, plan_stages, \
+    read_operations
+from aki._colorize import colorize_in_green, colorize_in_red
+from aki._completion import COMPLETION_SHELLS, CompletionCache, completion_script
+from aki._compose import COMPOSE_CACHE_FOLDER_NAME, COMPOSE_LABEL_PREFIX, COMPOSE_PROJECT_LABEL, \
+    COMPOSE_SERVICE_LABEL, ContainerSpec, UnsupportedServiceError, create_service_container, fetch_compose_model
+from aki._format import format_size, format_elapsed, format_duration, parse_size, parse_duration
+from aki._catalog import VolumeCatalog, volume_sort_key
+from aki._gc import GcPolicy, GcUsage, plan_eviction
+from aki._index import VolumeIndex, VolumeMetadata
+from aki._io_policy import IoPolicy, IO_PRIORITIES, MAX_NICE
+from aki._journal import CopyJournal
+from aki._lock import hold_locks, env_lock_key, container_lock_key, volume_lock_key, fetch_held_locks, use_held_locks
+from aki._matcher import VolumeMatcher
+from aki._ls_format import LS_FORMAT_TABLE, LS_FORMATS, LS_RECORD_FORMATS, VolumeRow, merge_volumes_by_aki_name, \
+    row_to_record, write_records, write_rows
 from aki.error import ScriptError
-from aki._print import print_error, print_info, print_verbose, print_debug_def, print_success, \
-    _set_print_verbose, PRINT_VERBOSE
+from aki._log import LOG_FILE_ENV, fetch_log_state, is_verbose, log_context, log_operation, open_log_file, \
+    use_log_state
+from aki._print import print_error, print_info, print_verbose, print_debug_def, print_success, print_output, \
+    _set_print_verbose, redirect_output, current_output
+from aki._progress import CopyProgress
 from aki.version import __version__
-from aki.volume import AkiVolume, Volume
+from aki._watch import DEFAULT_WATCH_DEBOUNCE, find_git_head, watch_branch
+from aki._workspace import Workspace, WorkspaceProject, import_workspace
+from aki.volume import AkiVolume, FreeSpace, Volume
 
-config: config_importer.Config
+
+class _ProjectState(threading.local):
+    """
+    State of the aki project being processed, each thread of a workspace processes its own project
+    """
+    config: config_importer.Config = None
+    volume_index: VolumeIndex = None
+    is_trash_filled = False
+    is_interactive = True  # False when several projects or operations run at the same time or through the API
+    workspace_name: Union[str, None] = None  # name of the project in its workspace, None out of a workspace
+    # set by a workspace, records of ls are written once for all projects by the workspace
+    record_sink: Union[Callable[[Dict], None], None] = None
+    deferred_restart: Union[DeferredRestart, None] = None  # set by a batch, containers are restarted once at its end
+    volume_cache: Union[VolumeListCache, None] = None  # set by a batch, volumes are listed once
+    # set by the Python API, copies report their progress to it instead of printing it
+    progress_callback: Union[Callable[[CopyProgress], None], None] = None
+
+
+project = _ProjectState()
 
 
 def _print_matrix(matrix):
@@ -32,16 +78,62 @@ def _print_matrix(matrix):
     print_info('\n'.join(matrix_array))
 
 
-def _fetch_volumes_of_aki_volumes(aki_volume_by_type: Dict[str, AkiVolume], regex_pattern: str = None,
-                                  reverse_match: bool = False) -> Dict[str, List[Volume]]:
+def _fetch_volume_catalog(aki_volume_by_type: Dict[str, AkiVolume],
+                          matcher: Union[VolumeMatcher, None] = None) -> VolumeCatalog:
     """
-    Return volumes by aki volume type
+    Return volumes of all aki volume types indexed by aki name, only those selected by matcher if any.
+    Each type is listed once whatever the number of patterns
     """
-    volumes_by_aki_volume_type = {}
+    catalog = VolumeCatalog(aki_volume_by_type)
+    for volume_type, volumes in _fetch_volumes_by_type(aki_volume_by_type, matcher).items():
+        catalog.add_all(volume_type, volumes)
+    return catalog
+
+
+def _fetch_sorted_volumes_by_type(aki_volume_by_type: Dict[str, AkiVolume],
+                                  matcher: Union[VolumeMatcher, None] = None) -> Dict[str, List[Volume]]:
+    """
+    Return volumes of each type sorted by aki name, to be merged row by row without indexing all of them
+    """
+    return {
+        volume_type: sorted(volumes, key=lambda volume: volume_sort_key(volume.aki_name))
+        for volume_type, volumes in _fetch_volumes_by_type(aki_volume_by_type, matcher).items()
+    }
+
+
+def _fetch_volumes_by_type(aki_volume_by_type: Dict[str, AkiVolume],
+                           matcher: Union[VolumeMatcher, None] = None) -> Dict[str, List[Volume]]:
+    volumes_by_type = {}
+    listed_names_by_type = {}
     for volume_type, aki_volume in aki_volume_by_type.items():
-        volumes_by_aki_volume_type[volume_type] = list(aki_volume.fetch_volumes(regex_pattern, reverse_match))
+        volumes = project.volume_cache.fetch_volumes(volume_type) if project.volume_cache else None
+        if volumes is None:
+            volumes = list(aki_volume.fetch_volumes())
+
+            # A complete listing is the cheap moment to keep the index in sync with the real volumes
+            project.volume_index.reconcile(volume_type, volumes)
+            listed_names_by_type[volume_type] = [volume.aki_name for volume in volumes]
+            if project.volume_cache:
+                project.volume_cache.set_volumes(volume_type, volumes)
+
+        if matcher:
+            print_verbose('%s - filter %d volumes with %s', volume_type, len(volumes), matcher)
+            volumes = [volume for volume in volumes if matcher.match(volume.aki_name)]
+        volumes_by_type[volume_type] = volumes
 
-    return volumes_by_aki_volume_type
+    if listed_names_by_type:
+        _update_completion(lambda cache: cache.set_names(listed_names_by_type))
+    return volumes_by_type
+
+
+def _update_completion(update: Callable[[CompletionCache], None]):
+    """
+    Update volume names of the shell completion, completion is not worth failing a command
+    """
+    try:
+        update(CompletionCache(project.config.state_path, project.config.completion_ttl))
+    except OSError as e:
+        print_verbose('cannot update completion cache : %s', e)
 
 
 def _fetch_current_volume(aki_volume: AkiVolume) -> Union[Volume, None]:
@@ -58,35 +150,35 @@ def _fetch_current_volume(aki_volume: AkiVolume) -> Union[Volume, None]:
 
     if aki_volume.env_variable in env_config:
         current_volume = aki_volume.volume_name_to_volume(env_config[aki_volume.env_variable], is_aki_name=True)
-        print_verbose(f'found volume in docker compose env file : {current_volume}')
+        print_verbose('found volume in docker compose env file : %s', current_volume)
     else:
-        print_verbose(f'volume not found in docker compose env file')
+        print_verbose('volume not found in docker compose env file')
 
     return current_volume
 
 
 def _fetch_docker_env() -> Dict[str, str or None]:
-    print_verbose(f'loading docker compose env file {config.docker_env}')
-    env_path = config.docker_env
+    print_verbose('loading docker compose env file %s', project.config.docker_env)
+    env_path = project.config.docker_env
     env_config = dotenv_values(env_path)
-    print_verbose(f'docker compose env file content : {env_config}')
+    print_verbose('docker compose env file content : %s', env_config)
     return env_config
 
 
-def _use_volume_not_exists(name: str, volumes_by_type: Dict[str, List[Volume]], aki_volume_by_type: Dict[str, AkiVolume]):
-    print_verbose(f'fetching actions')
+def _use_volume_not_exists(name: str, catalog: VolumeCatalog, aki_volume_by_type: Dict[str, AkiVolume]):
+    print_verbose('fetching actions')
     current_volume_by_type = {
         volume_type: _fetch_current_volume(volume_spec)
         for volume_type, volume_spec in aki_volume_by_type.items()
     }
 
-    actions = config.use_not_found_action_fn(name, volumes_by_type, current_volume_by_type)
+    actions = project.config.use_not_found_action_fn(name, catalog.volumes_by_type(), current_volume_by_type)
     _execute_action(actions, aki_volume_by_type, f'Cannot find volume with name {name}')
 
 
 def _execute_action(action_param: Action or List[Action], volumes_spec_by_type: Dict[str, AkiVolume],
                     error_default_message: str):
-    print_verbose(f'actions receive {action_param}')
+    print_verbose('actions receive %s', action_param)
     actions = []
     if isinstance(action_param, Action) or action_param is None:
         actions.append(action_param)
@@ -106,7 +198,7 @@ def _execute_action(action_param: Action or List[Action], volumes_spec_by_type:
         }
 
     for action in actions:
-        print_verbose(f'executing action {action}')
+        print_verbose('executing action %s', action)
         if isinstance(action, CopyAction):
             print_verbose('start action copy')
             copy_volume(filter_type_of_volume_spec_by_type(action.types), action.source, action.destination,
@@ -138,6 +230,10 @@ def _ask_user_with_default(message: str, default_yes=True) -> bool:
     Ask user a question, response choice can be yes or no (y or n).
     If response is an empty string then use default choice
     """
+    if not project.is_interactive:
+        raise ScriptError(f'Cannot ask "{message}" while several projects or operations run or through the API, pass '
+                          f'an option to answer it')
+
     choice = 'Y/n' if default_yes else 'y/N'
     default_choice = 'y' if default_yes else 'n'
 
@@ -154,32 +250,266 @@ def _docker_compose_up():
     """
     docker sdk does not support docker compose. Use subprocess module instead
     """
-    print_info('Restarting containers')
-    docker_command = ['docker-compose'] if config.docker_compose_cli_version == '1' else ['docker', 'compose']
+    if project.deferred_restart:
+        print_info('Containers will be restarted at the end of the batch')
+        project.deferred_restart.is_pending = True
+        return
 
+    print_info('Restarting containers')
     cmd = [
-        *docker_command,
-        '--env-file', str(config.docker_env),
-        *reduce(lambda f, f2: f+f2, [('--file', str(compose)) for compose in config.docker_compose]),
+        *_docker_compose_command(),
+        '--env-file', str(project.config.docker_env),
+        *reduce(lambda f, f2: f+f2, [('--file', str(compose)) for compose in project.config.docker_compose]),
         'up', '--detach'
     ]
 
+    print_verbose('executing command %s', ' '.join(cmd))
+    with _hold_locks(env_lock_key(project.config.docker_env)):
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=_docker_compose_env())
+    print_verbose('command done - code %s - out : %s', process.returncode, process.stdout.decode())
+
+    if process.returncode != 0:
+        raise ScriptError(process.stdout.decode("utf-8"))
+
+
+def _docker_compose_command() -> List[str]:
+    return ['docker-compose'] if project.config.docker_compose_cli_version == '1' else ['docker', 'compose']
+
+
+def _docker_compose_env() -> Dict[str, str]:
+    """
+    Environment of docker compose subprocesses
+    """
     # Remove any exported docker vars that take priority over .env file
     cmd_env = os.environ.copy()
     for env in _fetch_docker_env():
-        print_verbose(f'removing env {env} of docker compose subprocess')
+        print_verbose('removing env %s of docker compose subprocess', env)
         cmd_env.pop(env, None)
 
-    print_verbose(f'executing command {" ".join(cmd)}')
-    process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=cmd_env)
-    print_verbose(f'command done - code {process.returncode} - out : {process.stdout.decode()}')
+    return cmd_env
 
-    if process.returncode != 0:
-        raise ScriptError(process.stdout.decode("utf-8"))
+
+def _restart_containers(aki_volume_by_type: Dict[str, AkiVolume]):
+    """
+    Recreate containers of aki volumes with the volumes of the .env file. They are created through the docker API
+    when the compose model is known and models them, by docker compose otherwise
+    """
+    # A batch restarts every container once with docker compose
+    specs = _plan_containers(aki_volume_by_type) if not project.deferred_restart else None
+
+    for _, aki_volume in aki_volume_by_type.items():
+        print_info(f'Removing container {aki_volume.container_name}')
+        try:
+            container = project.config.docker_client.containers.get(aki_volume.container_name)
+            container.stop()
+            container.remove()
+        except DockerException:
+            pass
+
+    if specs is not None:
+        print_info('Starting containers')
+        try:
+            for spec, labels in specs:
+                print_verbose('create container %s through docker API', spec.options.get('name'))
+                create_service_container(project.config.docker_client, spec, labels)
+            return
+        except DockerException as e:
+            # docker compose recreates containers created with a wrong configuration
+            print_verbose('cannot create containers through docker API (%s), use docker compose', e)
+
+    _docker_compose_up()
+
+
+def _plan_containers(aki_volume_by_type: Dict[str, AkiVolume]) -> Union[List[Tuple[ContainerSpec, Dict]], None]:
+    """
+    Return container options and compose labels of the containers of aki volumes, None if docker compose has to create
+    them: the model cannot be resolved, a service is not modeled or another service of the project is not running
+    """
+    if project.config.docker_compose_cli_version == '1':
+        print_verbose('docker-compose v1 cannot resolve a compose model, use docker compose')
+        return None
+
+    env_config = _fetch_docker_env()
+    # Variables missing from .env keep their default value in compose files
+    value_by_variable = {
+        aki_volume.env_variable: env_config[aki_volume.env_variable]
+        for aki_volume in project.config.aki_volumes.values()
+        if env_config.get(aki_volume.env_variable) is not None
+    }
+    model = fetch_compose_model(_docker_compose_command(), project.config.docker_compose, project.config.docker_env,
+                                value_by_variable, _docker_compose_env(),
+                                project.config.state_path / COMPOSE_CACHE_FOLDER_NAME)
+    if model is None:
+        return None
+
+    docker_client = project.config.docker_client
+    specs = []
+    managed_services = set()
+    try:
+        for aki_volume in aki_volume_by_type.values():
+            service_name = model.find_service(aki_volume.container_name)
+            if service_name is None:
+                print_verbose('no service of the compose model runs %s, use docker compose', aki_volume.container_name)
+                return None
+
+            # Compose labels let docker compose find the container as one of its own
+            labels = {
+                key: value
+                for key, value in docker_client.containers.get(aki_volume.container_name).labels.items()
+                if key.startswith(COMPOSE_LABEL_PREFIX)
+            }
+            if labels.get(COMPOSE_SERVICE_LABEL) != service_name:
+                print_verbose('%s has not been created by docker compose, use it', aki_volume.container_name)
+                return None
+
+            specs.append((model.container_spec(service_name, value_by_variable), labels))
+            managed_services.add(service_name)
+
+        running_services = {
+            container.labels.get(COMPOSE_SERVICE_LABEL)
+            for container in docker_client.containers.list(filters={'label': f'{COMPOSE_PROJECT_LABEL}={model.name}'})
+        }
+    except UnsupportedServiceError as e:
+        print_verbose('%s, use docker compose', e)
+        return None
+    except DockerException as e:
+        print_verbose('cannot read containers (%s), use docker compose', e)
+        return None
+
+    stopped_services = set(model.service_names()) - managed_services - running_services
+    if stopped_services:
+        print_verbose('services %s are not running, use docker compose', ', '.join(sorted(stopped_services)))
+        return None
+
+    return specs
+
+
+def _remove_volume(volume_type: str, aki_volume: AkiVolume, volume: Volume):
+    """
+    Move the volume to the trash if enabled else remove it
+    """
+    with log_context(volume_type=volume_type, container=aki_volume.container_name), \
+            _hold_locks(volume_lock_key(volume.external_name)):
+        if not project.config.trash_enabled:
+            aki_volume.remove(volume)
+        elif aki_volume.move_to_trash(volume):
+            project.is_trash_filled = True
+
+        project.volume_index.remove(volume_type, volume.aki_name)
+        _copy_journal(volume_type, volume.aki_name).discard()
+        if project.volume_cache:
+            project.volume_cache.remove(volume_type, volume)
+        _update_completion(lambda cache: cache.remove(volume_type, volume.aki_name))
+
+
+def _hold_locks(*keys: str, shared_keys: Tuple[str, ...] = ()):
+    """
+    Wait for other aki processes that use the same .env file, containers or volumes
+    """
+    return hold_locks(keys, project.config.lock_timeout, shared_keys)
+
+
+def _stop_container(aki_volume: AkiVolume):
+    print_info(f'Stopping {aki_volume.container_name}')
+    try:
+        project.config.docker_client.containers.get(aki_volume.container_name).stop()
+        project.config.docker_client.containers.get(aki_volume.container_name).remove()
+    except DockerException:
+        pass
+
+
+@contextmanager
+def _pause_container(aki_volume: AkiVolume):
+    """
+    Pause the container while in the context, a container that does not run is left as is
+    """
+    print_info(f'Pausing {aki_volume.container_name}')
+    try:
+        container = project.config.docker_client.containers.get(aki_volume.container_name)
+        container.pause()
+    except DockerException:
+        container = None
+
+    try:
+        yield
+    finally:
+        if container:
+            print_info(f'Unpausing {aki_volume.container_name}')
+            container.unpause()
+
+
+def _is_current_volume(aki_volume: AkiVolume, aki_name: str) -> bool:
+    current_volume = _fetch_current_volume(aki_volume)
+    return current_volume is not None and current_volume.aki_name == aki_name
+
+
+@dataclass(frozen=True)
+class _LiveCopy:
+    """
+    Copy made while the container of its type runs, its destination is complete once synced
+    """
+    volume_type: str
+    aki_volume: AkiVolume
+    source_volume: Volume
+    destination_volume: Volume
+    since: float
+    journal: CopyJournal
+    copy_duration: float
 
 
-def _print_volumes_matrix(aki_volume_by_type: Dict[str, AkiVolume], volumes_to_print: Dict[str, List[Volume]],
-                          external_name: bool = False, volumes_to_decorate_by_type: Dict[str, str] = None):
+def _sync_live_copies(live_copies: List[_LiveCopy], freeze: str):
+    """
+    Freeze the containers of all live copies together and copy the changes made to their sources since each copy
+    started. Stopped containers are started again with the others once the copy is done
+    """
+    freeze_start = time.monotonic()
+    with ExitStack() as paused_containers:
+        for live_copy in live_copies:
+            if freeze == COPY_FREEZE_PAUSE:
+                paused_containers.enter_context(_pause_container(live_copy.aki_volume))
+            else:
+                _stop_container(live_copy.aki_volume)
+
+        for live_copy in live_copies:
+            with log_context(volume_type=live_copy.volume_type, container=live_copy.aki_volume.container_name):
+                live_copy.aki_volume.sync(live_copy.source_volume, live_copy.destination_volume, live_copy.since)
+    print_info(f'Changes copied in {format_duration(time.monotonic() - freeze_start)} of {freeze}')
+
+
+def _complete_copy(volume_type: str, destination_volume: Volume, source: str, size: Union[int, None],
+                   journal: CopyJournal, copy_duration: Union[float, None]):
+    """
+    Record the complete destination. copy_duration is None if it does not reflect the throughput, e.g. a resumed copy
+    """
+    journal.complete()
+    project.volume_index.mark_created(volume_type, destination_volume, source, size)
+    if project.volume_cache:
+        project.volume_cache.add(volume_type, destination_volume)
+    _update_completion(lambda cache: cache.add(volume_type, destination_volume.aki_name))
+    if size and copy_duration is not None:
+        project.volume_index.add_copy_stat(volume_type, size, copy_duration)
+    print_success('Copy done')
+    print_info()
+
+
+def _copy_journal(volume_type: str, aki_name: str) -> CopyJournal:
+    return CopyJournal(project.config.state_path, volume_type, aki_name)
+
+
+def _purge_trash_in_background():
+    """
+    Start a detached aki process that purges the trash, the current process does not wait for it
+    """
+    cmd = [sys.executable, '-m', 'aki.cli', '--file', str(project.config.aki_file), 'gc', '--trash-only',
+           *_io_policy_arguments(project.config.io_policy)]
+    print_verbose('executing command in background %s', ' '.join(cmd))
+    subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+
+
+def _print_volumes_matrix(aki_volume_by_type: Dict[str, AkiVolume], catalog: VolumeCatalog,
+                          external_name: bool = False, volumes_to_decorate_by_type: Dict[str, str] = None,
+                          metadata_by_type: Dict[str, Dict[str, VolumeMetadata]] = None):
     if volumes_to_decorate_by_type is None:
         volumes_to_decorate_by_type = {
             volume_type: None
@@ -188,25 +518,17 @@ def _print_volumes_matrix(aki_volume_by_type: Dict[str, AkiVolume], volumes_to_p
 
     matrix_to_print = []
 
-    # Compute volumes in a easier collection for print
-    volumes_by_type_by_aki_name: Dict[str, Dict[str, Volume]] = {}
-    for volume_type, volumes in volumes_to_print.items():
-        for volume in volumes:
-            volumes_by_types = volumes_by_type_by_aki_name.setdefault(volume.aki_name, {})
-            volumes_by_types.setdefault(volume_type, volume)
-
     # Calculate column size
     aki_name_column_size = 8
-    for aki_name, _ in volumes_by_type_by_aki_name.items():
-        aki_name_column_size = max([aki_name_column_size, len(aki_name) + 2])
+    for entry in catalog.entries():
+        aki_name_column_size = max([aki_name_column_size, len(entry.aki_name) + 2])
 
     if external_name:
         column_size_by_type = {}
         for volume_type in aki_volume_by_type:
             column_size = len(volume_type)
-            for _, volume_by_type in volumes_by_type_by_aki_name.items():
-                if volume_type in volume_by_type:
-                    column_size = max(column_size, len(volume_by_type[volume_type].external_name) + 2)
+            for volume in catalog.volumes(volume_type):
+                column_size = max(column_size, len(volume.external_name) + 2)
             column_size_by_type[volume_type] = column_size
     else:
         column_size_by_type: Dict[str, int] = {
@@ -217,11 +539,18 @@ def _print_volumes_matrix(aki_volume_by_type: Dict[str, AkiVolume], volumes_to_p
     # Format default line template
     default_aki_column = f'{{:<{aki_name_column_size}}}'
     column_template = default_aki_column + ''.join([f'{{:<{column_size}}}' for column_size in column_size_by_type.values()])
-    matrix_to_print.append((column_template, (['VOLUME'] + [key.upper() for key in aki_volume_by_type.keys()])))
+    header = ['VOLUME'] + [key.upper() for key in aki_volume_by_type.keys()]
+    details_template = '{:<10}{:<12}'
+    if metadata_by_type is not None:
+        column_template = column_template + details_template
+        header = header + ['SIZE', 'LAST USED']
+    matrix_to_print.append((column_template, header))
+    now = time.time()
 
     # Compute volumes by aki name and print a line by aki name
-    for aki_name in sorted(volumes_by_type_by_aki_name.keys(), key=str.casefold):
-        volume_by_type = volumes_by_type_by_aki_name[aki_name]
+    for entry in catalog.sorted_entries():
+        aki_name = entry.aki_name
+        volume_by_type = catalog.volume_by_type(entry)
 
         # For each type set a tuple that indicate if the volume exist and need to be print in green
         volume_state_by_type = {}
@@ -268,90 +597,178 @@ def _print_volumes_matrix(aki_volume_by_type: Dict[str, AkiVolume], volumes_to_p
             columns_values.insert(0, aki_name)
             column_template.insert(0, default_aki_column)
 
+        # Size is the sum of all types, last used the most recent use of a type
+        if metadata_by_type is not None:
+            metadata_list = [
+                metadata_by_type[volume_type][aki_name]
+                for volume_type in volume_by_type
+                if aki_name in metadata_by_type.get(volume_type, {})
+            ]
+            sizes = [metadata.size for metadata in metadata_list if metadata.size is not None]
+            last_used_list = [metadata.last_used_at for metadata in metadata_list if metadata.last_used_at]
+
+            column_template.append(details_template)
+            columns_values.append(format_size(sum(sizes)) if sizes else format_size(None))
+            columns_values.append(format_elapsed(now - max(last_used_list)) if last_used_list else format_elapsed(None))
+
         matrix_to_print.append((column_template, columns_values))
     _print_matrix(matrix_to_print)
 
 
-def use_volume(aki_volume_by_type: Dict[str, AkiVolume], aki_name_to_use: str):
+def use_volume(aki_volume_by_type: Dict[str, AkiVolume], aki_name_to_use: str) -> bool:
+    """
+    Switch containers to the volume, return False if they already use it
+    """
     print_info(f'Use volume {aki_name_to_use}')
-    volumes_by_type = _fetch_volumes_of_aki_volumes(aki_volume_by_type)
+    catalog = _fetch_volume_catalog(aki_volume_by_type)
 
-    print_verbose(f'volumes : {volumes_by_type}')
+    print_debug_def(lambda: f'volumes : {catalog.volumes_by_type()}')
 
-    volumes_type_without_target_volume = []
-    for volume_type, volumes in volumes_by_type.items():
-        has_volume = False
-        for volume in volumes:
-            if volume.aki_name == aki_name_to_use:
-                has_volume = True
-                break
-        if not has_volume:
-            volumes_type_without_target_volume.append(volume_type)
+    # A volume whose copy has been interrupted is incomplete, the not found action resumes the copy
+    volumes_type_without_target_volume = [
+        volume_type for volume_type in aki_volume_by_type
+        if volume_type in catalog.missing_types(aki_name_to_use)
+        or _copy_journal(volume_type, aki_name_to_use).is_in_progress()
+    ]
 
     if len(volumes_type_without_target_volume) == len(aki_volume_by_type.keys()):
-        print_verbose(f'volume {aki_name_to_use} does not exists')
-        _use_volume_not_exists(aki_name_to_use, volumes_by_type, aki_volume_by_type)
-        return
+        print_verbose('volume %s does not exists', aki_name_to_use)
+        _use_volume_not_exists(aki_name_to_use, catalog, aki_volume_by_type)
+        return True
     elif len(volumes_type_without_target_volume) > 0:
         raise ScriptError(f'Cannot use volume {aki_name_to_use} because it does not exist for'
                           f' {", ".join(volumes_type_without_target_volume)}')
 
-    # Check all current volume are not aki volume and all containers are up
-    is_already_on_the_volume_and_container_is_up = True
-    for volume_type, volumes in volumes_by_type.items():
-        aki_volume = aki_volume_by_type[volume_type]
-        is_already_on_the_volume_and_container_is_up = is_already_on_the_volume_and_container_is_up and \
-            aki_volume.is_container_up() and \
-            _fetch_current_volume(aki_volume).aki_name == aki_name_to_use
+    # Another aki process may rewrite the same .env file or restart the same containers
+    with _hold_locks(env_lock_key(project.config.docker_env),
+                     *[container_lock_key(aki_volume.container_name) for aki_volume in aki_volume_by_type.values()]):
+        # Check all current volume are not aki volume and all containers are up
+        is_already_on_the_volume_and_container_is_up = True
+        for volume_type, aki_volume in aki_volume_by_type.items():
+            is_already_on_the_volume_and_container_is_up = is_already_on_the_volume_and_container_is_up and \
+                aki_volume.is_container_up() and \
+                _fetch_current_volume(aki_volume).aki_name == aki_name_to_use
+
+        if is_already_on_the_volume_and_container_is_up:
+            _mark_volume_used(aki_volume_by_type, aki_name_to_use)
+            print_success(f'All containers already use the volume {aki_name_to_use}')
+            return False
 
-    if is_already_on_the_volume_and_container_is_up:
-        print_success(f'All containers already use the volume {aki_name_to_use}')
-        return
+        # Load .env file
+        env_config = _fetch_docker_env()
 
-    # Load .env file
-    env_config = _fetch_docker_env()
+        # Replace .env file key
+        for volume_type, aki_volume in aki_volume_by_type.items():
+            env_config[aki_volume.env_variable] = aki_name_to_use
 
-    # Replace .env file key
-    for volume_type, aki_volume in aki_volume_by_type.items():
-        env_config[aki_volume.env_variable] = aki_name_to_use
+        print_info(f'Writing {str(project.config.docker_env)}')
+        with open(str(project.config.docker_env), 'w') as file:
+            for key, value in env_config.items():
+                file.write(f'{key}={value}\n')
 
-    print_info(f'Writing {str(config.docker_env)}')
-    with open(str(config.docker_env), 'w') as file:
-        for key, value in env_config.items():
-            file.write(f'{key}={value}\n')
+        _restart_containers(aki_volume_by_type)
+        _mark_volume_used(aki_volume_by_type, aki_name_to_use)
+        print_success('Containers started')
+        return True
 
-    for _, aki_volume in aki_volume_by_type.items():
-        print_info(f'Removing container {aki_volume.container_name}')
-        try:
-            container = config.docker_client.containers.get(aki_volume.container_name)
-            container.stop()
-            container.remove()
-        except DockerException:
-            pass
 
-    _docker_compose_up()
-    print_success(f'Containers started')
+def _mark_volume_used(aki_volume_by_type: Dict[str, AkiVolume], aki_name: str):
+    for volume_type, aki_volume in aki_volume_by_type.items():
+        project.volume_index.mark_used(volume_type, aki_volume.volume_name_to_volume(aki_name, is_aki_name=True))
 
 
 def print_volumes(aki_volume_by_type: Dict[str, AkiVolume], regex_pattern: str or None, reverse_match: bool = False,
-                  external_name: bool = False):
-    volumes_by_type = _fetch_volumes_of_aki_volumes(aki_volume_by_type, regex_pattern, reverse_match)
+                  external_name: bool = False, details: bool = False, ls_format: str = LS_FORMAT_TABLE):
+    matcher = VolumeMatcher.from_patterns([regex_pattern], reverse_match) if regex_pattern else None
+    # The table is aligned on every volume and needs the catalog, other formats merge the sorted volumes of each type
+    if ls_format == LS_FORMAT_TABLE:
+        catalog = _fetch_volume_catalog(aki_volume_by_type, matcher)
+    else:
+        sorted_volumes_by_type = _fetch_sorted_volumes_by_type(aki_volume_by_type, matcher)
 
     current_volume_by_type = {
         volume_type: _fetch_current_volume(volume_spec)
         for volume_type, volume_spec in aki_volume_by_type.items()
     }
 
-    print_verbose(f'current volume : {current_volume_by_type}')
+    print_verbose('current volume : %s', current_volume_by_type)
 
-    _print_volumes_matrix(aki_volume_by_type, volumes_by_type, external_name, current_volume_by_type)
+    metadata_by_type = None
+    if details:
+        metadata_by_type = {volume_type: project.volume_index.fetch(volume_type) for volume_type in aki_volume_by_type}
+
+    if ls_format == LS_FORMAT_TABLE:
+        _print_volumes_matrix(aki_volume_by_type, catalog, external_name, current_volume_by_type, metadata_by_type)
+        return
+
+    # Rows are written as soon as they are merged, they are not kept
+    rows = _iter_volume_rows(sorted_volumes_by_type, current_volume_by_type, metadata_by_type)
+    if project.record_sink and ls_format in LS_RECORD_FORMATS:
+        for row in rows:
+            project.record_sink(row_to_record(row, details, project.workspace_name))
+        return
+    write_rows(ls_format, list(aki_volume_by_type), rows, external_name, details)
+
+
+def list_volumes(aki_volume_by_type: Dict[str, AkiVolume], regex_pattern: Union[str, None] = None,
+                 reverse_match: bool = False, details: bool = False) -> List[VolumeRow]:
+    """
+    Return the rows printed by aki ls
+    """
+    matcher = VolumeMatcher.from_patterns([regex_pattern], reverse_match) if regex_pattern else None
+    sorted_volumes_by_type = _fetch_sorted_volumes_by_type(aki_volume_by_type, matcher)
+    current_volume_by_type = {
+        volume_type: _fetch_current_volume(volume_spec)
+        for volume_type, volume_spec in aki_volume_by_type.items()
+    }
+
+    metadata_by_type = None
+    if details:
+        metadata_by_type = {volume_type: project.volume_index.fetch(volume_type) for volume_type in aki_volume_by_type}
+
+    return list(_iter_volume_rows(sorted_volumes_by_type, current_volume_by_type, metadata_by_type))
+
+
+def _iter_volume_rows(sorted_volumes_by_type: Dict[str, List[Volume]],
+                      current_volume_by_type: Dict[str, Union[Volume, None]],
+                      metadata_by_type: Union[Dict[str, Dict[str, VolumeMetadata]], None]) -> Iterator[VolumeRow]:
+    for volume_by_type in merge_volumes_by_aki_name(sorted_volumes_by_type):
+        aki_name = next(iter(volume_by_type.values())).aki_name
+        current_types = [
+            volume_type for volume_type, volume in volume_by_type.items()
+            if volume == current_volume_by_type.get(volume_type)
+        ]
+
+        if metadata_by_type is None:
+            yield VolumeRow(aki_name, volume_by_type, current_types)
+            continue
+
+        # Size is the sum of all types, last used the most recent use of a type
+        metadata_list = [
+            metadata_by_type[volume_type][aki_name]
+            for volume_type in volume_by_type
+            if aki_name in metadata_by_type.get(volume_type, {})
+        ]
+        sizes = [metadata.size for metadata in metadata_list if metadata.size is not None]
+        last_used_list = [metadata.last_used_at for metadata in metadata_list if metadata.last_used_at]
+        yield VolumeRow(aki_name, volume_by_type, current_types, sum(sizes) if sizes else None,
+                        max(last_used_list, default=None))
 
 
 def copy_volume(aki_volume_by_type: Dict[str, AkiVolume], source: str, destination: str, override_volume: bool,
-                use_copied_volume: bool, up_container: bool = True):
-    print_verbose(f'copy {source=}, {destination=}, {override_volume=}, {use_copied_volume=}, {up_container=}')
+                use_copied_volume: bool, up_container: bool = True, live: Union[bool, None] = None,
+                freeze: Union[str, None] = None) -> List[str]:
+    """
+    Copy the source volume of each type to destination, return the types copied. A live copy runs while containers
+    run, they are frozen to copy the changes only. live and freeze default to the config
+    """
+    live = project.config.copy_live if live is None else live
+    freeze = freeze or project.config.copy_freeze
+    print_verbose('copy source=%r, destination=%r, override_volume=%s, use_copied_volume=%s, up_container=%s, '
+                  'live=%s, freeze=%r', source, destination, override_volume, use_copied_volume, up_container, live,
+                  freeze)
 
-    volumes_by_types = _fetch_volumes_of_aki_volumes(aki_volume_by_type)
+    catalog = _fetch_volume_catalog(aki_volume_by_type)
 
     # $current can be use for copy current volume if all container share the same volume name
     if source == '_current':
@@ -365,37 +782,94 @@ def copy_volume(aki_volume_by_type: Dict[str, AkiVolume], source: str, destinati
                 raise ScriptError('Cannot use _current has all containers does not share the same current volume name')
             else:
                 source = current_volume
-        print_verbose(f'use _current: {source=}')
-
-    for volume_type, aki_volume in aki_volume_by_type.items():
-        # Check source exist
-        source_volume: Volume = next(filter(lambda v: v.aki_name == source, volumes_by_types[volume_type]), None)
-        if not source_volume:
-            print_info(f'Volume {source} does not exist for {volume_type}, skip copy')
-            continue
-
-        # Stop and remove container because it can mess up copy
-        print_info(f'Stopping {aki_volume.container_name}')
-        try:
-            config.docker_client.containers.get(aki_volume.container_name).stop()
-            config.docker_client.containers.get(aki_volume.container_name).remove()
-        except DockerException:
-            pass
-
-        # Check destination exist
-        destination_volume: Volume = next(filter(lambda v: v.aki_name == destination, volumes_by_types[volume_type]), None)
-        if destination_volume:
-            if override_volume \
-                    or _ask_user_with_default(f'Volume {destination} for {volume_type} already exist, override it ?'):
-                print_info(f'Remove volume {destination}')
-                aki_volume.remove(destination_volume)
-            else:
+        print_verbose('use _current: source=%r', source)
+
+    size_by_type = _check_copy_feasibility(aki_volume_by_type, catalog, source)
+    copied_types = []
+    live_copies: List[_LiveCopy] = []
+
+    # Locks are held until the live copies are synced, after the copy of every type
+    with ExitStack() as locks:
+        for volume_type, aki_volume in aki_volume_by_type.items():
+            # Check source exist
+            source_volume = catalog.volume(source, volume_type)
+            if not source_volume:
+                print_info(f'Volume {source} does not exist for {volume_type}, skip copy')
                 continue
 
-        # Copy volume
-        aki_volume.copy(source_volume, aki_volume.volume_name_to_volume(destination, is_aki_name=True))
-        print_success(f'Copy done')
-        print_info()
+            # Another aki process may copy from or to the same volumes or restart the container
+            destination_external_name = aki_volume.volume_name_to_volume(destination, is_aki_name=True).external_name
+            # Copies of the same source read it at the same time, unless a copy writes it
+            source_key = volume_lock_key(source_volume.external_name)
+            source_keys = (source_key,) if aki_volume.is_copy_writing_source(source_volume) else ()
+            with log_context(volume_type=volume_type, container=aki_volume.container_name):
+                locks.enter_context(_hold_locks(container_lock_key(aki_volume.container_name),
+                                                volume_lock_key(destination_external_name), *source_keys,
+                                                shared_keys=(source_key,)))
+                # Check destination exist
+                destination_volume = catalog.volume(destination, volume_type)
+                journal = _copy_journal(volume_type, destination)
+                is_resume = destination_volume is not None and journal.is_in_progress() \
+                    and journal.source == source and journal.is_resumable
+
+                # A resumed copy trusts the files already copied, they must not change while the container runs
+                is_live = live and not is_resume and aki_volume.is_live_copy_supported(source_volume) \
+                    and not _is_current_volume(aki_volume, destination)
+                if not is_live:
+                    # Stop and remove container because it can mess up copy
+                    _stop_container(aki_volume)
+
+                if is_resume:
+                    print_info(f'Resuming interrupted copy of {source} to {destination} for {volume_type}')
+                elif destination_volume:
+                    # A destination left by an interrupted copy of another source is incomplete, no need to ask
+                    if journal.is_in_progress() or override_volume or _ask_user_with_default(
+                            f'Volume {destination} for {volume_type} already exist, override it ?'):
+                        print_info(f'Remove volume {destination}')
+                        _remove_volume(volume_type, aki_volume, destination_volume)
+                    else:
+                        continue
+
+                # Copy volume, the journal exists until the destination is complete
+                destination_volume = aki_volume.volume_name_to_volume(destination, is_aki_name=True)
+                if not is_resume:
+                    journal.discard()
+                # Files changed during a live copy are copied again by the sync, the journal would skip them on resume
+                journal.start(source, is_resumable=not is_live)
+                copy_journal = None if is_live else journal
+                since = aki_volume.fetch_file_time() if is_live else None
+                copy_start = time.monotonic()
+                try:
+                    # Copies that share their data are instant, they have no progress
+                    if volume_type in size_by_type:
+                        with CopyProgress(volume_type, size_by_type[volume_type], journal.completed_bytes,
+                                          len(journal.completed_files),
+                                          callback=project.progress_callback) as progress:
+                            aki_volume.copy(source_volume, destination_volume, copy_journal, progress)
+                    else:
+                        aki_volume.copy(source_volume, destination_volume, copy_journal)
+                except (ContainerError, FileNotFoundError) as e:
+                    # Files removed by the running container, the sync copies what is missing
+                    if not is_live:
+                        raise
+                    print_verbose('live copy failed with %s - the sync copies the rest', e)
+                copy_duration = time.monotonic() - copy_start
+
+                if is_live:
+                    # Containers are frozen together once every type is copied
+                    live_copies.append(_LiveCopy(volume_type, aki_volume, source_volume, destination_volume, since,
+                                                 journal, copy_duration))
+                    continue
+                _complete_copy(volume_type, destination_volume, source, size_by_type.get(volume_type), journal,
+                               copy_duration if not is_resume else None)
+                copied_types.append(volume_type)
+
+        if live_copies:
+            _sync_live_copies(live_copies, freeze)
+            for live_copy in live_copies:
+                _complete_copy(live_copy.volume_type, live_copy.destination_volume, source,
+                               size_by_type.get(live_copy.volume_type), live_copy.journal, live_copy.copy_duration)
+                copied_types.append(live_copy.volume_type)
 
     if use_copied_volume is True:
         use_volume(aki_volume_by_type, destination)
@@ -404,76 +878,430 @@ def copy_volume(aki_volume_by_type: Dict[str, AkiVolume], source: str, destinati
     elif up_container:
         _docker_compose_up()
 
+    return copied_types
 
-def remove_volumes_by_name_or_pattern(aki_volume_by_type: Dict[str, AkiVolume], names_or_regex_patterns: List[str],
-                                      is_pattern: bool, reverse_match: bool, is_force: bool):
-    volumes_to_remove_by_type: Dict[str, List[Volume]] = {
-        volume_type: [] for volume_type, _ in aki_volume_by_type.items()
-    }
 
-    # Compute volumes to remove
-    if is_pattern:
-        volumes_set_aki_name_by_type: Dict[str, Set[Volume]] = {
-            volume_type: set() for volume_type in aki_volume_by_type
-        }
+def _check_copy_feasibility(aki_volume_by_type: Dict[str, AkiVolume], catalog: VolumeCatalog,
+                            source: str) -> Dict[str, Union[int, None]]:
+    """
+    Measure source volumes before anything is stopped. Fail if a copy does not fit on its file system and ask the
+    user if the copies are estimated longer than the configured maximum duration. Return source sizes by type
+    """
+    size_by_type: Dict[str, Union[int, None]] = {}
+    # Copies on the same file system share its free space
+    free_space_by_file_system: Dict[str, FreeSpace] = {}
+    types_by_file_system: Dict[str, List[str]] = {}
+    estimated_duration = 0
 
-        # Find volume that match pattern, merge in set for unicity
-        for regex_pattern in names_or_regex_patterns:
-            for volume_type, volumes in _fetch_volumes_of_aki_volumes(aki_volume_by_type, regex_pattern, reverse_match).items():
-                if reverse_match:
-                    if len(volumes_set_aki_name_by_type[volume_type]) == 0:
-                        volumes_set_aki_name_by_type[volume_type] = set(volumes)
-                    else:
-                        volumes_set_aki_name_by_type[volume_type] = volumes_set_aki_name_by_type[volume_type] & set(volumes)
-                else:
-                    volumes_set_aki_name_by_type[volume_type] = volumes_set_aki_name_by_type[volume_type] | set(volumes)
+    for volume_type, aki_volume in aki_volume_by_type.items():
+        source_volume = catalog.volume(source, volume_type)
+        if not source_volume:
+            continue
 
-        volumes_to_remove_by_type = {
-            volume_type: list(volumes) for volume_type, volumes in volumes_set_aki_name_by_type.items()
-        }
+        if aki_volume.is_copy_shallow(source_volume):
+            print_verbose('%s - copy of %s shares its data, skip free space check', volume_type, source)
+            continue
 
-        if all(map(lambda volume_type: len(volumes_to_remove_by_type[volume_type]) == 0, volumes_to_remove_by_type.keys())):
-            print('No volume found')
-            return
+        size = aki_volume.fetch_size(source_volume)
+        size_by_type[volume_type] = size
+        if size is None:
+            print_verbose('%s - cannot measure %s, skip free space check', volume_type, source)
+            continue
+        project.volume_index.set_size(volume_type, source, size)
+
+        free_space = aki_volume.fetch_free_space(source_volume)
+        print_verbose('%s - %s size %s, free space %s', volume_type, source, format_size(size),
+                      format_size(free_space.size) if free_space else None)
+        if free_space is not None:
+            free_space_by_file_system[free_space.file_system] = free_space
+            types_by_file_system.setdefault(free_space.file_system, []).append(volume_type)
+
+        throughput = project.volume_index.fetch_throughput(volume_type)
+        if throughput:
+            estimated_duration += size / throughput
+
+    for file_system, volume_types in types_by_file_system.items():
+        needed_size = sum(size_by_type[volume_type] for volume_type in volume_types)
+        free_size = free_space_by_file_system[file_system].size
+        if needed_size > free_size:
+            raise ScriptError(f'Cannot copy volume {source} for {", ".join(volume_types)}, '
+                              f'{"they need" if len(volume_types) > 1 else "it needs"} {format_size(needed_size)} '
+                              f'but only {format_size(free_size)} is free')
+
+    if estimated_duration:
+        print_verbose('estimated copy duration %s', format_duration(estimated_duration))
+        if project.config.copy_max_duration and estimated_duration > project.config.copy_max_duration and \
+                not _ask_user_with_default(f'Copy is estimated to {format_duration(estimated_duration)}, continue ?'):
+            raise ScriptError('Copy aborted')
+
+    return size_by_type
+
+
+def remove_volumes_by_name_or_pattern(aki_volume_by_type: Dict[str, AkiVolume], names_or_regex_patterns: List[str],
+                                      is_pattern: bool, reverse_match: bool, is_force: bool) -> VolumeCatalog:
+    """
+    Remove volumes named or matched, return those removed
+    """
+    # Volumes are listed once: a volume is removed if it matches any pattern, with reverse match if it matches none
+    if is_pattern:
+        matcher = VolumeMatcher.from_patterns(names_or_regex_patterns, reverse_match)
+    else:
+        matcher = VolumeMatcher.from_names(names_or_regex_patterns)
+    volumes_to_remove = _fetch_volume_catalog(aki_volume_by_type, matcher)
+
+    if is_pattern:
+        if volumes_to_remove.is_empty():
+            print_info('No volume found')
+            return volumes_to_remove
 
         # Show volumes and ask user
-        _print_volumes_matrix(aki_volume_by_type, volumes_to_remove_by_type)
-        print()
+        _print_volumes_matrix(aki_volume_by_type, volumes_to_remove)
+        print_info()
         if not (is_force or _ask_user_with_default('Remove those volumes ?', default_yes=False)):
-            print("abort")
-            return
-    else:
-        for name in names_or_regex_patterns:
-            for volume_type, volumes in _fetch_volumes_of_aki_volumes(aki_volume_by_type, f"^{name}$").items():
-                volumes_to_remove_by_type[volume_type] = volumes_to_remove_by_type[volume_type] + volumes
+            print_info('abort')
+            return VolumeCatalog(aki_volume_by_type)
 
-    remove_volumes(aki_volume_by_type, volumes_to_remove_by_type)
+    remove_volumes(aki_volume_by_type, volumes_to_remove)
+    return volumes_to_remove
 
 
-def remove_volumes(aki_volume_by_type: Dict[str, AkiVolume], volumes_to_remove_by_type: Dict[str, List[Volume]]):
+def remove_volumes(aki_volume_by_type: Dict[str, AkiVolume], volumes_to_remove: VolumeCatalog):
     for volume_type, aki_volume in aki_volume_by_type.items():
         current_volume = _fetch_current_volume(aki_volume)
 
-        if not current_volume:
-            continue
+        if current_volume and volumes_to_remove.volume(current_volume.aki_name, volume_type):
+            raise ScriptError(f'Volume {current_volume.aki_name} is use by container {volume_type}, '
+                              f'please switch the volume before trying to remove it')
+
+    sorted_entries = volumes_to_remove.sorted_entries()
+    for volume_type, aki_volume in aki_volume_by_type.items():
+        for entry in sorted_entries:
+            volume = volumes_to_remove.volume(entry.aki_name, volume_type)
+            if volume:
+                _remove_volume(volume_type, aki_volume, volume)
+
 
-        for volume_to_remove in volumes_to_remove_by_type[volume_type]:
-            if volume_to_remove.aki_name == current_volume.aki_name:
-                raise ScriptError(f'Volume {volume_to_remove.aki_name} is use by container {volume_type}, '
-                                  f'please switch the volume before trying to remove it')
+def flatten_volumes(aki_volume_by_type: Dict[str, AkiVolume], names: List[str]):
+    """
+    Make volumes that share data with other volumes full volumes, containers that use them are restarted
+    """
+    catalog = _fetch_volume_catalog(aki_volume_by_type, VolumeMatcher.from_names(names))
+    for name in names:
+        if name not in catalog:
+            raise ScriptError(f'Volume {name} does not exist')
 
+    is_container_removed = False
     for volume_type, aki_volume in aki_volume_by_type.items():
-        for volume in sorted(volumes_to_remove_by_type[volume_type], key=lambda v: v.aki_name.casefold()):
-            aki_volume.remove(volume)
+        current_volume = _fetch_current_volume(aki_volume)
+        for name in names:
+            volume = catalog.volume(name, volume_type)
+            if not volume:
+                continue
+
+            with log_context(volume_type=volume_type, container=aki_volume.container_name), \
+                    _hold_locks(container_lock_key(aki_volume.container_name), volume_lock_key(volume.external_name)):
+                if current_volume and current_volume.aki_name == name:
+                    print_info(f'Stopping {aki_volume.container_name}')
+                    try:
+                        container = project.config.docker_client.containers.get(aki_volume.container_name)
+                        container.stop()
+                        container.remove()
+                        is_container_removed = True
+                    except DockerException:
+                        pass
+
+                if aki_volume.flatten(volume):
+                    print_success(f'Volume {name} is a full volume for {volume_type}')
+                else:
+                    print_info(f'Volume {name} is already a full volume for {volume_type}')
+
+    if is_container_removed:
+        _docker_compose_up()
+
+
+def collect_garbage(aki_volume_by_type: Dict[str, AkiVolume], policy: GcPolicy, parallel: int, dry_run: bool,
+                    is_force: bool):
+    """
+    Remove volumes selected by the policy then purge the trash, removals run in parallel
+    """
+    if not policy.is_empty() and not _evict_volumes(aki_volume_by_type, policy, parallel, dry_run, is_force):
+        return
+
+    if dry_run:
+        for volume_type, aki_volume in aki_volume_by_type.items():
+            for volume in aki_volume.fetch_trash():
+                print_info(f'Would purge {volume.external_name}')
+        return
+
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='aki_gc') as executor:
+        for future in [executor.submit(_bind_to_project(aki_volume.purge_trash))
+                       for aki_volume in aki_volume_by_type.values()]:
+            future.result()
+
+
+def _measure_unsized_volumes(aki_volume_by_type: Dict[str, AkiVolume], catalog: VolumeCatalog,
+                             metadata_by_type: Dict[str, Dict[str, VolumeMetadata]]):
+    """
+    Measure volumes whose size is not in the index, a total size ignores them otherwise. Sizes are written to the index
+    and to metadata_by_type
+    """
+    unsized = [(volume_type, volume) for volume_type in aki_volume_by_type for volume in catalog.volumes(volume_type)
+               if getattr(metadata_by_type[volume_type].get(volume.aki_name), 'size', None) is None]
+    if not unsized:
+        return
+
+    print_info(f'Measuring {len(unsized)} volumes without known size')
+    unsized_by_type: Dict[str, List[Volume]] = {}
+    for volume_type, volume in unsized:
+        unsized_by_type.setdefault(volume_type, []).append(volume)
+
+    unmeasured_count = 0
+    for volume_type, volumes in unsized_by_type.items():
+        # A single measure of the type, docker df measures every volume of the daemon at each call
+        size_by_aki_name = aki_volume_by_type[volume_type].fetch_sizes(volumes)
+        for volume in volumes:
+            size = size_by_aki_name.get(volume.aki_name)
+            metadata = metadata_by_type[volume_type].get(volume.aki_name)
+            if size is None or metadata is None:
+                unmeasured_count += 1
+                continue
+            project.volume_index.set_size(volume_type, volume.aki_name, size)
+            metadata_by_type[volume_type][volume.aki_name] = replace(metadata, size=size)
+
+    if unmeasured_count:
+        print_info(f'{unmeasured_count} volumes cannot be measured, they are not counted in the total size')
+
+
+def _evict_volumes(aki_volume_by_type: Dict[str, AkiVolume], policy: GcPolicy, parallel: int, dry_run: bool,
+                   is_force: bool) -> bool:
+    """
+    Remove volumes selected by the policy, return False if the user abort
+    """
+    catalog = _fetch_volume_catalog(aki_volume_by_type)
+
+    # Volumes used by containers and sources of the copies of aki.use.not_found are never evicted, excluded volumes are
+    # not even listed
+    protected_names = set(project.config.not_found_sources)
+    for _, aki_volume in aki_volume_by_type.items():
+        current_volume = _fetch_current_volume(aki_volume)
+        if current_volume:
+            protected_names.add(current_volume.aki_name)
+
+    metadata_by_type = {volume_type: project.volume_index.fetch(volume_type) for volume_type in aki_volume_by_type}
+    if policy.max_size is not None:
+        _measure_unsized_volumes(aki_volume_by_type, catalog, metadata_by_type)
+
+    usages = []
+    for entry in catalog.entries():
+        aki_name = entry.aki_name
+        metadata_list = [
+            metadata_by_type[volume_type][aki_name]
+            for volume_type in catalog.volume_by_type(entry)
+            if aki_name in metadata_by_type[volume_type]
+        ]
+        sizes = [metadata.size for metadata in metadata_list if metadata.size is not None]
+        last_used_list = [metadata.last_used_at or metadata.created_at for metadata in metadata_list
+                          if metadata.last_used_at or metadata.created_at]
+        usages.append(GcUsage(aki_name, sum(sizes) if sizes else None, max(last_used_list, default=None)))
+
+    print_verbose('gc policy=%s protected_names=%s', policy, protected_names)
+    now = time.time()
+    evictions = plan_eviction(usages, protected_names, policy, now)
+    if not evictions:
+        print_info('No volume to evict')
+        return True
+
+    # Show the plan
+    name_column_size = max([8] + [len(eviction.usage.aki_name) + 2 for eviction in evictions])
+    template = f'{{:<{name_column_size}}}{{:<10}}{{:<12}}{{}}'
+    matrix = [(template, ['VOLUME', 'SIZE', 'LAST USED', 'REASON'])]
+    for eviction in evictions:
+        last_used_at = eviction.usage.last_used_at
+        matrix.append((template, [eviction.usage.aki_name, format_size(eviction.usage.size),
+                                  format_elapsed(now - last_used_at if last_used_at else None), eviction.reason]))
+    _print_matrix(matrix)
+    print_info()
+
+    if dry_run:
+        return True
+
+    if not (is_force or _ask_user_with_default('Remove those volumes ?', default_yes=False)):
+        print_info('abort')
+        return False
+
+    evicted_names = {eviction.usage.aki_name for eviction in evictions}
+
+    def remove(volume_type: str, volume: Volume):
+        with _hold_locks(volume_lock_key(volume.external_name)):
+            aki_volume_by_type[volume_type].remove(volume)
+            project.volume_index.remove(volume_type, volume.aki_name)
+            _copy_journal(volume_type, volume.aki_name).discard()
+            _update_completion(lambda cache: cache.remove(volume_type, volume.aki_name))
+
+    with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='aki_gc') as executor:
+        futures = [
+            executor.submit(_bind_to_project(remove), volume_type, volume)
+            for aki_name in evicted_names
+            for volume_type, volume in catalog.volume_by_type(catalog.entry(aki_name)).items()
+        ]
+        for future in futures:
+            future.result()
+
+    return True
+
+
+def watch_volumes(aki_volume_by_type: Dict[str, AkiVolume], debounce: float):
+    """
+    Use the volume of the branch checked out each time it changes, until interrupted. Configuration and docker client
+    are loaded once and kept between switches, nobody answers questions in between
+    """
+    head_path = find_git_head(project.config.base_path)
+
+    def switch(branch: str):
+        try:
+            use_volume(aki_volume_by_type, branch)
+        except ScriptError as e:
+            print_error(e)
+        except DockerException as e:
+            print_error(f'Cannot use volume {branch}: {e}')
+        # The trash is purged after each switch, watch may run for days
+        purge_filled_trash()
+        project.is_trash_filled = False
+
+    print_info(f'Watching git branch of {project.config.base_path}, Ctrl-C to stop')
+    is_interactive = project.is_interactive
+    project.is_interactive = False
+    try:
+        watch_branch(head_path, switch, debounce)
+    finally:
+        project.is_interactive = is_interactive
+
+
+def _bind_to_project(fn):
+    """
+    Return fn bound to the project and the output of the current thread, to be run by a worker thread
+    """
+    config, volume_index, is_interactive = project.config, project.volume_index, project.is_interactive
+    deferred_restart, volume_cache = project.deferred_restart, project.volume_cache
+    progress_callback = project.progress_callback
+    output = current_output()
+    log_state = fetch_log_state()
+    # Workers run while the current thread holds its locks, they use them instead of waiting for them
+    held_locks = fetch_held_locks()
+
+    def bound_fn(*args):
+        project.config, project.volume_index, project.is_interactive = config, volume_index, is_interactive
+        project.deferred_restart, project.volume_cache = deferred_restart, volume_cache
+        project.progress_callback = progress_callback
+        with redirect_output(output), use_log_state(log_state), use_held_locks(held_locks):
+            return fn(*args)
+
+    return bound_fn
+
+
+def _size_argument(value: str) -> int:
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _duration_argument(value: str) -> float:
+    try:
+        return parse_duration(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _nice_argument(value: str) -> int:
+    try:
+        nice = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'\'{value}\' is not an integer')
+
+    if not 0 <= nice <= MAX_NICE:
+        raise argparse.ArgumentTypeError(f'{nice} is not between 0 and {MAX_NICE}')
+    return nice
+
+
+def _workers_argument(value: str) -> int:
+    return _integer_argument(value, 1)
+
+
+def _count_argument(value: str) -> int:
+    return _integer_argument(value, 0)
+
+
+def _integer_argument(value: str, minimum: int) -> int:
+    try:
+        integer = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'\'{value}\' is not an integer')
+
+    if integer < minimum:
+        raise argparse.ArgumentTypeError(f'{integer} is not at least {minimum}')
+    return integer
+
+
+def _create_io_parser() -> argparse.ArgumentParser:
+    """
+    Options of actions that copy or remove volumes, they override aki.io of the configuration
+    """
+    io_parser = argparse.ArgumentParser(add_help=False)
+    io_parser.add_argument('--io-priority', choices=IO_PRIORITIES,
+                           help='disk priority of copies and removals, idle only uses the disk when nobody else does')
+    io_parser.add_argument('--nice', type=_nice_argument, help='cpu nice of copies and removals, from 0 to 19')
+    io_parser.add_argument('--bandwidth', type=_size_argument,
+                           help='bytes per second read and written by a copy, e.g. 50M, 0 is unlimited')
+    io_parser.add_argument('--workers', type=_workers_argument,
+                           help='files copied at the same time by a copy, split between cp processes in a container')
+    return io_parser
+
+
+def _io_policy_from_arguments(arguments) -> IoPolicy:
+    return IoPolicy(getattr(arguments, 'io_priority', None), getattr(arguments, 'nice', None),
+                    getattr(arguments, 'bandwidth', None), workers=getattr(arguments, 'workers', None))
+
+
+def _io_policy_arguments(io_policy: IoPolicy) -> List[str]:
+    """
+    Options of the priorities of io_policy, for an aki process that removes volumes
+    """
+    arguments = []
+    if io_policy.priority:
+        arguments += ['--io-priority', io_policy.priority]
+    if io_policy.nice:
+        arguments += ['--nice', str(io_policy.nice)]
+    return arguments
+
+
+class _BatchArgumentParser(argparse.ArgumentParser):
+    """
+    Parser of the lines of a batch, an invalid line fails the batch instead of exiting
+    """
+
+    def error(self, message):
+        raise ScriptError(message)
+
+    def exit(self, status=0, message=None):
+        raise ScriptError(message or f'exit {status}')
 
 
 def _parse_and_set_arguments():
-    parser = argparse.ArgumentParser()
+    return _create_parser().parse_args()
+
+
+def _parse_batch_line(tokens: List[str]) -> argparse.Namespace:
+    return _create_parser(_BatchArgumentParser).parse_args(tokens)
+
+
+def _create_parser(parser_class=argparse.ArgumentParser) -> argparse.ArgumentParser:
+    parser = parser_class()
     parser.add_argument(
         '--volume',
         '-v',
         action='append',
-        help=f'filter volumes')
+        help='filter volumes')
 
     parser.add_argument(
         '--file',
@@ -482,24 +1310,43 @@ def _parse_and_set_arguments():
         help='configuration file'
     )
 
+    parser.add_argument(
+        '--workspace',
+        '-w',
+        type=Path,
+        help='workspace file, run the action on all its projects at the same time'
+    )
+
     parser.add_argument(
         '--verbose',
         default=False,
         action='store_true'
     )
 
+    parser.add_argument(
+        '--log-file',
+        type=Path,
+        help=f'append the log to this file, a JSON object by line, default ${LOG_FILE_ENV}'
+    )
+
     # Actions (sub parser)
     action_parser = parser.add_subparsers(dest='action', required=True, help='actions')
+    io_parser = _create_io_parser()
 
     ls_parser = action_parser.add_parser('ls', help='list existing volumes. Volume used are print in red.')
     ls_parser.add_argument('regexp', help='filter volume short name with regex pattern', nargs='?')
     ls_parser.add_argument('--long-name', '-l', action='store_true', help='print volume name in docker or path')
     ls_parser.add_argument('--reverse-match', '-r', action='store_true', help='reverse pattern')
+    ls_parser.add_argument('--details', '-d', action='store_true',
+                           help='print size and last use of volumes known by aki index')
+    ls_parser.add_argument('--format', choices=LS_FORMATS, default=LS_FORMAT_TABLE, dest='ls_format',
+                           help='table is aligned once every volume is fetched, other formats are written row by row')
 
-    use_parser = action_parser.add_parser('use', help='restart containers with the volume pass in parameter')
+    use_parser = action_parser.add_parser('use', parents=[io_parser],
+                                          help='restart containers with the volume pass in parameter')
     use_parser.add_argument('name', help='volume short name')
 
-    copy_parser = action_parser.add_parser('cp', help='copy volume source to dest')
+    copy_parser = action_parser.add_parser('cp', parents=[io_parser], help='copy volume source to dest')
     copy_parser.add_argument('source', help='source volume short name')
     copy_parser.add_argument('destination', help='destination volume short name')
     copy_parser.add_argument('--override-existing', action='store_true',
@@ -507,16 +1354,342 @@ def _parse_and_set_arguments():
     copy_parser.add_argument('--switch-to-copy', action='store_true', help='restart containers with the copied volume')
     copy_parser.add_argument('--no-switch-to-copy', action='store_true',
                              help='do not ask if you want to switch to the volume and keep the actual one')
+    copy_parser.add_argument('--live', action='store_true', default=None,
+                             help='copy while the container runs, it is only frozen to copy the changes')
+    copy_parser.add_argument('--no-live', action='store_false', dest='live', help='stop the container for the copy')
+    copy_parser.add_argument('--freeze', choices=COPY_FREEZES,
+                             help='how the container is frozen at the end of a live copy, stop or docker pause')
 
-    remove_parser = action_parser.add_parser('rm', help='remove volume')
+    remove_parser = action_parser.add_parser('rm', parents=[io_parser], help='remove volume')
     remove_parser.add_argument('names', nargs='+', help='volume short names')
     remove_parser.add_argument('--regexp', '-e', action='store_true', help='names are considered as regex pattern. Ask before remove unless --force is pass')
     remove_parser.add_argument('--reverse-match', '-r', action='store_true', help='reverse regex pattern')
     remove_parser.add_argument('--force', '-f', action='store_true', help='force remove without ask')
 
+    gc_parser = action_parser.add_parser('gc', parents=[io_parser],
+                                         help='remove least recently used volumes and purge the trash')
+    gc_parser.add_argument('--max-size', type=_size_argument,
+                           help='remove least recently used volumes until total size is under, e.g. 50G')
+    gc_parser.add_argument('--keep', type=_count_argument, help='keep the N most recently used volumes')
+    gc_parser.add_argument('--older-than', type=_duration_argument,
+                           help='remove volumes not used since this duration, e.g. 30d')
+    gc_parser.add_argument('--parallel', '-p', type=_workers_argument, help='number of volumes removed in parallel')
+    gc_parser.add_argument('--dry-run', '-n', action='store_true', help='print volumes to remove and exit')
+    gc_parser.add_argument('--force', '-f', action='store_true', help='remove without ask')
+    gc_parser.add_argument('--trash-only', action='store_true', help='only purge the trash')
+
+    flatten_parser = action_parser.add_parser('flatten', parents=[io_parser],
+                                              help='make volumes of overlay type full volumes')
+    flatten_parser.add_argument('names', nargs='+', help='volume short names')
+
+    watch_parser = action_parser.add_parser('watch', parents=[io_parser],
+                                            help='use the volume of the git branch each time it is checked out')
+    watch_parser.add_argument('--debounce', type=_duration_argument, default=DEFAULT_WATCH_DEBOUNCE,
+                              help=f'wait until the branch has not changed for this duration before switching, '
+                                   f'default {DEFAULT_WATCH_DEBOUNCE:g}s')
+
+    batch_parser = action_parser.add_parser('batch', help='run aki commands of a file, one by line, in one process')
+    batch_parser.add_argument('batch_file', nargs='?', default='-', help='file of commands, default - reads stdin')
+    batch_parser.add_argument('--parallel', '-p', type=int, default=DEFAULT_BATCH_PARALLEL,
+                              help=f'number of independent copies run at the same time, default '
+                                   f'{DEFAULT_BATCH_PARALLEL}')
+
+    completion_parser = action_parser.add_parser('completion', help='print the script that completes aki in a shell')
+    completion_parser.add_argument('shell', choices=COMPLETION_SHELLS)
+
     version_parser = action_parser.add_parser('version', help='print aki version')
 
-    return parser.parse_args()
+    return parser
+
+
+def _run_project(arguments, project_config: config_importer.Config):
+    """
+    Run the action of the arguments on a project
+    """
+    # Priorities apply to the threads and containers that copy or remove volumes, ls, use and restarts are not slowed
+    project_config = _override_io_policy(project_config, arguments)
+
+    project.config = project_config
+    project.volume_index = VolumeIndex(project_config.state_path)
+    project.is_trash_filled = False
+
+    print_debug_def(lambda: dedent(f'''
+        version: {__version__}
+        base_path: {project.config.base_path}
+        volumes: {project.config.aki_volumes}
+        docker_compose_paths: {', '.join([str(path) for path in project.config.docker_compose])}
+        docker_env_path: {project.config.docker_env}
+    ''').strip())
+
+    try:
+        with log_operation(arguments.action):
+            _run_action(arguments)
+        purge_filled_trash()
+    finally:
+        project.volume_index.close()
+
+
+def _override_io_policy(project_config: config_importer.Config, arguments) -> config_importer.Config:
+    """
+    Return the configuration with the io options of the arguments set on its volumes
+    """
+    io_policy = project_config.io_policy.override(_io_policy_from_arguments(arguments))
+    if io_policy == project_config.io_policy:
+        return project_config
+
+    return replace(project_config, io_policy=io_policy, aki_volumes={
+        volume_type: replace(aki_volume, io_policy=io_policy)
+        for volume_type, aki_volume in project_config.aki_volumes.items()
+    })
+
+
+def _run_action(arguments):
+    """
+    Run the action of the arguments on the volumes of the current project
+    """
+    aki_volume_by_type = select_aki_volumes(arguments.volume)
+    print_debug_def(lambda: f'filter on volumes {", ".join(aki_volume_by_type.keys())}')
+
+    if arguments.action == 'ls':
+        print_volumes(aki_volume_by_type, arguments.regexp, arguments.reverse_match, arguments.long_name,
+                      arguments.details, arguments.ls_format)
+    elif arguments.action == 'use':
+        use_volume(aki_volume_by_type, arguments.name)
+    elif arguments.action == 'cp':
+        use_copied_volume = None
+        if arguments.switch_to_copy:
+            use_copied_volume = True
+        elif arguments.no_switch_to_copy:
+            use_copied_volume = False
+
+        copy_volume(aki_volume_by_type, arguments.source, arguments.destination, arguments.override_existing,
+                    use_copied_volume, live=arguments.live, freeze=arguments.freeze)
+    elif arguments.action == 'rm':
+        remove_volumes_by_name_or_pattern(aki_volume_by_type, arguments.names, arguments.regexp,
+                                          arguments.reverse_match, arguments.force)
+    elif arguments.action == 'gc':
+        gc_policy = project.config.gc_policy
+        if arguments.trash_only:
+            policy = GcPolicy()
+        else:
+            policy = GcPolicy(
+                arguments.max_size if arguments.max_size is not None else gc_policy.max_size,
+                arguments.keep if arguments.keep is not None else gc_policy.keep,
+                arguments.older_than if arguments.older_than is not None else gc_policy.older_than,
+            )
+
+        collect_garbage(aki_volume_by_type, policy, arguments.parallel or project.config.gc_parallel,
+                        arguments.dry_run, arguments.force)
+    elif arguments.action == 'flatten':
+        flatten_volumes(aki_volume_by_type, arguments.names)
+    elif arguments.action == 'watch':
+        watch_volumes(aki_volume_by_type, arguments.debounce)
+    elif arguments.action == 'batch':
+        run_batch(arguments.batch_operations, arguments.parallel)
+
+
+def select_aki_volumes(volume_types: Union[List[str], None]) -> Dict[str, AkiVolume]:
+    """
+    Return aki volumes of the types, all of them if None or empty
+    """
+    if not volume_types:
+        return project.config.aki_volumes
+
+    aki_volume_by_type: Dict[str, AkiVolume] = {}
+    for volume_type in volume_types:
+        volume_spec = project.config.aki_volumes.get(volume_type)
+        if not volume_spec:
+            raise ScriptError(f'Volume {volume_type} does not exist')
+
+        aki_volume_by_type.setdefault(volume_type, volume_spec)
+
+    return aki_volume_by_type
+
+
+def purge_filled_trash():
+    """
+    Purge the trash in background if volumes have been moved to it and the configuration asks for it
+    """
+    if project.is_trash_filled and project.config.trash_purge == config_importer.TRASH_PURGE_BACKGROUND:
+        _purge_trash_in_background()
+
+
+def run_batch(operations: List[BatchOperation], parallel: int):
+    """
+    Run the operations of a batch with the same volume listing. Independent copies run in parallel, containers stopped
+    by the operations are restarted once at the end, even if an operation fails. Stop at the first failed stage
+    """
+    if parallel < 1:
+        raise ScriptError(f'Option --parallel is {parallel} but must be at least 1')
+
+    project.deferred_restart = DeferredRestart()
+    project.volume_cache = VolumeListCache()
+    is_interactive = project.is_interactive
+    project.is_interactive = False
+    try:
+        stages = plan_stages(operations)
+        print_verbose('batch - %d operations in %d stages - %d copies in parallel', len(operations), len(stages),
+                      parallel)
+        for stage in stages:
+            if len(stage) == 1 or parallel == 1:
+                for operation in stage:
+                    print_info(operation)
+                    _run_batch_operation(operation)
+            else:
+                _run_batch_stage(stage, parallel)
+
+        print_success(f'Batch done, {len(operations)} operations')
+    finally:
+        deferred_restart = project.deferred_restart
+        project.deferred_restart = None
+        project.volume_cache = None
+        project.is_interactive = is_interactive
+        if deferred_restart.is_pending:
+            _docker_compose_up()
+
+
+def _run_batch_stage(stage: List[BatchOperation], parallel: int):
+    """
+    Run copies at the same time. Their containers are stopped for all of them, each output is printed once its copy
+    is done
+    """
+    def run_operation(operation: BatchOperation) -> Tuple[bool, str]:
+        output = io.StringIO()
+        with redirect_output(output):
+            try:
+                _run_batch_operation(operation)
+                return True, output.getvalue()
+            except ScriptError as e:
+                print_error(e)
+            except DockerException:
+                print_error(traceback.format_exc().strip())
+
+            return False, output.getvalue()
+
+    # Copies share the containers locks of the batch, a copy does not wait for another one
+    container_keys = [
+        container_lock_key(aki_volume.container_name) for aki_volume in project.config.aki_volumes.values()
+    ]
+    failed_operations = []
+    with _hold_locks(*container_keys), \
+            ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='aki_batch') as executor:
+        futures = [executor.submit(_bind_to_project(run_operation), operation) for operation in stage]
+        for operation, future in zip(stage, futures):
+            is_success, output = future.result()
+            colorize = colorize_in_green if is_success else colorize_in_red
+            print_info(colorize(str(operation)))
+            print_output(output)
+            if not is_success:
+                failed_operations.append(operation)
+
+    if failed_operations:
+        line_numbers = ', '.join(str(operation.line_number) for operation in failed_operations)
+        raise ScriptError(f'Batch failed on line {line_numbers}')
+
+
+def _read_batch_file(batch_file: str) -> List[BatchOperation]:
+    if batch_file == '-':
+        return read_operations(sys.stdin.read().splitlines(), _parse_batch_line)
+
+    try:
+        with open(batch_file) as file:
+            return read_operations(file.read().splitlines(), _parse_batch_line)
+    except OSError as e:
+        raise ScriptError(f'Cannot read batch file {batch_file} : {e}')
+
+
+def _run_batch_operation(operation: BatchOperation):
+    # io options of the line apply to its copies and removals
+    config = project.config
+    project.config = _override_io_policy(config, operation.arguments)
+    try:
+        with log_operation(operation.arguments.action, batch_line=operation.line_number):
+            _run_action(operation.arguments)
+    finally:
+        project.config = config
+
+
+def run_workspace(arguments, workspace: Workspace) -> bool:
+    """
+    Run the action of the arguments on the projects of the workspace at the same time, without asking anything.
+    Output is printed by project once it is done, records of ls as soon as a project lists them. Return True if the
+    action succeeded on every project
+    """
+    # Records of all projects are written as one output, each record has the name of its project
+    record_format = arguments.ls_format if arguments.action == 'ls' and arguments.ls_format in LS_RECORD_FORMATS \
+        else None
+    records = queue.Queue()
+
+    def run_workspace_project(workspace_project: WorkspaceProject) -> Tuple[bool, str]:
+        output = io.StringIO()
+        with redirect_output(output), log_context(project=workspace_project.name):
+            project.is_interactive = False
+            project.workspace_name = workspace_project.name
+            project.record_sink = records.put if record_format else None
+            try:
+                _run_project(arguments, config_importer.import_config(workspace_project.aki_file,
+                                                                      workspace.docker_client))
+                return True, output.getvalue()
+            except ScriptError as e:
+                print_error(e)
+            except Exception:
+                # One broken project does not hide the result of the others
+                print_error(traceback.format_exc().strip())
+
+            return False, output.getvalue()
+
+    print_verbose('workspace - %d projects - %d in parallel', len(workspace.projects), workspace.parallel)
+    failed_names = []
+    with ThreadPoolExecutor(max_workers=workspace.parallel, thread_name_prefix='aki_project') as executor:
+        futures = [executor.submit(run_workspace_project, workspace_project)
+                   for workspace_project in workspace.projects]
+        if record_format:
+            for future in futures:
+                future.add_done_callback(lambda _: records.put(None))
+            write_records(record_format, _iter_workspace_records(records, len(futures)))
+
+        for workspace_project, future in zip(workspace.projects, futures):
+            is_success, output = future.result()
+            if not is_success:
+                failed_names.append(workspace_project.name)
+
+            if record_format is None:
+                colorize = colorize_in_green if is_success else colorize_in_red
+                print_info(colorize(f'[{workspace_project.name}]'))
+                print_output(output)
+            elif not is_success:
+                print_error(f'[{workspace_project.name}]')
+                print_output(output, is_error=True)
+            elif output:
+                # Records are written to stdout, other messages of the projects go to stderr
+                print_output(f'[{workspace_project.name}]\n{output}', is_error=True)
+
+    if failed_names:
+        print_error(f'Failed on {", ".join(failed_names)}')
+    elif record_format is None:
+        print_success(f'Done on {len(workspace.projects)} projects')
+
+    return not failed_names
+
+
+def _iter_workspace_records(records: queue.Queue, project_count: int) -> Iterator[Dict]:
+    """
+    Records put by the projects as they list them, until each project is done and has put None
+    """
+    done_count = 0
+    while done_count < project_count:
+        record = records.get()
+        if record is None:
+            done_count += 1
+        else:
+            yield record
+
+
+def _open_log_file(path: Union[Path, str, None]):
+    try:
+        open_log_file(path)
+    except OSError as e:
+        raise ScriptError(f'Cannot open log file {path} : {e}')
 
 
 def main():
@@ -527,56 +1700,34 @@ def main():
         if arguments.action == 'version':
             print_info(f'aki {__version__}')
             return 0
-
-        global config
-        config = config_importer.import_config(arguments.file)
+        if arguments.action == 'completion':
+            print_info(completion_script(arguments.shell), end='')
+            return 0
 
         if arguments.verbose:
             _set_print_verbose(arguments.verbose)
+        _open_log_file(arguments.log_file or os.environ.get(LOG_FILE_ENV))
+
+        if arguments.workspace:
+            if arguments.file:
+                raise ScriptError('Options --file and --workspace cannot be used together')
+            if arguments.action == 'watch':
+                raise ScriptError('Action watch cannot be used with --workspace, run it in each project')
+
+        if arguments.action == 'batch':
+            # Read once, before anything runs: an invalid line does not leave a batch half done
+            arguments.batch_operations = _read_batch_file(arguments.batch_file)
 
-        print_debug_def(lambda: dedent(f'''
-            version: {__version__}
-            base_path: {config.base_path}
-            volumes: {config.aki_volumes}
-            docker_compose_paths: {', '.join([str(path) for path in config.docker_compose])}
-            docker_env_path: {config.docker_env}
-        ''').strip())
-
-        # Filter volumes
-        if arguments.volume:
-            aki_volume_by_type: Dict[str, AkiVolume] = {}
-            for volume_type in arguments.volume:
-                volume_spec = config.aki_volumes.get(volume_type)
-                if not volume_spec:
-                    raise ScriptError(f'Volume {volume_type} does not exist')
-
-                aki_volume_by_type.setdefault(volume_type, volume_spec)
+        if arguments.workspace:
+            if not run_workspace(arguments, import_workspace(arguments.workspace)):
+                exit_code = 1
         else:
-            aki_volume_by_type = config.aki_volumes
-
-        print_debug_def(lambda: f'filter on volumes {", ".join(aki_volume_by_type.keys())}')
-
-        if arguments.action == 'ls':
-            print_volumes(aki_volume_by_type, arguments.regexp, arguments.reverse_match, arguments.long_name)
-        elif arguments.action == 'use':
-            use_volume(aki_volume_by_type, arguments.name)
-        elif arguments.action == 'cp':
-            use_copied_volume = None
-            if arguments.switch_to_copy:
-                use_copied_volume = True
-            elif arguments.no_switch_to_copy:
-                use_copied_volume = False
-
-            copy_volume(aki_volume_by_type, arguments.source, arguments.destination, arguments.override_existing,
-                        use_copied_volume)
-        elif arguments.action == 'rm':
-            remove_volumes_by_name_or_pattern(aki_volume_by_type, arguments.names, arguments.regexp,
-                                              arguments.reverse_match, arguments.force)
+            _run_project(arguments, config_importer.import_config(arguments.file))
     except KeyboardInterrupt:
         print_error('Killed')
         exit_code = 130
     except ScriptError as e:
-        if PRINT_VERBOSE:
+        if is_verbose():
             traceback.print_exc()
         else:
             print_error(e)
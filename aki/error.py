@@ -6,6 +6,10 @@ class ScriptError(Exception):
     pass
 
 
+class LockTimeoutScriptError(ScriptError):
+    pass
+
+
 class DictParseScriptError(ScriptError):
     pass
 
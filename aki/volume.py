@@ -1,20 +1,75 @@
 import abc
+import os
+import posixpath
 import re
+import shlex
 import shutil
+import threading
+import time
+import uuid
 from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Iterator, Union
+from typing import Dict, Iterable, List, Iterator, Tuple, Union
 
 import docker.errors
 from docker import DockerClient
 from docker.errors import DockerException
 
 from aki import platform_info
-from aki._docker_client import format_aki_container_name
+from aki.error import LockTimeoutScriptError
+import aki._copy_engine as copy_engine
+import aki._disk_usage as disk_usage
+import aki._shard as shard
+import aki._sync as sync
+from aki._docker_client import format_aki_container_name, ensure_helper_image
+from aki._io_policy import IoPolicy
+from aki._journal import CopyJournal
+from aki._lock import hold_locks, overlay_layers_lock_key
 from aki._print import print_info, print_verbose, print_debug_def
+from aki._progress import CopyProgress
 
 KEY_VOLUME_DOCKER = 'docker'
 KEY_VOLUME_HOST = 'host'
+KEY_VOLUME_OVERLAY = 'overlay'
+
+COPY_ENGINE_AUTO = 'auto'
+COPY_ENGINE_NATIVE = 'native'
+COPY_ENGINE_CONTAINER = 'container'
+COPY_ENGINES = [COPY_ENGINE_AUTO, COPY_ENGINE_NATIVE, COPY_ENGINE_CONTAINER]
+
+# Folder, in host volumes parent folder, that contains removed volumes waiting to be purged
+TRASH_FOLDER_NAME = '.aki-trash'
+
+# Docker volumes of overlay volumes that are not aki volumes: layers and volumes being flattened
+OVERLAY_INTERNAL_MARKER = '.aki-'
+OVERLAY_LAYER_INFIX = '.aki-layer-'
+OVERLAY_FLATTEN_SUFFIX = '.aki-flatten'
+# Lower layers of an overlay are limited by the size of mount options, a deeper volume is copied in a single layer
+OVERLAY_MAX_DEPTH = 32
+
+# Labels of the docker volumes created by aki. A name filter on a prefix also matches the volumes of a longer prefix,
+# the prefix label tells them apart
+LABEL_AKI_PREFIX = 'aki.prefix'
+LABEL_AKI_PROJECT = 'aki.project'
+LABEL_AKI_TYPE = 'aki.type'
+LABEL_AKI_NAME = 'aki.name'
+LABEL_AKI_SOURCE = 'aki.source'  # aki name of the volume copied to create this one
+LABEL_AKI_CREATED_AT = 'aki.created_at'  # ISO 8601 date
+
+# Seconds between two measures of the destination by a copy container, du walks the whole destination: the interval
+# grows with the duration of a measure so that measures take at most 1 / _CONTAINER_PROGRESS_BACKOFF of the copy
+_CONTAINER_PROGRESS_INTERVAL = 2
+_CONTAINER_PROGRESS_BACKOFF = 10
+_CONTAINER_PROGRESS_PREFIX = 'aki-progress'
+
+# Folder names of host parent folders listed by this process, valid while the parent folder keeps its device, inode
+# and mtime: creating, removing or renaming a volume folder changes the mtime of its parent
+_folder_names_by_path: Dict[str, Tuple[Tuple[int, int, int], Tuple[str, ...]]] = {}
+_folder_names_lock = threading.Lock()
+# Seconds after a change during which the mtime of a folder may not change again, the coarsest granularity of
+# usual file systems. A folder changed more recently is listed again at each call
+_MTIME_GRANULARITY = 2
 
 
 @dataclass(frozen=True)
@@ -24,6 +79,18 @@ class Volume:
     """
     external_name: str  # name in docker or path in file system
     aki_name: str  # short name in aki
+    # Read from docker labels with the volume, None if unknown
+    created_at: Union[float, None] = field(default=None, compare=False)
+    source: Union[str, None] = field(default=None, compare=False)
+
+
+@dataclass(frozen=True)
+class FreeSpace:
+    """
+    Bytes available on a file system. Copies of volumes on the same file_system share them
+    """
+    file_system: str  # device of the file system, or the docker daemon whose volumes share it
+    size: int
 
 
 @dataclass(frozen=True)
@@ -55,13 +122,93 @@ class AkiVolume(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def copy(self, source: Volume, destination: Volume):
+    def copy(self, source: Volume, destination: Volume, journal: Union[CopyJournal, None] = None,
+             progress: Union[CopyProgress, None] = None):
+        """
+        Copy source to destination. With a journal, an existing destination is the partial result of an interrupted
+        copy that is resumed. What is copied is added to progress
+        """
         pass
 
     @abc.abstractmethod
     def remove(self, volume: Volume):
         pass
 
+    def is_copy_shallow(self, source: Volume) -> bool:
+        """
+        True if a copy of source shares its data instead of duplicating it, it needs neither time nor space
+        """
+        return False
+
+    def is_copy_writing_source(self, source: Volume) -> bool:
+        """
+        True if a copy changes source itself, other copies of source cannot read it at the same time
+        """
+        return False
+
+    def flatten(self, volume: Volume) -> bool:
+        """
+        Make a volume that shares data with other volumes a full volume, return False if it already is
+        """
+        return False
+
+    def is_live_copy_supported(self, source: Volume) -> bool:
+        """
+        True if source can be copied while its container runs, then synced once the container is stopped or paused
+        """
+        return False
+
+    def fetch_file_time(self) -> float:
+        """
+        Current timestamp of the clock that dates the files of volumes
+        """
+        return time.time()
+
+    def sync(self, source: Volume, destination: Volume, since: float):
+        """
+        Copy again what changed in source since the timestamp since, destination is a copy of source started then.
+        Nobody must write source during the sync
+        """
+        raise NotImplementedError(f'{type(self).__name__} cannot sync a copy')
+
+    def move_to_trash(self, volume: Volume) -> bool:
+        """
+        Make the volume disappear instantly, its space is reclaimed later by purge_trash.
+        Return False if the volume type has no trash and the volume has been removed
+        """
+        self.remove(volume)
+        return False
+
+    def fetch_trash(self) -> Iterator[Volume]:
+        """
+        Return volumes waiting in the trash
+        """
+        return iter(())
+
+    def purge_trash(self):
+        """
+        Remove every volume of the trash
+        """
+        pass
+
+    def fetch_size(self, volume: Volume) -> Union[int, None]:
+        """
+        Bytes used by the volume, None if it cannot be measured cheaply
+        """
+        return None
+
+    def fetch_sizes(self, volumes: Iterable[Volume]) -> Dict[str, Union[int, None]]:
+        """
+        Bytes used by each volume by aki name as fetch_size, types that measure all their volumes at once override it
+        """
+        return {volume.aki_name: self.fetch_size(volume) for volume in volumes}
+
+    def fetch_free_space(self, volume: Volume) -> Union[FreeSpace, None]:
+        """
+        Space available on the file system that stores the volume and its copies, None if unknown
+        """
+        return None
+
     def is_container_up(self) -> bool:
         """
         True if the container link to AkiVolume is running
@@ -88,6 +235,8 @@ class AkiVolume(metaclass=abc.ABCMeta):
 class AkiDockerVolume(AkiVolume):
     prefix_name: str
     exclude_names: List[str] = field(default_factory=list)
+    io_policy: IoPolicy = IoPolicy()
+    labels: Dict[str, str] = field(default_factory=dict)  # set on the volumes aki creates, e.g. project and type
 
     def volume_name_to_volume(self, volume_name: str, is_aki_name: bool = False) -> Volume:
         if is_aki_name:
@@ -101,13 +250,18 @@ class AkiDockerVolume(AkiVolume):
 
     def fetch_volumes(self, regex_pattern: str = None, reverse_match: bool = False) -> Iterator[Volume]:
         docker_filter = f'^{self.prefix_name}'
-        print_verbose(f'{self.container_name} - fetch volume on docker with filter {docker_filter}')
+        print_verbose('%s - fetch volume on docker with filter %s', self.container_name, docker_filter)
         docker_volumes = self.docker_client.volumes.list(filters={'name': docker_filter})
         print_debug_def(lambda: f'{self.container_name} - receive {[v.name for v in docker_volumes]}')
 
         for docker_volume in docker_volumes:
-            volume = self.volume_name_to_volume(docker_volume.name)
+            # Volumes created by docker compose or an older aki have no label
+            labels = docker_volume.attrs.get('Labels') or {}
+            if labels.get(LABEL_AKI_PREFIX, self.prefix_name) != self.prefix_name:
+                continue
 
+            volume = Volume(docker_volume.name, docker_volume.name[len(self.prefix_name):],
+                            _parse_label_date(labels.get(LABEL_AKI_CREATED_AT)), labels.get(LABEL_AKI_SOURCE))
             if volume.aki_name in self.exclude_names:
                 continue
 
@@ -118,9 +272,9 @@ class AkiDockerVolume(AkiVolume):
 
     def fetch_current_volume(self) -> Union[Volume, None]:
         try:
-            print_verbose(f'{self.container_name} - fetch container')
+            print_verbose('%s - fetch container', self.container_name)
             container = self.docker_client.containers.get(self.container_name)
-            print_verbose(f'{self.container_name} - fetch container ok')
+            print_verbose('%s - fetch container ok', self.container_name)
 
             container_volumes = container.attrs.get('Mounts')
 
@@ -128,26 +282,59 @@ class AkiDockerVolume(AkiVolume):
                 volume_name = docker_volumes.get('Name')
                 if volume_name and self.prefix_name in volume_name:
                     current_volume = self.volume_name_to_volume(volume_name)
-                    print_verbose(f'{self.container_name} - {current_volume=}')
+                    print_verbose('%s - current_volume=%s', self.container_name, current_volume)
                     return current_volume
 
             return None
         except DockerException as e:
-            print_verbose(f'{self.container_name} - fetch container error {e}')
+            print_verbose('%s - fetch container error %s', self.container_name, e)
             return None
 
-    def copy(self, source: Volume, destination: Volume):
-        print_verbose(f'{self.container_name} - docker copy {self.container_name}, {source=}, {destination=}')
+    def copy(self, source: Volume, destination: Volume, journal: Union[CopyJournal, None] = None,
+             progress: Union[CopyProgress, None] = None):
+        # cp -a overwrites files of a partial destination, a resumed copy copies everything again
+        print_verbose('%s - docker copy source=%s, destination=%s', self.container_name, source, destination)
         print_info(f'Copying volume {source.external_name} to {destination.external_name}')
+        if progress:
+            progress.update(0, 0)
 
-        self.docker_client.containers.run('busybox',
-                                          command='cp -a /source/ /destination',
-                                          name=format_aki_container_name(f'cp_{self.container_name}'),
-                                          volumes=[
-                                              f'{source.external_name}:/source',
-                                              f'{destination.external_name}:/destination'
-                                          ],
-                                          remove=True)
+        # Created before the copy container mounts it, that would create it without labels
+        try:
+            self.docker_client.volumes.get(destination.external_name)
+        except docker.errors.NotFound:
+            self.docker_client.volumes.create(name=destination.external_name,
+                                              labels=self._create_labels(destination, source))
+        command = _container_copy_command(self.docker_client, self.io_policy, source.external_name,
+                                          f'cp_{self.container_name}')
+        _run_copy_container(self.docker_client, self.io_policy, command,
+                            name=format_aki_container_name(f'cp_{self.container_name}'),
+                            volumes=[
+                                f'{source.external_name}:/source',
+                                f'{destination.external_name}:/destination'
+                            ],
+                            progress=progress, progress_folder='/destination')
+
+    def is_live_copy_supported(self, source: Volume) -> bool:
+        return True
+
+    def fetch_file_time(self) -> float:
+        # Files of docker volumes are dated by the docker host, aki may run elsewhere
+        try:
+            system_time = _parse_docker_time(self.docker_client.info().get('SystemTime'))
+        except DockerException as e:
+            print_verbose('%s - cannot read docker host time (%s)', self.container_name, e)
+            system_time = None
+
+        return system_time if system_time is not None else time.time()
+
+    def sync(self, source: Volume, destination: Volume, since: float):
+        print_info(f'Copying changes of volume {source.external_name} to {destination.external_name}')
+        _run_copy_container(self.docker_client, self.io_policy, sync.sync_command(since),
+                            name=format_aki_container_name(f'sync_{self.container_name}'),
+                            volumes=[
+                                f'{source.external_name}:/source:ro',
+                                f'{destination.external_name}:/destination'
+                            ])
 
     def remove(self, volume: Volume):
         try:
@@ -156,11 +343,76 @@ class AkiDockerVolume(AkiVolume):
         except DockerException:
             pass
 
+    def fetch_size(self, volume: Volume) -> Union[int, None]:
+        return self._fetch_size_by_docker_volume_name().get(volume.external_name)
+
+    def fetch_sizes(self, volumes: Iterable[Volume]) -> Dict[str, Union[int, None]]:
+        size_by_name = self._fetch_size_by_docker_volume_name()
+        return {volume.aki_name: size_by_name.get(volume.external_name) for volume in volumes}
+
+    def _fetch_size_by_docker_volume_name(self) -> Dict[str, int]:
+        """
+        Usage of the volumes computed by docker system df. It measures every volume of the daemon, a caller measuring
+        several volumes calls it once. The daemon returns -1 when it has not been computed
+        """
+        try:
+            docker_volumes = self.docker_client.df().get('Volumes') or []
+        except DockerException as e:
+            print_verbose('%s - docker df error %s', self.container_name, e)
+            return {}
+
+        size_by_name = {}
+        for docker_volume in docker_volumes:
+            size = (docker_volume.get('UsageData') or {}).get('Size', -1)
+            if size >= 0:
+                size_by_name[docker_volume.get('Name')] = size
+        return size_by_name
+
+    def _create_labels(self, volume: Volume, source: Union[Volume, None] = None) -> Dict[str, str]:
+        """
+        Labels of a volume created now, copied from source if any
+        """
+        labels = {
+            **self.labels,
+            LABEL_AKI_PREFIX: self.prefix_name,
+            LABEL_AKI_NAME: volume.aki_name,
+            LABEL_AKI_CREATED_AT: datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        if source:
+            labels[LABEL_AKI_SOURCE] = source.aki_name
+
+        return labels
+
+    def fetch_free_space(self, volume: Volume) -> Union[FreeSpace, None]:
+        # Docker root folder is the one of the file system of aki only if the daemon runs on this host
+        if _is_local_docker(self.docker_client):
+            try:
+                docker_root_dir = self.docker_client.info().get('DockerRootDir')
+                if docker_root_dir:
+                    return _fetch_folder_free_space(docker_root_dir)
+            except (DockerException, OSError) as e:
+                print_verbose('%s - cannot read docker root folder free space (%s)', self.container_name, e)
+
+        # Otherwise ask a container, docker volumes share the file system of docker root folder
+        try:
+            output = self.docker_client.containers.run(ensure_helper_image(self.docker_client),
+                                                       command='df -Pk /volume',
+                                                       name=format_aki_container_name(f'df_{self.container_name}'),
+                                                       volumes=[f'{volume.external_name}:/volume:ro'],
+                                                       remove=True)
+            return FreeSpace(f'docker:{self.docker_client.api.base_url}',
+                             int(output.decode().strip().splitlines()[-1].split()[3]) * 1024)
+        except (DockerException, ValueError, IndexError) as e:
+            print_verbose('%s - cannot read free space with a container (%s)', self.container_name, e)
+            return None
+
 
 @dataclass(frozen=True)
 class AkiHostVolume(AkiVolume):
     parent_folder: Path
     exclude_names: List[str] = field(default_factory=list)
+    copy_engine: str = COPY_ENGINE_AUTO
+    io_policy: IoPolicy = IoPolicy()
 
     def volume_name_to_volume(self, volume_name: str, is_aki_name: bool = False) -> Volume:
         if is_aki_name:
@@ -173,17 +425,16 @@ class AkiHostVolume(AkiVolume):
         return Volume(name, aki_name)
 
     def fetch_volumes(self, regex_pattern: str = None, reverse_match: bool = False) -> Iterator[Volume]:
-        print_verbose(f'{self.container_name} - fetch volume on host - folder {self.parent_folder} - '
-                      f'excludes {self.exclude_names}')
+        print_verbose('%s - fetch volume on host - folder %s - excludes %s', self.container_name, self.parent_folder,
+                      self.exclude_names)
 
-        for file in self.parent_folder.iterdir():
-            if not file.is_dir():
-                continue
-
-            if file.name in self.exclude_names:
+        # Paths are joined as strings, pathlib costs more than the cached listing
+        parent_folder = str(self.parent_folder)
+        for name in _list_folder_names(self.parent_folder):
+            if name in self.exclude_names or name == TRASH_FOLDER_NAME:
                 continue
 
-            volume = self.volume_name_to_volume(str(file))
+            volume = Volume(os.path.join(parent_folder, name), name)
             if not AkiVolume.is_volume_match_pattern(volume, regex_pattern, reverse_match):
                 continue
 
@@ -194,62 +445,579 @@ class AkiHostVolume(AkiVolume):
         exclude_str_path = [str(self.parent_folder / exclude_name) for exclude_name in self.exclude_names]
 
         try:
-            print_verbose(f'{self.container_name} - fetch container')
+            print_verbose('%s - fetch container', self.container_name)
             container = self.docker_client.containers.get(self.container_name)
-            print_verbose(f'{self.container_name} - fetch container ok')
+            print_verbose('%s - fetch container ok', self.container_name)
             volumes = container.attrs.get('Mounts')
 
             for volume in filter(lambda v: v.get('Type') == 'bind', volumes):
                 volume_path = volume.get('Source')
 
                 if parent_folder in volume_path and volume_path not in exclude_str_path:
-                    print_verbose(f'{self.container_name} - current_volume={volume_path}')
+                    print_verbose('%s - current_volume=%s', self.container_name, volume_path)
                     return self.volume_name_to_volume(volume_path)
         except DockerException as e:
-            print_verbose(f'{self.container_name} - fetch container error {e}')
+            print_verbose('%s - fetch container error %s', self.container_name, e)
             return None
 
         return None
 
-    def copy(self, source: Volume, destination: Volume):
-        print_verbose(f'{self.container_name} - host copy {source=}, {destination=}')
+    def copy(self, source: Volume, destination: Volume, journal: Union[CopyJournal, None] = None,
+             progress: Union[CopyProgress, None] = None):
+        print_verbose('%s - host copy source=%s, destination=%s', self.container_name, source, destination)
 
         destination_path = Path(destination.external_name)
-        if destination_path.exists():
+        if destination_path.exists() and journal is None:
             destination_path.rmdir()
 
         print_info(f'Copying {source.external_name} to {destination.external_name}')
-        if platform_info.is_linux():
-            print_verbose('copy on linux - start a container')
-            self.docker_client.containers.run('busybox',
-                                              command='cp -a /source/. /destination',
-                                              name=format_aki_container_name(f'cp_{self.container_name}'),
-                                              volumes=[
-                                                  f'{source.external_name}:/source',
-                                                  f'{destination.external_name}:/destination'
-                                              ],
-                                              remove=True)
-        else:
-            print_verbose('copy with sh')
-            shutil.copytree(source.external_name, destination.external_name)
+        if self._is_native_copy(source):
+            try:
+                copy_engine.copy_tree(Path(source.external_name), destination_path,
+                                      workers=self.io_policy.workers or copy_engine.DEFAULT_WORKERS, journal=journal,
+                                      bytes_per_second=self.io_policy.bytes_per_second, progress=progress,
+                                      keep_ownership=self._is_container_fallback(),
+                                      worker_initializer=self.io_policy.apply_to_current_thread)
+                return
+            except PermissionError as e:
+                if not self._is_container_fallback():
+                    raise
+
+                # Files of the partial copy belong to aki, they can be removed without a container
+                print_verbose('native copy failed with %s - fallback to a container', e)
+                shutil.rmtree(destination_path, ignore_errors=True)
+                if journal:
+                    journal.restart()
+
+        print_verbose('copy with a container')
+        if progress:
+            # cp -a copies everything again, the destination is measured from scratch
+            progress.update(0, 0)
+        command = _container_copy_command(self.docker_client, self.io_policy, source.external_name,
+                                          f'cp_{self.container_name}')
+        _run_copy_container(self.docker_client, self.io_policy, command,
+                            name=format_aki_container_name(f'cp_{self.container_name}'),
+                            volumes=[
+                                f'{source.external_name}:/source',
+                                f'{destination.external_name}:/destination'
+                            ],
+                            progress=progress, progress_folder='/destination')
+
+    def is_live_copy_supported(self, source: Volume) -> bool:
+        return True
+
+    def sync(self, source: Volume, destination: Volume, since: float):
+        print_info(f'Copying changes of {source.external_name} to {destination.external_name}')
+        if self._is_native_copy(source):
+            try:
+                since_ns = int((since - sync.SYNC_CLOCK_MARGIN) * 1_000_000_000)
+                self.io_policy.run_in_thread(lambda: copy_engine.sync_tree(
+                    Path(source.external_name), Path(destination.external_name), since_ns,
+                    keep_ownership=self._is_container_fallback()))
+                return
+            except PermissionError as e:
+                if not self._is_container_fallback():
+                    raise
+                print_verbose('native sync failed with %s - fallback to a container', e)
+
+        _run_copy_container(self.docker_client, self.io_policy, sync.sync_command(since),
+                            name=format_aki_container_name(f'sync_{self.container_name}'),
+                            volumes=[
+                                f'{source.external_name}:/source:ro',
+                                f'{destination.external_name}:/destination'
+                            ])
+
+    def _is_native_copy(self, source: Volume) -> bool:
+        """
+        Native engine is used off linux, on linux a container is used unless aki can read and write files itself
+        """
+        if self.copy_engine == COPY_ENGINE_NATIVE:
+            return True
+        elif self.copy_engine == COPY_ENGINE_CONTAINER:
+            return False
+
+        return not platform_info.is_linux() or copy_engine.can_copy_natively(Path(source.external_name))
+
+    def _is_container_fallback(self) -> bool:
+        """
+        True if a failed native copy is done again with a container. The native copy then fails on a file of another
+        user, that aki cannot give to its owner as cp -a in a container does
+        """
+        return self.copy_engine == COPY_ENGINE_AUTO and platform_info.is_linux()
 
     def remove(self, volume: Volume):
+        print_info(f'Removing {volume.external_name}')
+        self._remove_folder(volume.external_name)
+
+    def move_to_trash(self, volume: Volume) -> bool:
+        print_info(f'Removing {volume.external_name}')
+        trash_path = self.trash_folder / f'{volume.aki_name}.{uuid.uuid4().hex}'
+
         try:
-            print_info(f'Removing {volume.external_name}')
+            try:
+                self.trash_folder.mkdir(exist_ok=True)
+                # Same file system, rename is instant whatever the volume size
+                os.rename(volume.external_name, trash_path)
+            except PermissionError:
+                # A folder written by a container, or a parent folder created by docker, cannot be moved by the user:
+                # a container moves it as root
+                self._move_in_container(volume.external_name, trash_path)
+            print_verbose('%s - %s moved to %s', self.container_name, volume.external_name, trash_path)
+            return True
+        except FileNotFoundError:
+            return False
+        except (DockerException, OSError) as e:
+            print_info(f'Cannot move {volume.external_name} to trash ({e}), removing it now')
+            self._remove_folder(volume.external_name)
+            return False
+
+    def fetch_trash(self) -> Iterator[Volume]:
+        if not self.trash_folder.is_dir():
+            return
+
+        for file in self.trash_folder.iterdir():
+            yield Volume(str(file), file.name)
 
+    def purge_trash(self):
+        for volume in self.fetch_trash():
+            print_info(f'Purging {volume.external_name}')
+            self._remove_folder(volume.external_name)
+
+    def fetch_size(self, volume: Volume) -> Union[int, None]:
+        try:
+            return disk_usage.measure_tree(Path(volume.external_name)).size
+        except OSError as e:
+            # Folders written by a container may not be readable by the user
+            print_verbose('%s - cannot measure %s (%s)', self.container_name, volume.external_name, e)
+            return None
+
+    def fetch_free_space(self, volume: Volume) -> Union[FreeSpace, None]:
+        try:
+            return _fetch_folder_free_space(self.parent_folder)
+        except OSError as e:
+            print_verbose('%s - cannot read free space of %s (%s)', self.container_name, self.parent_folder, e)
+            return None
+
+    @property
+    def trash_folder(self) -> Path:
+        return self.parent_folder / TRASH_FOLDER_NAME
+
+    def _move_in_container(self, path: str, trash_path: Path):
+        source = posixpath.join('/volumes', Path(path).relative_to(self.parent_folder).as_posix())
+        destination = posixpath.join('/volumes', trash_path.relative_to(self.parent_folder).as_posix())
+        if not os.path.lexists(path):
+            raise FileNotFoundError(path)
+
+        self.docker_client.containers.run(ensure_helper_image(self.docker_client),
+                                          command=['sh', '-c', 'mkdir -p -- "$(dirname -- "$2")" && mv -- "$1" "$2"',
+                                                   'sh', source, destination],
+                                          name=format_aki_container_name(f'trash_{self.container_name}'),
+                                          volumes=[f'{self.parent_folder}:/volumes'],
+                                          remove=True)
+
+    def _remove_folder(self, path: str):
+        try:
             # Remove via shell, work on macOS and aki inside docker container (macOS and Linux).
             # aki on linux will trigger a PermissionError as files written by a container does not belong to user
             try:
-                shutil.rmtree(volume.external_name)
+                # Only the removal runs with the io priorities, not the rest of the command
+                self.io_policy.run_in_thread(lambda: shutil.rmtree(path))
 
             except PermissionError:
                 # If a PermissionError is trigger then try to remove all files inside the docker container and retry
-                self.docker_client.containers.run('busybox',
-                                                  command='sh -c "rm -rf -- ..?* .[!.]* *"',
+                self.docker_client.containers.run(ensure_helper_image(self.docker_client),
+                                                  command=self.io_policy.wrap_command(
+                                                      'sh -c "rm -rf -- ..?* .[!.]* *"'),
                                                   working_dir='/volume',
                                                   name=format_aki_container_name(f'rm_{self.container_name}'),
-                                                  volumes=[f'{volume.external_name}:/volume'],
-                                                  remove=True)
-                shutil.rmtree(volume.external_name)
+                                                  volumes=[f'{path}:/volume'],
+                                                  remove=True,
+                                                  **self.io_policy.container_options())
+                shutil.rmtree(path)
         except FileNotFoundError:
             pass
+
+
+@dataclass(frozen=True)
+class _OverlayMount:
+    """
+    Mount options of an overlay docker volume, paths are on the docker host
+    """
+    lower_dirs: List[str]  # read only layers, top first
+    upper_dir: str  # layer that receives the changes, its work folder is next to it
+
+    @classmethod
+    def from_options(cls, options: Union[Dict[str, str], None]) -> Union['_OverlayMount', None]:
+        if not options or options.get('type') != 'overlay':
+            return None
+
+        mount_options = dict(item.split('=', 1) for item in options.get('o', '').split(',') if '=' in item)
+        return cls(mount_options['lowerdir'].split(':'), mount_options['upperdir'])
+
+    def to_options(self) -> Dict[str, str]:
+        work_dir = posixpath.join(posixpath.dirname(self.upper_dir), 'work')
+        return {
+            'type': 'overlay',
+            'device': 'overlay',
+            'o': f'lowerdir={":".join(self.lower_dirs)},upperdir={self.upper_dir},workdir={work_dir}',
+        }
+
+
+@dataclass(frozen=True)
+class AkiOverlayVolume(AkiDockerVolume):
+    """
+    Docker volumes mounted by docker as overlays. A copy freezes the changes of its source in a read only layer shared
+    by both volumes, then each one writes its changes in a new layer: it takes the same time whatever the source size
+    and only changes use disk space. Layers are docker volumes removed once no volume uses them
+    """
+
+    def fetch_volumes(self, regex_pattern: str = None, reverse_match: bool = False) -> Iterator[Volume]:
+        for volume in super().fetch_volumes(regex_pattern, reverse_match):
+            if OVERLAY_INTERNAL_MARKER not in volume.aki_name:
+                yield volume
+
+    def is_copy_shallow(self, source: Volume) -> bool:
+        source_mount = self._fetch_mount(source.external_name)
+        return source_mount is not None and len(source_mount.lower_dirs) < OVERLAY_MAX_DEPTH
+
+    def is_live_copy_supported(self, source: Volume) -> bool:
+        # The source becomes an overlay on the copied layer, it cannot be in use
+        return False
+
+    def is_copy_writing_source(self, source: Volume) -> bool:
+        # The source is created again on the layers it shares with the copy
+        return True
+
+    def copy(self, source: Volume, destination: Volume, journal: Union[CopyJournal, None] = None,
+             progress: Union[CopyProgress, None] = None):
+        # Layers are created at once, an interrupted copy has nothing to resume
+        print_verbose('%s - overlay copy source=%s, destination=%s', self.container_name, source, destination)
+        # Layers created by the copy are used by no volume until the overlays are created on them
+        with hold_locks([], shared_keys=[overlay_layers_lock_key(self.prefix_name)]):
+            self._remove_docker_volume(destination.external_name)
+
+            source_mount = self._fetch_mount(source.external_name)
+            if source_mount is None or len(source_mount.lower_dirs) >= OVERLAY_MAX_DEPTH:
+                # A full volume, or a deep one, is copied once in a layer then both volumes become overlays on it
+                print_info(f'Copying volume {source.external_name} to a layer')
+                lower_dirs = [self._create_layer(source, copy_from=source, progress=progress)]
+                self._create_overlay(source, lower_dirs)
+            elif self._is_layer_empty(source_mount.upper_dir):
+                lower_dirs = source_mount.lower_dirs
+            else:
+                lower_dirs = [source_mount.upper_dir, *source_mount.lower_dirs]
+                self._create_overlay(source, lower_dirs)
+
+            print_info(f'Creating volume {destination.external_name} on {len(lower_dirs)} layers')
+            self._create_overlay(destination, lower_dirs, self._create_labels(destination, source))
+        self._remove_unused_layers()
+
+    def remove(self, volume: Volume):
+        super().remove(volume)
+        self._remove_unused_layers()
+
+    def flatten(self, volume: Volume) -> bool:
+        docker_volume = self.docker_client.volumes.get(volume.external_name)
+        options = docker_volume.attrs.get('Options')
+        if _OverlayMount.from_options(options) is None:
+            return False
+
+        labels = docker_volume.attrs.get('Labels') or {}
+        print_info(f'Flattening {volume.external_name}')
+        # Docker cannot rename a volume: a temporary volume mounts the layers while the volume is created as a full one
+        temporary_name = f'{volume.external_name}{OVERLAY_FLATTEN_SUFFIX}'
+        self._remove_docker_volume(temporary_name)
+        self.docker_client.volumes.create(name=temporary_name, driver='local', driver_opts=options)
+        docker_volume.remove()
+        try:
+            self.docker_client.volumes.create(name=volume.external_name, labels=labels)
+            command = _container_copy_command(self.docker_client, self.io_policy, temporary_name,
+                                              f'flatten_{self.container_name}')
+            _run_copy_container(self.docker_client, self.io_policy, command,
+                                name=format_aki_container_name(f'flatten_{self.container_name}'),
+                                volumes=[
+                                    f'{temporary_name}:/source:ro',
+                                    f'{volume.external_name}:/destination'
+                                ])
+        except DockerException:
+            # Keep the volume as it was
+            self._remove_docker_volume(volume.external_name)
+            self.docker_client.volumes.create(name=volume.external_name, driver='local', driver_opts=options,
+                                              labels=labels)
+            raise
+        finally:
+            self._remove_docker_volume(temporary_name)
+
+        self._remove_unused_layers()
+        return True
+
+    def fetch_size(self, volume: Volume) -> Union[int, None]:
+        return self.fetch_sizes([volume]).get(volume.aki_name)
+
+    def fetch_sizes(self, volumes: Iterable[Volume]) -> Dict[str, Union[int, None]]:
+        # Layers shared with other volumes are not counted, only the changes of the volume
+        size_by_name = self._fetch_size_by_docker_volume_name()
+        layer_volume_by_upper_dir = None
+        size_by_aki_name = {}
+        for volume in volumes:
+            try:
+                mount = self._fetch_mount(volume.external_name)
+            except DockerException as e:
+                print_verbose('%s - cannot inspect %s (%s)', self.container_name, volume.external_name, e)
+                size_by_aki_name[volume.aki_name] = None
+                continue
+
+            if mount is None:
+                size_by_aki_name[volume.aki_name] = size_by_name.get(volume.external_name)
+                continue
+
+            if layer_volume_by_upper_dir is None:
+                layer_volume_by_upper_dir = self._fetch_layer_volume_by_upper_dir()
+            layer_volume = layer_volume_by_upper_dir.get(mount.upper_dir)
+            size_by_aki_name[volume.aki_name] = size_by_name.get(layer_volume.name) if layer_volume else None
+        return size_by_aki_name
+
+    def _fetch_mount(self, volume_name: str) -> Union[_OverlayMount, None]:
+        return _OverlayMount.from_options(self.docker_client.volumes.get(volume_name).attrs.get('Options'))
+
+    def _list_docker_volumes(self):
+        return self.docker_client.volumes.list(filters={'name': f'^{self.prefix_name}'})
+
+    def _fetch_layer_volume_by_upper_dir(self):
+        return {
+            posixpath.join(docker_volume.attrs['Mountpoint'], 'upper'): docker_volume
+            for docker_volume in self._list_docker_volumes()
+            if OVERLAY_LAYER_INFIX in docker_volume.name
+        }
+
+    def _create_layer(self, volume: Volume, copy_from: Union[Volume, None] = None,
+                      progress: Union[CopyProgress, None] = None) -> str:
+        """
+        Create a layer of volume, filled with the content of copy_from. Return its upper folder
+        """
+        layer_name = f'{volume.external_name}{OVERLAY_LAYER_INFIX}{uuid.uuid4().hex[:12]}'
+        layer_volume = self.docker_client.volumes.create(name=layer_name)
+
+        command = 'mkdir -p /layer/upper /layer/work'
+        volumes = [f'{layer_name}:/layer']
+        if copy_from:
+            copy_command = _container_copy_command(self.docker_client, self.io_policy, copy_from.external_name,
+                                                   f'layer_{self.container_name}', destination_folder='/layer/upper')
+            command = f'sh -c {shlex.quote(f"{command} && {copy_command}")}'
+            volumes.append(f'{copy_from.external_name}:/source:ro')
+
+        _run_copy_container(self.docker_client, self.io_policy, command,
+                            name=format_aki_container_name(f'layer_{self.container_name}'),
+                            volumes=volumes,
+                            progress=progress if copy_from else None, progress_folder='/layer/upper')
+        return posixpath.join(layer_volume.attrs['Mountpoint'], 'upper')
+
+    def _create_overlay(self, volume: Volume, lower_dirs: List[str], labels: Union[Dict[str, str], None] = None):
+        """
+        Create, or create again, volume as an overlay of lower_dirs that writes in a new layer. A volume created again
+        keeps its labels unless labels are given
+        """
+        upper_dir = self._create_layer(volume)
+        if labels is None:
+            labels = self.docker_client.volumes.get(volume.external_name).attrs.get('Labels') or {}
+        self._remove_docker_volume(volume.external_name)
+        self.docker_client.volumes.create(name=volume.external_name, driver='local',
+                                          driver_opts=_OverlayMount(lower_dirs, upper_dir).to_options(), labels=labels)
+
+    def _is_layer_empty(self, upper_dir: str) -> bool:
+        layer_volume = self._fetch_layer_volume_by_upper_dir().get(upper_dir)
+        if layer_volume is None:
+            return False
+
+        output = self.docker_client.containers.run(ensure_helper_image(self.docker_client),
+                                                   command='ls -A /layer/upper',
+                                                   name=format_aki_container_name(f'ls_{self.container_name}'),
+                                                   volumes=[f'{layer_volume.name}:/layer:ro'],
+                                                   remove=True)
+        return not output.strip()
+
+    def _remove_unused_layers(self):
+        """
+        Remove layers used by no volume, unless a copy of another thread or process creates layers: that copy removes
+        them once it is done
+        """
+        try:
+            with hold_locks([overlay_layers_lock_key(self.prefix_name)], timeout=0):
+                self._remove_layers_unused_now()
+        except LockTimeoutScriptError:
+            print_verbose('%s - a copy creates layers, keep unused layers', self.container_name)
+
+    def _remove_layers_unused_now(self):
+        docker_volumes = self._list_docker_volumes()
+
+        used_dirs = set()
+        for docker_volume in docker_volumes:
+            mount = _OverlayMount.from_options(docker_volume.attrs.get('Options'))
+            if mount:
+                used_dirs.update([mount.upper_dir, *mount.lower_dirs])
+
+        for docker_volume in docker_volumes:
+            if OVERLAY_LAYER_INFIX not in docker_volume.name:
+                continue
+
+            if posixpath.join(docker_volume.attrs['Mountpoint'], 'upper') not in used_dirs:
+                print_verbose('%s - remove unused layer %s', self.container_name, docker_volume.name)
+                self._remove_docker_volume(docker_volume.name)
+
+    def _remove_docker_volume(self, volume_name: str):
+        try:
+            self.docker_client.volumes.get(volume_name).remove()
+        except docker.errors.NotFound:
+            pass
+
+
+def _fetch_folder_free_space(folder: Union[Path, str]) -> FreeSpace:
+    return FreeSpace(f'device:{os.stat(folder).st_dev}', shutil.disk_usage(folder).free)
+
+
+def _is_local_docker(docker_client: DockerClient) -> bool:
+    """
+    True if the docker daemon listens on a unix socket of this linux host, DOCKER_HOST is not a remote daemon. Docker
+    Desktop runs it in a virtual machine on other systems
+    """
+    base_url = getattr(getattr(docker_client, 'api', None), 'base_url', None)
+    return platform_info.is_linux() and isinstance(base_url, str) and base_url.startswith('http+docker://localhost')
+
+
+def _run_copy_container(docker_client: DockerClient, io_policy: IoPolicy, command: str, name: str, volumes: List[str],
+                        progress: Union[CopyProgress, None] = None, progress_folder: Union[str, None] = None):
+    """
+    Run command in a helper container. With a progress, a background loop of the container measures progress_folder
+    and prints it, its output is read while the command runs
+    """
+    image = ensure_helper_image(docker_client)
+    if progress is None:
+        docker_client.containers.run(image, command=io_policy.wrap_command(command), name=name, volumes=volumes,
+                                     remove=True, **io_policy.container_options())
+        return
+
+    script = f'({_progress_loop_script(progress_folder)}) & {command}; status=$?; kill $! 2>/dev/null; exit $status'
+    command = io_policy.wrap_command(f'sh -c {shlex.quote(script)}')
+    container = docker_client.containers.run(image, command=command, name=name, volumes=volumes, detach=True,
+                                             **io_policy.container_options())
+    try:
+        for line in _iter_lines(container.logs(stream=True, follow=True)):
+            _read_progress_line(line, progress)
+
+        exit_status = container.wait().get('StatusCode', 0)
+        if exit_status != 0:
+            raise docker.errors.ContainerError(container, exit_status, command, image,
+                                               container.logs(stdout=False, stderr=True))
+    finally:
+        container.remove(force=True)
+
+
+def _progress_loop_script(progress_folder: str) -> str:
+    """
+    Shell loop that prints the size and the number of entries of progress_folder, less often as it grows
+    """
+    # du -a lists every entry, the last line is the folder itself with the total in KB
+    measure = f'du -ak {progress_folder} | awk \'{{size = $1}} END {{print "{_CONTAINER_PROGRESS_PREFIX}", size, NR}}\''
+    return (f'interval={_CONTAINER_PROGRESS_INTERVAL}; while sleep $interval; do start=$(date +%s); {measure}; '
+            f'interval=$(( ($(date +%s) - start) * {_CONTAINER_PROGRESS_BACKOFF} )); '
+            f'[ $interval -lt {_CONTAINER_PROGRESS_INTERVAL} ] && interval={_CONTAINER_PROGRESS_INTERVAL}; done')
+
+
+def _container_copy_command(docker_client: DockerClient, io_policy: IoPolicy, source: str, name_fragment: str,
+                            destination_folder: str = '/destination') -> str:
+    """
+    Command of a copy container that copies source, mounted on /source, into destination_folder. With several workers, a
+    container lists source first and the command copies its tree with a cp by shard
+    """
+    workers = io_policy.workers or shard.DEFAULT_SHARD_WORKERS
+    if workers < 2:
+        return shard.copy_command(None, destination_folder=destination_folder)
+
+    output = docker_client.containers.run(ensure_helper_image(docker_client),
+                                          command=io_policy.wrap_command(shard.listing_command()),
+                                          name=format_aki_container_name(f'ls_{name_fragment}'),
+                                          volumes=[f'{source}:/source:ro'], remove=True,
+                                          **io_policy.container_options())
+    plan = shard.plan_copy(shard.parse_listing(output.decode(errors='replace')), workers)
+    print_verbose('copy container - %s shards of %s', len(plan.shards) if plan else 1, source)
+    return shard.copy_command(plan, destination_folder=destination_folder)
+
+
+def _iter_lines(chunks: Iterator[bytes]) -> Iterator[str]:
+    """
+    Split log chunks of a container in lines
+    """
+    pending = b''
+    for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line.decode(errors='replace')
+    if pending:
+        yield pending.decode(errors='replace')
+
+
+def _read_progress_line(line: str, progress: CopyProgress):
+    """
+    Update progress with a line printed by the measure loop, other lines are cp messages
+    """
+    parts = line.split()
+    if len(parts) != 3 or parts[0] != _CONTAINER_PROGRESS_PREFIX:
+        print_verbose('copy container - %s', line)
+        return
+
+    try:
+        # Entries of du include folders
+        progress.update(int(parts[1]) * 1024, int(parts[2]))
+    except ValueError:
+        print_verbose('copy container - invalid progress %s', line)
+
+
+def _parse_label_date(value: Union[str, None]) -> Union[float, None]:
+    """
+    Return the timestamp of an ISO 8601 date label, None if missing or invalid
+    """
+    if not value:
+        return None
+
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def _parse_docker_time(value: Union[str, None]) -> Union[float, None]:
+    """
+    Return the timestamp of a date of the docker API, RFC 3339 with nanoseconds. None if missing or invalid
+    """
+    match = re.fullmatch(r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)', value or '')
+    if not match:
+        return None
+
+    date = datetime.fromisoformat(match.group(1) + match.group(3).replace('Z', '+00:00'))
+    return date.timestamp() + float(f'0.{match.group(2) or 0}')
+
+
+def _list_folder_names(path: Path) -> Tuple[str, ...]:
+    """
+    Return names of the folders in path, symlinks to folders included. The type of an entry comes from the directory
+    listing, entries are not stated. Listings are kept by the process until the mtime of path changes
+    """
+    key = str(path)
+    folder_stat = os.stat(key)
+    signature = (folder_stat.st_dev, folder_stat.st_ino, folder_stat.st_mtime_ns)
+    with _folder_names_lock:
+        cached = _folder_names_by_path.get(key)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    listed_at = time.time()
+    with os.scandir(key) as entries:
+        names = tuple(entry.name for entry in entries if entry.is_dir())
+
+    # A folder created in the same mtime tick as the listing would not change the mtime
+    if listed_at - folder_stat.st_mtime_ns / 1_000_000_000 > _MTIME_GRANULARITY:
+        with _folder_names_lock:
+            _folder_names_by_path[key] = (signature, names)
+
+    return names
@@ -0,0 +1,512 @@
+"""
+Throughput of the copy and remove engines of aki on synthetic datasets.
+
+Datasets are generated in a work folder, on the file system to measure: many small files, a few huge sparse files, a
+deep tree and hardlinked files. Each available engine copies then removes each dataset several times. A run is done by
+a child process so its peak memory and cpu time are its own. Results are written to a json file:
+
+    python -m benchmarks.copy_engines --work-folder /var/lib/aki-benchmark --output results.json
+
+Engines running in a container (container, docker) are measured from the docker client: their duration is real but
+memory and cpu of the container are not counted.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Union
+
+import docker
+from docker.errors import DockerException
+
+from aki import platform_info
+from aki._copy_engine import copy_tree
+from aki._disk_usage import measure_tree
+from aki._docker_client import ensure_helper_image, format_aki_container_name
+from aki._format import format_size
+from aki._io_policy import IoPolicy
+from aki._print import print_info, print_error, redirect_output
+from aki.version import __version__
+from aki.volume import AkiDockerVolume, AkiHostVolume, COPY_ENGINE_CONTAINER, COPY_ENGINE_NATIVE
+
+COPY_ENGINE_SHUTIL = 'shutil'
+COPY_ENGINE_CP = 'cp'
+COPY_ENGINE_DOCKER = 'docker'
+# native and container are the engines of host volumes, docker the copy of docker volumes, shutil and cp are references
+COPY_ENGINES = [COPY_ENGINE_NATIVE, COPY_ENGINE_CONTAINER, COPY_ENGINE_DOCKER, COPY_ENGINE_SHUTIL, COPY_ENGINE_CP]
+
+REMOVE_ENGINE_RMTREE = 'rmtree'
+REMOVE_ENGINE_CONTAINER = 'container'
+REMOVE_ENGINE_DOCKER = 'docker'
+REMOVE_ENGINES = [REMOVE_ENGINE_RMTREE, REMOVE_ENGINE_CONTAINER, REMOVE_ENGINE_DOCKER]
+
+DATASET_SMALL_FILES = 'small_files'
+DATASET_SPARSE_FILES = 'sparse_files'
+DATASET_DEEP_TREE = 'deep_tree'
+DATASET_HARDLINKS = 'hardlinks'
+DATASETS = [DATASET_SMALL_FILES, DATASET_SPARSE_FILES, DATASET_DEEP_TREE, DATASET_HARDLINKS]
+
+DEFAULT_REPEAT = 3
+# Docker volumes of the benchmark, removed when it ends
+_DOCKER_VOLUME_PREFIX = 'aki_benchmark_'
+_DOCKER_ENGINES = {COPY_ENGINE_CONTAINER, COPY_ENGINE_DOCKER}
+
+
+def generate_dataset(name: str, path: Path, scale: float):
+    """
+    Write the files of a dataset in path, scale multiplies the number of files and their size
+    """
+    path.mkdir(parents=True)
+    if name == DATASET_SMALL_FILES:
+        # Source trees, node_modules: the cost is by file, not by byte
+        for index in range(max(1, int(20000 * scale))):
+            folder = path / f'folder_{index // 100:04d}'
+            folder.mkdir(exist_ok=True)
+            (folder / f'file_{index:06d}').write_bytes(os.urandom(1024 * (1 + index % 8)))
+    elif name == DATASET_SPARSE_FILES:
+        # Database files: huge apparent size, a few data segments
+        apparent_size = max(1024 * 1024 * 1024 * scale, 16 * 1024 * 1024)
+        for index in range(4):
+            with open(path / f'sparse_{index}', 'wb') as file:
+                for segment in range(8):
+                    file.seek(int(apparent_size * segment / 8))
+                    file.write(os.urandom(1024 * 1024))
+                file.truncate(int(apparent_size))
+    elif name == DATASET_DEEP_TREE:
+        folder = path
+        for _ in range(max(1, int(128 * scale))):
+            folder = folder / 'd'
+            folder.mkdir()
+            for index in range(4):
+                (folder / f'file_{index}').write_bytes(os.urandom(16 * 1024))
+    elif name == DATASET_HARDLINKS:
+        (path / 'files').mkdir()
+        (path / 'links').mkdir()
+        for index in range(max(1, int(1000 * scale))):
+            file = path / 'files' / f'file_{index:05d}'
+            file.write_bytes(os.urandom(64 * 1024))
+            for link in range(3):
+                os.link(file, path / 'links' / f'file_{index:05d}_{link}')
+    else:
+        raise ValueError(f'unknown dataset {name}')
+
+
+def run_trial(operation: str, engine: str, source: str, destination: str, workers: Union[int, None] = None):
+    """
+    Copy source to destination or remove source with the engine, as aki does. Docker volumes are given by name.
+    workers is the aki.io.workers of aki engines
+    """
+    io_policy = IoPolicy(workers=workers)
+    if operation == 'copy':
+        if engine in [COPY_ENGINE_NATIVE, COPY_ENGINE_CONTAINER]:
+            aki_volume = AkiHostVolume(_docker_client(engine), 'aki_benchmark', 'AKI_BENCHMARK',
+                                       Path(destination).parent, copy_engine=engine, io_policy=io_policy)
+            aki_volume.copy(aki_volume.volume_name_to_volume(source), aki_volume.volume_name_to_volume(destination))
+        elif engine == COPY_ENGINE_DOCKER:
+            aki_volume = _docker_volume(docker.from_env(), io_policy)
+            aki_volume.copy(aki_volume.volume_name_to_volume(source), aki_volume.volume_name_to_volume(destination))
+        elif engine == COPY_ENGINE_SHUTIL:
+            shutil.copytree(source, destination, symlinks=True)
+        elif engine == COPY_ENGINE_CP:
+            subprocess.run(['cp', '-a', f'{source}/.', destination], check=True)
+        else:
+            raise ValueError(f'unknown copy engine {engine}')
+    elif operation == 'remove':
+        if engine == REMOVE_ENGINE_RMTREE:
+            shutil.rmtree(source)
+        elif engine == REMOVE_ENGINE_CONTAINER:
+            # What aki does when files written by a container cannot be removed by the user
+            docker_client = docker.from_env()
+            docker_client.containers.run(ensure_helper_image(docker_client),
+                                         command='sh -c "rm -rf -- ..?* .[!.]* *"', working_dir='/volume',
+                                         name=format_aki_container_name('rm_benchmark'),
+                                         volumes=[f'{source}:/volume'], remove=True)
+            os.rmdir(source)
+        elif engine == REMOVE_ENGINE_DOCKER:
+            aki_volume = _docker_volume(docker.from_env())
+            aki_volume.remove(aki_volume.volume_name_to_volume(source))
+        else:
+            raise ValueError(f'unknown remove engine {engine}')
+    else:
+        raise ValueError(f'unknown operation {operation}')
+
+
+class Benchmark:
+    """
+    Datasets of a work folder and the results of the engines run on them
+    """
+
+    def __init__(self, work_folder: Path, scale: float, repeat: int, drop_caches: bool,
+                 workers: Union[int, None] = None):
+        self.work_folder = work_folder
+        self.scale = scale
+        self.repeat = repeat
+        self.drop_caches = drop_caches
+        self.workers = workers
+        self.dataset_stats: Dict[str, Dict] = {}
+        self.results: List[Dict] = []
+        self.skipped: List[Dict] = []
+
+    def prepare_dataset(self, name: str) -> Path:
+        """
+        Generate the dataset unless the work folder has it at the same scale
+        """
+        path = self.work_folder / 'datasets' / name
+        description_path = self.work_folder / 'datasets' / f'{name}.json'
+        if path.is_dir() and description_path.is_file() \
+                and json.loads(description_path.read_text()).get('scale') == self.scale:
+            print_info(f'Reuse dataset {name}')
+        else:
+            print_info(f'Generate dataset {name}')
+            shutil.rmtree(path, ignore_errors=True)
+            generate_dataset(name, path, self.scale)
+            description_path.write_text(json.dumps({'scale': self.scale}))
+
+        usage = measure_tree(path)
+        self.dataset_stats[name] = {
+            'size': usage.size,
+            'files': usage.files,
+            'apparent_size': sum(file.lstat().st_size for file in path.rglob('*') if file.is_file()),
+        }
+        print_info(f'Dataset {name} - {format_size(usage.size)} - {usage.files} files')
+        return path
+
+    def run_copies(self, dataset: str, source: Path, engine: str):
+        docker_source = f'{_DOCKER_VOLUME_PREFIX}{dataset}'
+        docker_destination = f'{docker_source}_copy'
+        destination = self.work_folder / 'copies' / dataset
+
+        def prepare():
+            self._remove_copy(engine, destination, docker_destination)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            if engine == COPY_ENGINE_CP:
+                destination.mkdir()
+
+        if engine == COPY_ENGINE_DOCKER:
+            _load_docker_volume(source, docker_source)
+            trial_source, trial_destination = docker_source, docker_destination
+        else:
+            trial_source, trial_destination = str(source), str(destination)
+
+        def validate() -> Union[bool, None]:
+            if engine == COPY_ENGINE_DOCKER:
+                return None
+            return measure_tree(destination).files == self.dataset_stats[dataset]['files']
+
+        try:
+            self._run('copy', engine, dataset, trial_source, trial_destination, prepare, validate)
+        finally:
+            self._remove_copy(engine, destination, docker_destination)
+
+    def run_removals(self, dataset: str, source: Path, engine: str):
+        docker_copy = f'{_DOCKER_VOLUME_PREFIX}{dataset}_copy'
+        copy = self.work_folder / 'copies' / dataset
+
+        def prepare():
+            # The copy to remove is done by the fastest engine of its kind
+            if engine == REMOVE_ENGINE_DOCKER:
+                _load_docker_volume(source, docker_copy)
+            else:
+                shutil.rmtree(copy, ignore_errors=True)
+                copy.parent.mkdir(parents=True, exist_ok=True)
+                copy_tree(source, copy)
+
+        def validate() -> Union[bool, None]:
+            return None if engine == REMOVE_ENGINE_DOCKER else not copy.exists()
+
+        self._run('remove', engine, dataset, docker_copy if engine == REMOVE_ENGINE_DOCKER else str(copy), '',
+                  prepare, validate)
+
+    def to_dict(self) -> Dict:
+        return {
+            'aki_version': __version__,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'platform': {
+                'system': platform.system(),
+                'release': platform.release(),
+                'machine': platform.machine(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+            },
+            'work_folder': str(self.work_folder),
+            'file_system': _find_file_system(self.work_folder),
+            'scale': self.scale,
+            'repeat': self.repeat,
+            'drop_caches': self.drop_caches,
+            'workers': self.workers,
+            'datasets': self.dataset_stats,
+            'results': self.results,
+            'skipped': self.skipped,
+        }
+
+    def _run(self, operation: str, engine: str, dataset: str, source: str, destination: str,
+             prepare: Callable[[], None], validate: Callable[[], Union[bool, None]]):
+        runs = []
+        for _ in range(self.repeat):
+            prepare()
+            if self.drop_caches:
+                _drop_caches()
+
+            run = _run_child_trial(operation, engine, source, destination, self.work_folder, self.workers)
+            run['is_valid'] = validate() if run['is_success'] else False
+            stats = self.dataset_stats[dataset]
+            duration = run['duration']
+            run['mb_per_second'] = stats['size'] / 1024 / 1024 / duration if duration else None
+            run['files_per_second'] = stats['files'] / duration if duration else None
+            runs.append(run)
+
+            if not run['is_success']:
+                print_error(f'{operation} {engine} {dataset} failed : {run["error"]}')
+                break
+            print_info(f'{operation} {engine} {dataset} - {duration:.2f}s - {run["mb_per_second"]:.1f} MB/s - '
+                       f'{run["files_per_second"]:.0f} files/s - {format_size(run["peak_memory"])} peak memory')
+
+        successful_runs = [run for run in runs if run['is_success']]
+        self.results.append({
+            'operation': operation,
+            'engine': engine,
+            'dataset': dataset,
+            # Memory and cpu of the container are not seen by the client
+            'in_container': engine in _DOCKER_ENGINES,
+            'runs': runs,
+            'median': {
+                key: statistics.median(run[key] for run in successful_runs)
+                for key in ['duration', 'mb_per_second', 'files_per_second', 'peak_memory', 'cpu_percent']
+            } if successful_runs else None,
+        })
+
+    @staticmethod
+    def _remove_copy(engine: str, destination: Path, docker_destination: str):
+        if engine == COPY_ENGINE_DOCKER:
+            _remove_docker_volume(docker_destination)
+        elif destination.exists():
+            # Files copied by a container may belong to root, aki removes them with a container
+            host_volume = AkiHostVolume(_docker_client(engine), 'aki_benchmark', 'AKI_BENCHMARK', destination.parent)
+            with redirect_output(io.StringIO()):
+                host_volume.remove(host_volume.volume_name_to_volume(str(destination)))
+
+
+def _run_child_trial(operation: str, engine: str, source: str, destination: str, work_folder: Path,
+                     workers: Union[int, None] = None) -> Dict:
+    """
+    Run a trial in a child process, wait4 gives the memory and cpu used by the child and by its own children
+    """
+    with tempfile.TemporaryDirectory(dir=work_folder) as trial_folder:
+        result_path = Path(trial_folder) / 'result.json'
+        log_path = Path(trial_folder) / 'trial.log'
+        cmd = [sys.executable, '-m', 'benchmarks.copy_engines', 'trial', operation, engine, source, destination,
+               str(result_path)]
+        if workers:
+            cmd += ['--workers', str(workers)]
+        with open(log_path, 'w') as log:
+            start = time.monotonic()
+            process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=Path(__file__).parent.parent)
+            _, status, rusage = os.wait4(process.pid, 0)
+            duration = time.monotonic() - start
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+
+        # Duration and cpu measured by the child exclude the start of python, peak memory includes it
+        cpu_user, cpu_system = rusage.ru_utime, rusage.ru_stime
+        if result_path.is_file():
+            child_result = json.loads(result_path.read_text())
+            duration, cpu_user, cpu_system = child_result['duration'], child_result['cpu_user'], \
+                child_result['cpu_system']
+
+        # ru_maxrss is in kilobytes on linux, in bytes on macOS
+        peak_memory = rusage.ru_maxrss * 1024 if platform_info.is_linux() else rusage.ru_maxrss
+        return {
+            'is_success': process.returncode == 0,
+            'error': None if process.returncode == 0 else log_path.read_text().strip()[-2000:],
+            'duration': duration,
+            'peak_memory': peak_memory,
+            'cpu_user': cpu_user,
+            'cpu_system': cpu_system,
+            'cpu_percent': (cpu_user + cpu_system) * 100 / duration if duration else None,
+        }
+
+
+def _docker_client(engine: str):
+    return docker.from_env() if engine in _DOCKER_ENGINES else None
+
+
+def _docker_volume(docker_client, io_policy: IoPolicy = IoPolicy()) -> AkiDockerVolume:
+    return AkiDockerVolume(docker_client, 'aki_benchmark', 'AKI_BENCHMARK', _DOCKER_VOLUME_PREFIX, io_policy=io_policy)
+
+
+def _load_docker_volume(source: Path, name: str):
+    """
+    Create a docker volume with the files of the dataset
+    """
+    _remove_docker_volume(name)
+    docker_client = docker.from_env()
+    docker_client.containers.run(ensure_helper_image(docker_client), command='cp -a /source/. /destination',
+                                 name=format_aki_container_name('load_benchmark'),
+                                 volumes=[f'{source}:/source:ro', f'{name}:/destination'], remove=True)
+
+
+def _remove_docker_volume(name: str):
+    try:
+        docker.from_env().volumes.get(name).remove()
+    except DockerException:
+        pass
+
+
+def _is_docker_available() -> bool:
+    try:
+        return docker.from_env().ping()
+    except DockerException:
+        return False
+
+
+def _drop_caches():
+    """
+    Empty the page cache so that sources are read from the disk, root on linux only
+    """
+    os.sync()
+    try:
+        Path('/proc/sys/vm/drop_caches').write_text('3\n')
+    except OSError as e:
+        print_error(f'Cannot drop caches ({e}), run as root on linux or without --drop-caches')
+        sys.exit(1)
+
+
+def _find_file_system(path: Path) -> Union[str, None]:
+    """
+    Type of the file system of path, from the longest mount point containing it. Linux only
+    """
+    try:
+        mounts = Path('/proc/mounts').read_text().splitlines()
+    except OSError:
+        return None
+
+    resolved_path = str(path.resolve())
+    best_mount_point, best_type = '', None
+    for mount in mounts:
+        fields = mount.split()
+        if len(fields) < 3:
+            continue
+        mount_point, file_system_type = fields[1], fields[2]
+        if (resolved_path == mount_point or resolved_path.startswith(mount_point.rstrip('/') + '/')) \
+                and len(mount_point) > len(best_mount_point):
+            best_mount_point, best_type = mount_point, file_system_type
+
+    return best_type
+
+
+def _comma_list(choices: List[str]):
+    def parse(value: str) -> List[str]:
+        values = [item for item in value.split(',') if item]
+        for item in values:
+            if item not in choices:
+                raise argparse.ArgumentTypeError(f'{item} is not one of {", ".join(choices)}')
+        return values
+
+    return parse
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.copy_engines',
+                                     description='Measure copy and remove engines of aki on synthetic datasets')
+    parser.add_argument('--work-folder', type=Path, default=Path(tempfile.gettempdir()) / 'aki-benchmark',
+                        help='folder of datasets and copies, on the file system to measure')
+    parser.add_argument('--output', '-o', type=Path, default=Path('copy_engines.json'), help='json result file')
+    parser.add_argument('--copy-engines', type=_comma_list(COPY_ENGINES), default=COPY_ENGINES,
+                        help=f'comma separated copy engines, default {",".join(COPY_ENGINES)}')
+    parser.add_argument('--remove-engines', type=_comma_list(REMOVE_ENGINES), default=REMOVE_ENGINES,
+                        help=f'comma separated remove engines, default {",".join(REMOVE_ENGINES)}')
+    parser.add_argument('--datasets', type=_comma_list(DATASETS), default=DATASETS,
+                        help=f'comma separated datasets, default {",".join(DATASETS)}')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='runs by engine and dataset')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply the number of files and sizes of datasets, 0.1 for a quick run')
+    parser.add_argument('--drop-caches', action='store_true',
+                        help='empty the page cache before each run, root on linux only')
+    parser.add_argument('--keep', action='store_true', help='keep datasets in the work folder for the next run')
+    parser.add_argument('--workers', type=int,
+                        help='files copied at the same time by aki engines, as aki.io.workers, default of each engine')
+    subparsers = parser.add_subparsers(dest='command')
+    # Run by the benchmark in a child process
+    trial_parser = subparsers.add_parser('trial')
+    trial_parser.add_argument('operation')
+    trial_parser.add_argument('engine')
+    trial_parser.add_argument('source')
+    trial_parser.add_argument('destination')
+    trial_parser.add_argument('result')
+    trial_parser.add_argument('--workers', type=int)
+
+    return parser
+
+
+def main() -> int:
+    arguments = _create_parser().parse_args()
+
+    if arguments.command == 'trial':
+        with redirect_output(sys.stderr):
+            start, start_times = time.monotonic(), os.times()
+            run_trial(arguments.operation, arguments.engine, arguments.source, arguments.destination,
+                      arguments.workers)
+            end, end_times = time.monotonic(), os.times()
+        # Times of children include cp and rm run by the trial
+        Path(arguments.result).write_text(json.dumps({
+            'duration': end - start,
+            'cpu_user': end_times.user - start_times.user + end_times.children_user - start_times.children_user,
+            'cpu_system': end_times.system - start_times.system + end_times.children_system
+            - start_times.children_system,
+        }))
+        return 0
+
+    if arguments.repeat < 1:
+        print_error(f'Option --repeat is {arguments.repeat} but must be at least 1')
+        return 1
+    if arguments.workers is not None and arguments.workers < 1:
+        print_error(f'Option --workers is {arguments.workers} but must be at least 1')
+        return 1
+
+    work_folder: Path = arguments.work_folder.resolve()
+    work_folder.mkdir(parents=True, exist_ok=True)
+    benchmark = Benchmark(work_folder, arguments.scale, arguments.repeat, arguments.drop_caches, arguments.workers)
+
+    is_docker_available = _is_docker_available()
+    copy_engines = []
+    for engine in arguments.copy_engines:
+        if engine in _DOCKER_ENGINES and not is_docker_available:
+            benchmark.skipped.append({'operation': 'copy', 'engine': engine, 'reason': 'docker is not available'})
+        elif engine == COPY_ENGINE_CP and not shutil.which('cp'):
+            benchmark.skipped.append({'operation': 'copy', 'engine': engine, 'reason': 'cp is not available'})
+        else:
+            copy_engines.append(engine)
+    remove_engines = []
+    for engine in arguments.remove_engines:
+        if engine in _DOCKER_ENGINES and not is_docker_available:
+            benchmark.skipped.append({'operation': 'remove', 'engine': engine, 'reason': 'docker is not available'})
+        else:
+            remove_engines.append(engine)
+
+    try:
+        for dataset in arguments.datasets:
+            source = benchmark.prepare_dataset(dataset)
+            for engine in copy_engines:
+                benchmark.run_copies(dataset, source, engine)
+            for engine in remove_engines:
+                benchmark.run_removals(dataset, source, engine)
+            _remove_docker_volume(f'{_DOCKER_VOLUME_PREFIX}{dataset}')
+    finally:
+        arguments.output.write_text(json.dumps(benchmark.to_dict(), indent=2))
+        print_info(f'Results written to {arguments.output}')
+        if not arguments.keep:
+            shutil.rmtree(work_folder / 'datasets', ignore_errors=True)
+            shutil.rmtree(work_folder / 'copies', ignore_errors=True)
+
+    return 1 if any(not run['is_success'] for result in benchmark.results for run in result['runs']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -87,7 +87,7 @@ def test_bad_args():
     _assert_process_code(exit_code, 2)
 
     assert out.startswith('usage: aki [-h]')
-    assert "aki: error: argument action: invalid choice: 'foo' (choose from 'ls', 'use', 'cp', 'rm', 'version')" in out
+    assert "aki: error: argument action: invalid choice: 'foo' (choose from 'ls', 'use', 'cp', 'rm', 'gc', 'flatten', 'watch', 'batch', 'completion', 'version')" in out
 
 
 def test_ls():
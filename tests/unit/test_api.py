@@ -0,0 +1,190 @@
+import io
+import json
+import shutil
+from collections import namedtuple
+from dataclasses import replace
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+from docker.errors import NotFound
+
+from aki import cli
+from aki._completion import CompletionCache
+from aki._config import Config
+from aki._gc import GcPolicy
+from aki.api import Session
+from aki.error import ScriptError
+from aki.volume import AkiHostVolume, Volume
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+def _create_session(tmp_path: Path) -> Session:
+    docker_client = MagicMock()
+    docker_client.containers.get.side_effect = NotFound('container')
+    parent_folder = tmp_path / 'volumes'
+    for name in ['dev', 'feature']:
+        (parent_folder / name).mkdir(parents=True)
+        (parent_folder / name / 'data').write_text(name)
+    env_path = tmp_path / '.env'
+    env_path.write_text('AKI_HOST=dev\n')
+
+    aki_volume = AkiHostVolume(docker_client, 'container', 'AKI_HOST', parent_folder)
+    config = Config(docker_client, tmp_path, {'host': aki_volume}, [tmp_path / 'docker-compose.yaml'], env_path, '2',
+                    lambda *args: None, tmp_path / 'aki.yaml', trash_enabled=False, state_path=tmp_path / '.aki')
+    return Session(config=config)
+
+
+def test_list_volumes(tmp_path: Path):
+    with _create_session(tmp_path) as session:
+        rows = session.list_volumes()
+        matched_rows = session.list_volumes('feat')
+
+    assert [row.aki_name for row in rows] == ['dev', 'feature']
+    assert rows[0].current_types == ['host']
+    assert [row.aki_name for row in matched_rows] == ['feature']
+    assert CompletionCache(tmp_path / '.aki').fetch_names() == ['dev', 'feature']
+
+
+def test_copy(tmp_path: Path):
+    progresses = []
+    with _create_session(tmp_path) as session:
+        result = session.copy('dev', 'copy', restart_containers=False, progress=progresses.append)
+
+    assert result.copied_types == ['host']
+    assert (tmp_path / 'volumes' / 'copy' / 'data').read_text() == 'dev'
+    assert progresses[-1].label == 'host'
+    assert CompletionCache(tmp_path / '.aki').fetch_names() == ['copy', 'dev', 'feature']
+
+
+def test_copy_live(tmp_path: Path):
+    with _create_session(tmp_path) as session:
+        result = session.copy('dev', 'copy', restart_containers=False, live=True, freeze='pause')
+
+    assert result.copied_types == ['host']
+    assert (tmp_path / 'volumes' / 'copy' / 'data').read_text() == 'dev'
+    assert not (tmp_path / '.aki' / 'journal' / 'host' / 'copy.journal').exists()
+
+
+def test_copy_live_freeze_together(tmp_path: Path, monkeypatch):
+    session = _create_session(tmp_path)
+    other_folder = tmp_path / 'other_volumes'
+    (other_folder / 'dev').mkdir(parents=True)
+    other_volume = AkiHostVolume(session.config.docker_client, 'other_container', 'AKI_OTHER', other_folder)
+    session.config = replace(session.config, aki_volumes={**session.config.aki_volumes, 'other': other_volume})
+    (tmp_path / '.env').write_text('AKI_HOST=dev\nAKI_OTHER=dev\n')
+    events = []
+    copy, sync = AkiHostVolume.copy, AkiHostVolume.sync
+
+    def record_copy(aki_volume, *args, **kwargs):
+        events.append(f'copy {aki_volume.container_name}')
+        copy(aki_volume, *args, **kwargs)
+
+    def record_sync(aki_volume, *args, **kwargs):
+        events.append(f'sync {aki_volume.container_name}')
+        sync(aki_volume, *args, **kwargs)
+
+    monkeypatch.setattr(AkiHostVolume, 'copy', record_copy)
+    monkeypatch.setattr(AkiHostVolume, 'sync', record_sync)
+    with session:
+        result = session.copy('dev', 'copy', restart_containers=False, live=True)
+
+    # No container is frozen while another type is copied
+    assert events == ['copy container', 'copy other_container', 'sync container', 'sync other_container']
+    assert result.copied_types == ['host', 'other']
+    assert (other_folder / 'copy').is_dir()
+
+
+def test_copy_free_space_shared_by_types(tmp_path: Path, monkeypatch):
+    session = _create_session(tmp_path)
+    other_folder = tmp_path / 'other_volumes'
+    (other_folder / 'dev').mkdir(parents=True)
+    (other_folder / 'dev' / 'data').write_text('dev')
+    other_volume = AkiHostVolume(session.config.docker_client, 'other_container', 'AKI_OTHER', other_folder)
+    session.config = replace(session.config, aki_volumes={**session.config.aki_volumes, 'other': other_volume})
+    size = other_volume.fetch_size(Volume(str(other_folder / 'dev'), 'dev'))
+    # Each copy fits in the free space, not both
+    monkeypatch.setattr(shutil, 'disk_usage', lambda path: DiskUsage(0, 0, size + 1))
+
+    with session:
+        with pytest.raises(ScriptError, match='for host, other, they need'):
+            session.copy('dev', 'copy', restart_containers=False)
+
+
+def test_copy_existing_destination(tmp_path: Path):
+    with _create_session(tmp_path) as session:
+        with pytest.raises(ScriptError):
+            session.copy('dev', 'feature', restart_containers=False)
+
+    assert (tmp_path / 'volumes' / 'feature' / 'data').read_text() == 'feature'
+
+
+def test_remove(tmp_path: Path):
+    with _create_session(tmp_path) as session:
+        volumes_by_type = session.remove(['feature'])
+
+    assert [volume.aki_name for volume in volumes_by_type['host']] == ['feature']
+    assert CompletionCache(tmp_path / '.aki').fetch_names() == ['dev']
+    assert not (tmp_path / 'volumes' / 'feature').exists()
+
+
+def test_evict_measure_unsized_volumes(tmp_path: Path):
+    session = _create_session(tmp_path)
+    session.config = replace(session.config, not_found_sources=['feature'])
+    (tmp_path / 'volumes' / 'old').mkdir()
+    for name in ['feature', 'old']:
+        (tmp_path / 'volumes' / name / 'data').write_bytes(b'x' * 64 * 1024)
+
+    with session, session._bind():
+        assert cli._evict_volumes(session.config.aki_volumes, GcPolicy(max_size=1024), 1, False, True)
+
+    # dev is used by the container, feature is the source of the volumes not found
+    assert sorted(path.name for path in (tmp_path / 'volumes').iterdir()) == ['dev', 'feature']
+
+
+def test_session_restores_thread_state(tmp_path: Path, capsys):
+    with _create_session(tmp_path) as session:
+        session.list_volumes()
+
+    assert cli.project.config is None
+    assert cli.project.is_interactive is True
+    assert capsys.readouterr().out == ''
+
+
+def test_watch_not_interactive_purge_trash(tmp_path: Path, monkeypatch):
+    session = _create_session(tmp_path)
+    is_interactive_by_switch = []
+    purges = []
+
+    def use_volume(aki_volume_by_type, branch):
+        is_interactive_by_switch.append(cli.project.is_interactive)
+        cli.project.is_trash_filled = True
+
+    monkeypatch.setattr(cli, 'use_volume', use_volume)
+    monkeypatch.setattr(cli, '_purge_trash_in_background', lambda: purges.append(cli.project.config.aki_file))
+    monkeypatch.setattr(cli, 'find_git_head', lambda folder: folder / '.git' / 'HEAD')
+    monkeypatch.setattr(cli, 'watch_branch', lambda head_path, switch, debounce: [switch('feature'), switch('dev')])
+
+    with session, session._bind():
+        cli.project.is_interactive = True
+        cli.watch_volumes(session.config.aki_volumes, debounce=0)
+        assert cli.project.is_interactive
+
+    # Nobody answers a question while watch runs, the trash is purged without waiting for its end
+    assert is_interactive_by_switch == [False, False]
+    assert purges == [tmp_path / 'aki.yaml'] * 2
+
+
+def test_print_volumes_streaming_without_catalog(tmp_path: Path, monkeypatch):
+    session = _create_session(tmp_path)
+    session._output = io.StringIO()
+
+    def catalog(volume_types):
+        raise AssertionError('streaming formats merge the sorted volumes of each type')
+
+    monkeypatch.setattr(cli, 'VolumeCatalog', catalog)
+    with session, session._bind():
+        cli.print_volumes(session.config.aki_volumes, None, ls_format='ndjson')
+
+    assert [json.loads(line)['name'] for line in session._output.getvalue().splitlines()] == ['dev', 'feature']
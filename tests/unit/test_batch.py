@@ -0,0 +1,83 @@
+import argparse
+
+import pytest
+
+from aki._batch import VolumeListCache, plan_stages, read_operations
+from aki.error import ScriptError
+from aki.volume import Volume
+
+
+def _parse(tokens):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file')
+    parser.add_argument('--workspace')
+    action_parser = parser.add_subparsers(dest='action')
+    copy_parser = action_parser.add_parser('cp')
+    copy_parser.add_argument('source')
+    copy_parser.add_argument('destination')
+    copy_parser.add_argument('--switch-to-copy', action='store_true')
+    copy_parser.add_argument('--no-switch-to-copy', action='store_true')
+    remove_parser = action_parser.add_parser('rm')
+    remove_parser.add_argument('names', nargs='+')
+    action_parser.add_parser('watch')
+    return parser.parse_args(tokens)
+
+
+def _stage_lines(stages):
+    return [[operation.line_number for operation in stage] for stage in stages]
+
+
+def test_read_operations():
+    operations = read_operations(['# provisioning', '', 'cp dev pr-1  # first', "rm 'old one'"], _parse)
+
+    assert [operation.line_number for operation in operations] == [3, 4]
+    assert operations[0].arguments.source == 'dev'
+    assert operations[0].arguments.no_switch_to_copy is True
+    assert operations[1].arguments.names == ['old one']
+    assert str(operations[0]) == '[3] cp dev pr-1  # first'
+
+
+def test_read_operations_forbidden_action():
+    with pytest.raises(ScriptError) as e:
+        read_operations(['cp dev pr-1', 'watch'], _parse)
+
+    assert 'Line 2' in str(e.value)
+
+
+def test_read_operations_invalid_quote():
+    with pytest.raises(ScriptError) as e:
+        read_operations(["rm 'old"], _parse)
+
+    assert 'Line 1' in str(e.value)
+
+
+def test_plan_stages_parallel_copies():
+    operations = read_operations(['cp dev pr-1', 'cp dev pr-2', 'cp pr-1 pr-3', 'rm pr-1', 'cp dev pr-4'], _parse)
+
+    assert _stage_lines(plan_stages(operations)) == [[1, 2], [3], [4], [5]]
+
+
+def test_plan_stages_same_destination():
+    operations = read_operations(['cp dev pr-1', 'cp test pr-1', 'cp pr-2 test', 'cp pr-5 pr-6'], _parse)
+
+    assert _stage_lines(plan_stages(operations)) == [[1], [2], [3, 4]]
+
+
+def test_plan_stages_switch_and_current():
+    operations = read_operations(['cp dev pr-1', 'cp dev pr-2 --switch-to-copy', 'cp _current pr-3', 'cp dev pr-4'],
+                                 _parse)
+
+    assert _stage_lines(plan_stages(operations)) == [[1], [2], [3], [4]]
+
+
+def test_volume_list_cache():
+    cache = VolumeListCache()
+    assert cache.fetch_volumes('mongo') is None
+
+    cache.set_volumes('mongo', [Volume('/mongo/dev', 'dev')])
+    cache.add('mongo', Volume('/mongo/pr-1', 'pr-1'))
+    cache.remove('mongo', Volume('/mongo/dev', 'dev'))
+    cache.add('postgres', Volume('pg_pr-1', 'pr-1'))
+
+    assert cache.fetch_volumes('mongo') == [Volume('/mongo/pr-1', 'pr-1')]
+    assert cache.fetch_volumes('postgres') is None
@@ -0,0 +1,50 @@
+from aki._catalog import VolumeCatalog
+from aki.volume import Volume
+
+
+def _catalog() -> VolumeCatalog:
+    catalog = VolumeCatalog(['host', 'docker'])
+    catalog.add_all('host', [Volume('/data/test', 'test'), Volume('/data/Dev', 'Dev')])
+    catalog.add_all('docker', [Volume('d_test', 'test'), Volume('d_alpha', 'alpha'), Volume('d_dev', 'dev')])
+    return catalog
+
+
+def test_catalog_volume():
+    catalog = _catalog()
+
+    assert len(catalog) == 4
+    assert 'test' in catalog
+    assert catalog.volume('test', 'host') == Volume('/data/test', 'test')
+    assert catalog.volume('alpha', 'host') is None
+    assert catalog.volume('unknown', 'docker') is None
+
+
+def test_catalog_missing_types():
+    catalog = _catalog()
+
+    assert catalog.missing_types('test') == []
+    assert catalog.missing_types('alpha') == ['host']
+    assert catalog.missing_types('unknown') == ['host', 'docker']
+
+
+def test_catalog_presence():
+    catalog = _catalog()
+
+    assert catalog.entry('test').presence == catalog.type_presence(['host', 'docker'])
+    assert catalog.entry('Dev').presence == catalog.type_presence(['host'])
+
+
+def test_catalog_sorted_entries():
+    catalog = _catalog()
+
+    assert [entry.aki_name for entry in catalog.sorted_entries()] == ['alpha', 'Dev', 'dev', 'test']
+
+
+def test_catalog_volumes_by_type():
+    catalog = _catalog()
+    catalog.add('docker', Volume('d_test', 'test'))
+
+    assert catalog.volumes_by_type() == {
+        'host': [Volume('/data/test', 'test'), Volume('/data/Dev', 'Dev')],
+        'docker': [Volume('d_test', 'test'), Volume('d_alpha', 'alpha'), Volume('d_dev', 'dev')],
+    }
@@ -0,0 +1,131 @@
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from aki import _completion as completion
+from aki import _config as config_loader
+from aki import cli
+from aki._completion import CompletionCache, complete
+
+
+@pytest.fixture
+def refreshes(monkeypatch) -> List[Path]:
+    aki_files = []
+    monkeypatch.setattr(completion, '_refresh_in_background', lambda cache, aki_file: aki_files.append(aki_file))
+    return aki_files
+
+
+@pytest.fixture
+def project_folder(tmp_path: Path, refreshes) -> Path:
+    (tmp_path / 'aki.yaml').write_text('aki: {}\n')
+    CompletionCache(tmp_path / '.aki').set_names({'mongo': ['dev', 'feature', 'test'], 'postgres': ['dev', 'pg_only']})
+    return tmp_path
+
+
+def test_cache_names(tmp_path: Path):
+    cache = CompletionCache(tmp_path)
+    assert cache.fetch_names() is None
+
+    cache.set_names({'mongo': ['dev', 'test'], 'postgres': ['dev']})
+    cache.add('mongo', 'feature')
+    cache.remove('postgres', 'dev')
+    cache.add('unknown', 'name')
+
+    assert cache.fetch_names() == ['dev', 'feature', 'test']
+    assert cache.fetch_names(['postgres']) == []
+    assert not cache.is_expired()
+
+
+def test_cache_expired(tmp_path: Path):
+    cache = CompletionCache(tmp_path, ttl=60)
+    cache.set_names({'mongo': ['dev'], 'postgres': ['dev']})
+    content = json.loads(cache.path.read_text())
+    content['updated_at']['mongo'] = time.time() - 120
+    cache.path.write_text(json.dumps(content))
+
+    assert cache.is_expired()
+    assert cache.is_expired(['mongo'])
+    assert not cache.is_expired(['postgres'])
+    assert cache.is_expired(['unknown'])
+    assert CompletionCache(tmp_path, ttl=3600).is_expired()
+    assert cache.fetch_names() == ['dev']
+
+    # Listing a type does not make names of the others fresh
+    cache.set_names({'postgres': ['dev']})
+    assert cache.is_expired(['mongo'])
+    cache.set_names({'mongo': ['dev']})
+    assert not cache.is_expired()
+
+
+def test_cache_expired_global_date(tmp_path: Path):
+    cache = CompletionCache(tmp_path)
+    cache.path.write_text(json.dumps({'updated_at': time.time(), 'ttl': 3600, 'names': {'mongo': ['dev']}}))
+
+    assert cache.is_expired()
+    assert cache.fetch_names() == ['dev']
+
+
+def test_complete_actions(project_folder: Path):
+    assert complete(['aki', ''], project_folder) == completion.ACTIONS
+    assert complete(['aki', '--volume', 'mongo', 'u'], project_folder) == ['use']
+
+
+def test_complete_names(project_folder: Path, refreshes: List[Path]):
+    assert complete(['aki', 'use', ''], project_folder) == ['dev', 'feature', 'pg_only', 'test']
+    assert complete(['aki', 'use', 'dev', ''], project_folder) == []
+    assert complete(['aki', 'cp', '_'], project_folder) == ['_current']
+    assert complete(['aki', 'cp', 'dev', ''], project_folder) == ['feature', 'pg_only', 'test']
+    assert complete(['aki', 'rm', '-f', 'dev', 'test', ''], project_folder) == ['feature', 'pg_only']
+    assert complete(['aki', '-v', 'postgres', 'rm', ''], project_folder) == ['dev', 'pg_only']
+    assert complete(['aki', '--volume=mongo', 'use', 'f'], project_folder) == ['feature']
+    assert refreshes == []
+
+
+def test_complete_nothing(project_folder: Path):
+    assert complete(['aki', 'ls', ''], project_folder) == []
+    assert complete(['aki', 'cp', '--freeze', ''], project_folder) == []
+    assert complete(['aki', 'use', '--'], project_folder) == []
+    assert complete(['aki', '--file', 'other.yaml', 'use', ''], project_folder) == []
+
+
+def test_complete_other_file(project_folder: Path):
+    other_folder = project_folder / 'other'
+    (other_folder / '.aki').mkdir(parents=True)
+    (other_folder / 'aki.yml').write_text('aki: {}\n')
+    CompletionCache(other_folder / '.aki').set_names({'mongo': ['other']})
+
+    assert complete(['aki', '-f', 'other/aki.yml', 'use', ''], project_folder) == ['other']
+
+
+def test_complete_refresh_missing_cache(project_folder: Path, refreshes: List[Path]):
+    (project_folder / '.aki' / completion.COMPLETION_FILE_NAME).unlink()
+
+    assert complete(['aki', 'use', ''], project_folder) == []
+    assert refreshes == [project_folder / 'aki.yaml']
+
+
+def test_options_with_value():
+    parser = cli._create_parser()
+    action_parsers = next(action for action in parser._actions if isinstance(action, argparse._SubParsersAction))
+
+    def options_with_value(option_parser: argparse.ArgumentParser):
+        return {option for action in option_parser._actions if action.option_strings and action.nargs != 0
+                for option in action.option_strings}
+
+    assert options_with_value(parser) == completion.GLOBAL_OPTIONS_WITH_VALUE
+    assert set().union(*[options_with_value(action_parser) for action_parser in action_parsers.choices.values()]) == \
+        completion.ACTION_OPTIONS_WITH_VALUE
+    assert list(action_parsers.choices) == completion.ACTIONS
+
+
+def test_completion_script():
+    for shell in completion.COMPLETION_SHELLS:
+        assert 'aki-complete' in completion.completion_script(shell)
+
+
+def test_state_folder_name():
+    assert completion._STATE_FOLDER_NAME == config_loader.STATE_FOLDER_NAME
@@ -0,0 +1,140 @@
+import json
+import subprocess
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from aki import _compose as compose
+from aki._compose import ComposeModel, UnsupportedServiceError, format_placeholder, parse_go_duration
+
+VARIABLE = 'AKI_PG'
+
+MODEL = {
+    'name': 'sample',
+    'networks': {'default': {'name': 'sample_default'}, 'back': {'name': 'sample_back'}},
+    'services': {
+        'postgres': {
+            'image': 'postgres',
+            'container_name': 'sample_postgres',
+            'command': None,
+            'environment': {'POSTGRES_PASSWORD': 'secret', 'UNSET': None},
+            'ports': [{'mode': 'ingress', 'target': 5432, 'published': '5432', 'protocol': 'tcp'}],
+            'volumes': [{'type': 'volume', 'source': 'db', 'target': '/var/lib/postgresql/data', 'volume': {}}],
+            'networks': {'default': None, 'back': {'aliases': ['database']}},
+            'restart': 'on-failure:3',
+            'healthcheck': {'test': ['CMD-SHELL', 'pg_isready'], 'interval': '1m30s', 'retries': 5},
+            'depends_on': {'cache': {'condition': 'service_started'}},
+        },
+        'cache': {'image': 'redis', 'build': {'context': '.'}},
+    },
+    'volumes': {'db': {'name': f'sample_postgres_{format_placeholder(VARIABLE)}'}},
+}
+
+
+def test_container_spec():
+    model = ComposeModel(MODEL, [VARIABLE])
+
+    spec = model.container_spec('postgres', {VARIABLE: 'dev'})
+
+    assert spec.options['image'] == 'postgres'
+    assert spec.options['name'] == 'sample_postgres'
+    assert 'command' not in spec.options
+    assert spec.options['environment'] == {'POSTGRES_PASSWORD': 'secret'}
+    assert spec.options['ports'] == {'5432/tcp': 5432}
+    assert spec.options['mounts'][0]['Source'] == 'sample_postgres_dev'
+    assert spec.options['mounts'][0]['Target'] == '/var/lib/postgresql/data'
+    assert spec.options['restart_policy'] == {'Name': 'on-failure', 'MaximumRetryCount': 3}
+    assert spec.options['healthcheck'] == {'test': ['CMD-SHELL', 'pg_isready'], 'interval': 90_000_000_000,
+                                           'retries': 5}
+    assert spec.networks == [('sample_default', ['postgres', 'sample_postgres']),
+                             ('sample_back', ['postgres', 'sample_postgres', 'database'])]
+
+
+def test_container_spec_unsupported():
+    model = ComposeModel(MODEL, [VARIABLE])
+
+    with pytest.raises(UnsupportedServiceError):
+        model.container_spec('cache', {VARIABLE: 'dev'})
+
+
+def test_find_service():
+    model = ComposeModel(MODEL, [VARIABLE])
+
+    assert model.find_service('sample_postgres') == 'postgres'
+    assert model.find_service('other') is None
+
+
+def test_render_longest_variable_first():
+    model = ComposeModel({}, ['AKI_PG', 'AKI_PG_2'])
+
+    value = model.render(f'{format_placeholder("AKI_PG")}/{format_placeholder("AKI_PG_2")}',
+                         {'AKI_PG': 'a', 'AKI_PG_2': 'b'})
+
+    assert value == 'a/b'
+
+
+def test_parse_go_duration():
+    assert parse_go_duration('30s') == 30_000_000_000
+    assert parse_go_duration('1h2m') == 3_720_000_000_000
+    assert parse_go_duration('500ms') == 500_000_000
+    with pytest.raises(UnsupportedServiceError):
+        parse_go_duration('1 day')
+
+
+def _write_project(tmp_path: Path, env_content: str):
+    compose_path = tmp_path / 'docker-compose.yaml'
+    compose_path.write_text('services:\n  postgres:\n    image: postgres:${PG_VERSION}\n')
+    env_path = tmp_path / '.env'
+    env_path.write_text(env_content)
+    return compose_path, env_path
+
+
+def test_compute_cache_key(tmp_path: Path):
+    compose_path, env_path = _write_project(tmp_path, 'AKI_PG=dev\nOTHER=1\n')
+    key = compose.compute_cache_key(['docker', 'compose'], [compose_path], env_path, [VARIABLE], {})
+
+    env_path.write_text('AKI_PG=feature\nOTHER=1\n')
+    assert compose.compute_cache_key(['docker', 'compose'], [compose_path], env_path, [VARIABLE], {}) == key
+
+    env_path.write_text('AKI_PG=feature\nOTHER=2\n')
+    assert compose.compute_cache_key(['docker', 'compose'], [compose_path], env_path, [VARIABLE], {}) != key
+
+    env_path.write_text('AKI_PG=dev\nOTHER=1\n')
+    assert compose.compute_cache_key(['docker', 'compose'], [compose_path], env_path, [VARIABLE],
+                                     {'PG_VERSION': '16', 'HOME': '/root'}) != key
+    assert compose.compute_cache_key(['docker', 'compose'], [compose_path], env_path, [VARIABLE],
+                                     {'HOME': '/root'}) == key
+
+
+def test_compute_cache_key_referenced_files(tmp_path: Path):
+    compose_path, env_path = _write_project(tmp_path, '')
+    compose_path.write_text('include:\n  - other.yaml\n')
+
+    assert compose.compute_cache_key(['docker', 'compose'], [compose_path], env_path, [VARIABLE], {}) is None
+
+
+def test_fetch_compose_model_cache(tmp_path: Path, monkeypatch):
+    compose_path, env_path = _write_project(tmp_path, 'AKI_PG=dev\n')
+    run = MagicMock(return_value=subprocess.CompletedProcess([], 0, json.dumps(MODEL).encode(), b''))
+    monkeypatch.setattr(compose.subprocess, 'run', run)
+
+    model = compose.fetch_compose_model(['docker', 'compose'], [compose_path], env_path, {VARIABLE: 'dev'}, {},
+                                        tmp_path / 'cache')
+    env_path.write_text('AKI_PG=feature\n')
+    cached_model = compose.fetch_compose_model(['docker', 'compose'], [compose_path], env_path,
+                                               {VARIABLE: 'feature'}, {}, tmp_path / 'cache')
+
+    assert run.call_count == 1
+    assert run.call_args.kwargs['env'] == {VARIABLE: format_placeholder(VARIABLE)}
+    assert model.data == cached_model.data == MODEL
+
+
+def test_fetch_compose_model_error(tmp_path: Path, monkeypatch):
+    compose_path, env_path = _write_project(tmp_path, '')
+    monkeypatch.setattr(compose.subprocess, 'run',
+                        MagicMock(return_value=subprocess.CompletedProcess([], 1, b'', b'invalid')))
+
+    assert compose.fetch_compose_model(['docker', 'compose'], [compose_path], env_path, {}, {},
+                                       tmp_path / 'cache') is None
+    assert not (tmp_path / 'cache').exists()
@@ -5,6 +5,7 @@ import pytest
 
 from aki import _config as config_loader
 from aki.error import ScriptError
+from aki._io_policy import IoPolicy
 from aki.volume import AkiHostVolume, AkiDockerVolume
 
 TEST_FOLDER = Path(__file__).resolve().parent.parent
@@ -72,7 +73,29 @@ def test_get_volumes_specs_from_config_error_type():
         config_loader._get_volumes_from_config(TEST_FOLDER, config, DOCKER_CLIENT)
 
     assert str(e.value) == 'Key \'aki.volumes.volume_spec_host.type\' is \'error\' but possible ' \
-                           'values are \'host\' or \'docker\''
+                           'values are \'host\', \'docker\' or \'overlay\''
+
+
+def test_get_volumes_specs_from_config_copy_engine():
+    config = {'aki': {'volumes': {'volume_spec_host': {
+        'type': 'host',
+        'env': 'ENV',
+        'container_name': 'name',
+        'folder': str(TEST_FOLDER / 'volume_spec_host'),
+    }}}}
+    volume_spec_host = config_loader._get_volumes_from_config(TEST_FOLDER, config, DOCKER_CLIENT)['volume_spec_host']
+    assert volume_spec_host.copy_engine == 'auto'
+
+    config['aki']['volumes']['volume_spec_host']['copy_engine'] = 'native'
+    volume_spec_host = config_loader._get_volumes_from_config(TEST_FOLDER, config, DOCKER_CLIENT)['volume_spec_host']
+    assert volume_spec_host.copy_engine == 'native'
+
+    config['aki']['volumes']['volume_spec_host']['copy_engine'] = 'rsync'
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_volumes_from_config(TEST_FOLDER, config, DOCKER_CLIENT)
+
+    assert str(e.value) == 'Key \'aki.volumes.copy_engine\' is \'rsync\' but possible values are \'auto\', ' \
+                           '\'native\' or \'container\''
 
 
 @patch('pathlib.Path.exists', MagicMock(return_value=False))
@@ -199,6 +222,16 @@ def test_create_use_not_found_action_fn_from_config_copy():
     assert copy.switch_to_copy is True
 
 
+def test_get_not_found_sources_from_config():
+    config = {'aki': {'use': {'not_found': [
+        {'volume_name': '^dev-', 'actions': [{'action': 'copy', 'source': 'dev'}]},
+        {'actions': [{'action': 'use', 'volume': 'main'}, {'action': 'copy', 'source': 'main'}]},
+        {'actions': [{'action': 'copy', 'source': 'dev'}]},
+    ]}}}
+
+    assert config_loader._get_not_found_sources_from_config(config) == ['dev', 'main']
+
+
 def test_create_use_not_found_action_fn_from_config_use():
     actions = {'aki': {'use': {'not_found': [{'volume': '.*', 'actions': [{'action': 'use', 'volume_name': 'dev'}]}]}}}
     actions = config_loader._create_use_not_found_action_fn_from_config(TEST_FOLDER, actions)('volume', {}, {})
@@ -264,6 +297,100 @@ def test_create_use_not_found_action_fn_from_config_multi():
     assert error.message == 'why ?'
 
 
+def test_get_trash_from_config_default():
+    assert config_loader._get_trash_from_config({}) == (True, 'background')
+
+
+def test_get_trash_from_config():
+    config = {'aki': {'trash': {'enabled': False, 'purge': 'manual'}}}
+    assert config_loader._get_trash_from_config(config) == (False, 'manual')
+
+
+def test_get_trash_from_config_error_purge():
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_trash_from_config({'aki': {'trash': {'purge': 'never'}}})
+
+    assert str(e.value) == 'Key \'aki.trash.purge\' is \'never\' but possible values are \'background\' or \'manual\''
+
+
+def test_get_gc_from_config_default():
+    policy, parallel = config_loader._get_gc_from_config({})
+
+    assert policy.is_empty()
+    assert parallel == 4
+
+
+def test_get_gc_from_config():
+    config = {'aki': {'gc': {'max_size': '1G', 'keep': 5, 'older_than': '2d', 'parallel': 2}}}
+    policy, parallel = config_loader._get_gc_from_config(config)
+
+    assert policy.max_size == 1024 ** 3
+    assert policy.keep == 5
+    assert policy.older_than == 2 * 86400
+    assert parallel == 2
+
+
+def test_get_gc_from_config_error():
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_gc_from_config({'aki': {'gc': {'older_than': 'soon'}}})
+
+    assert str(e.value) == 'Key \'aki.gc\' is invalid : \'soon\' is not a duration, e.g. 90s, 12h or 30d'
+
+
+def test_get_gc_from_config_negative():
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_gc_from_config({'aki': {'gc': {'keep': -1}}})
+    assert str(e.value) == 'Key \'aki.gc.keep\' is \'-1\' but it must be at least 0'
+
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_gc_from_config({'aki': {'gc': {'parallel': 0}}})
+    assert str(e.value) == 'Key \'aki.gc.parallel\' is \'0\' but it must be at least 1'
+
+
+def test_get_copy_max_duration_from_config():
+    assert config_loader._get_copy_max_duration_from_config({}) is None
+    assert config_loader._get_copy_max_duration_from_config({'aki': {'copy': {'max_duration': '10m'}}}) == 600
+
+
+def test_get_live_copy_from_config():
+    assert config_loader._get_live_copy_from_config({}) == (False, 'stop')
+    assert config_loader._get_live_copy_from_config({'aki': {'copy': {'live': True, 'freeze': 'pause'}}}) == \
+        (True, 'pause')
+
+
+def test_get_live_copy_from_config_error_freeze():
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_live_copy_from_config({'aki': {'copy': {'freeze': 'kill'}}})
+
+    assert str(e.value) == 'Key \'aki.copy.freeze\' is \'kill\' but possible values are \'stop\' or \'pause\''
+
+
+def test_get_completion_ttl_from_config():
+    assert config_loader._get_completion_ttl_from_config({}) == 3600
+    assert config_loader._get_completion_ttl_from_config({'aki': {'completion': {'ttl': '10m'}}}) == 600
+
+
+def test_get_io_policy_from_config():
+    assert config_loader._get_io_policy_from_config({}) == IoPolicy()
+
+    config = {'aki': {'io': {'priority': 'idle', 'nice': 10, 'bandwidth': '50M', 'device': '/dev/sda', 'workers': 8}}}
+    assert config_loader._get_io_policy_from_config(config) == IoPolicy('idle', 10, 50 * 1024 ** 2, '/dev/sda', 8)
+
+
+def test_get_io_policy_from_config_error_priority():
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_io_policy_from_config({'aki': {'io': {'priority': 'high'}}})
+
+    assert str(e.value) == 'Key \'aki.io.priority\' is \'high\' but possible values are \'normal\', \'low\' or \'idle\''
+
+
+def test_get_io_policy_from_config_error_workers():
+    with pytest.raises(ScriptError) as e:
+        config_loader._get_io_policy_from_config({'aki': {'io': {'workers': 0}}})
+
+    assert str(e.value) == 'Key \'aki.io.workers\' is \'0\' but it must be at least 1'
+
+
 def test_import_config():
     base_path = TEST_FOLDER / 'resources/yaml'
     config = config_loader.import_config(base_path / 'aki.yaml')
@@ -0,0 +1,290 @@
+import errno
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from aki import _copy_engine as copy_engine
+from aki._journal import CopyJournal
+from aki._progress import CopyProgress
+
+
+def test_copy_tree_files(tmp_path: Path):
+    source = tmp_path / 'source'
+    (source / 'folder/sub_folder').mkdir(parents=True)
+    (source / 'file').write_text('content')
+    (source / 'folder/sub_folder/file').write_bytes(os.urandom(3 * 1024 * 1024))
+    (source / 'empty').touch()
+
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+
+    destination = tmp_path / 'destination'
+    assert (destination / 'file').read_text() == 'content'
+    assert (destination / 'folder/sub_folder/file').read_bytes() == (source / 'folder/sub_folder/file').read_bytes()
+    assert (destination / 'empty').stat().st_size == 0
+
+
+def test_copy_tree_metadata(tmp_path: Path):
+    source = tmp_path / 'source'
+    (source / 'folder').mkdir(parents=True)
+    (source / 'folder/file').write_text('content')
+    os.chmod(source / 'folder/file', 0o640)
+    os.utime(source / 'folder/file', ns=(1_000_000_000, 2_000_000_000))
+    os.chmod(source / 'folder', 0o750)
+    os.utime(source / 'folder', ns=(3_000_000_000, 4_000_000_000))
+
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+
+    file_stat = (tmp_path / 'destination/folder/file').stat()
+    assert file_stat.st_mode & 0o777 == 0o640
+    assert file_stat.st_mtime_ns == 2_000_000_000
+
+    folder_stat = (tmp_path / 'destination/folder').stat()
+    assert folder_stat.st_mode & 0o777 == 0o750
+    assert folder_stat.st_mtime_ns == 4_000_000_000
+
+
+def test_copy_tree_links(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    (source / 'file').write_text('content')
+    os.link(source / 'file', source / 'hardlink')
+    os.symlink('file', source / 'symlink')
+
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+
+    destination = tmp_path / 'destination'
+    assert (destination / 'file').stat().st_ino == (destination / 'hardlink').stat().st_ino
+    assert (destination / 'file').stat().st_ino != (source / 'file').stat().st_ino
+    assert os.readlink(destination / 'symlink') == 'file'
+
+
+def test_copy_tree_sparse_file(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    with open(source / 'sparse', 'wb') as file:
+        file.seek(64 * 1024 * 1024)
+        file.write(b'end')
+
+    if (source / 'sparse').stat().st_blocks * 512 >= 64 * 1024 * 1024:
+        pytest.skip('file system does not support sparse files')
+
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+
+    destination_stat = (tmp_path / 'destination/sparse').stat()
+    assert destination_stat.st_size == 64 * 1024 * 1024 + 3
+    assert destination_stat.st_blocks * 512 < 64 * 1024 * 1024
+    with open(tmp_path / 'destination/sparse', 'rb') as file:
+        file.seek(64 * 1024 * 1024)
+        assert file.read() == b'end'
+
+
+def test_copy_tree_destination_exists(tmp_path: Path):
+    (tmp_path / 'source').mkdir()
+    (tmp_path / 'destination').mkdir()
+
+    with pytest.raises(FileExistsError):
+        copy_engine.copy_tree(tmp_path / 'source', tmp_path / 'destination')
+
+
+def test_copy_tree_empty_destination_with_journal(tmp_path: Path, monkeypatch):
+    messages = []
+    monkeypatch.setattr(copy_engine, 'print_verbose', lambda text, *args: messages.append(text % args))
+    source = tmp_path / 'source'
+    source.mkdir()
+    (source / 'file').write_text('content')
+    destination = tmp_path / 'destination'
+    destination.mkdir()
+    journal = CopyJournal(tmp_path / 'state', 'host', 'destination')
+    journal.start('source')
+
+    copy_engine.copy_tree(source, destination, journal=journal)
+
+    # A fresh copy is not a resume, the folder created with the volume is not an interrupted copy
+    assert (destination / 'file').read_text() == 'content'
+    assert not [message for message in messages if 'interrupted copy' in message or 'resume' in message]
+    assert 'file' in journal.completed_files
+
+
+def _record(journal: CopyJournal, folder: Path, relative_path: str):
+    file_stat = os.stat(folder / relative_path)
+    journal.record(relative_path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ctime_ns)
+
+
+def _start_resumed_journal(tmp_path: Path, source: Path) -> CopyJournal:
+    source_stat = os.stat(source)
+    journal = CopyJournal(tmp_path / 'state', 'host', 'destination')
+    journal.start('source')
+    journal.set_source_root([source_stat.st_dev, source_stat.st_ino, source_stat.st_ctime_ns])
+    return journal
+
+
+def test_copy_tree_resume(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    for name in ['done', 'partial', 'changed']:
+        (source / name).write_text('content')
+    destination = tmp_path / 'destination'
+    destination.mkdir()
+    (destination / 'done').write_text('kept')
+    (destination / 'partial').write_text('cont')
+    (destination / 'changed').write_text('old')
+    (destination / 'removed').write_text('removed from source')
+    journal = _start_resumed_journal(tmp_path, source)
+    _record(journal, source, 'done')
+    _record(journal, source, 'changed')
+    (source / 'changed').write_text('changed after the copy')
+    os.utime(source / 'changed', ns=(0, 0))
+
+    copy_engine.copy_tree(source, destination, journal=journal)
+
+    assert (destination / 'done').read_text() == 'kept'
+    assert (destination / 'partial').read_text() == 'content'
+    assert (destination / 'changed').read_text() == 'changed after the copy'
+    assert not (destination / 'removed').exists()
+    assert set(journal.completed_files) == {'done', 'partial', 'changed'}
+
+
+def test_copy_tree_resume_other_source_root(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    (source / 'file').write_text('content')
+    destination = tmp_path / 'destination'
+    destination.mkdir()
+    (destination / 'file').write_text('kept')
+    journal = _start_resumed_journal(tmp_path, source)
+    _record(journal, source, 'file')
+    # The interrupted copy was made from a source folder since removed and created again
+    journal.set_source_root([0, 0, 0])
+
+    copy_engine.copy_tree(source, destination, journal=journal)
+
+    assert (destination / 'file').read_text() == 'content'
+    assert CopyJournal(tmp_path / 'state', 'host', 'destination').source_root[1] == os.stat(source).st_ino
+
+
+def test_copy_tree_failure(tmp_path: Path, monkeypatch):
+    source = tmp_path / 'source'
+    (source / 'folder').mkdir(parents=True)
+    (source / 'folder/file').write_text('content')
+    os.chmod(source / 'folder', 0o751)
+
+    def copy_range(*args):
+        raise OSError(errno.EIO, os.strerror(errno.EIO))
+
+    monkeypatch.setattr(copy_engine, '_copy_range', copy_range)
+    with pytest.raises(OSError):
+        copy_engine.copy_tree(source, tmp_path / 'destination')
+
+    # Nothing partial is left for a sync to take as complete
+    assert not (tmp_path / 'destination/folder/file').exists()
+    assert (tmp_path / 'destination/folder').stat().st_mode == (source / 'folder').stat().st_mode
+
+
+def test_copy_tree_sendfile_unsupported(tmp_path: Path, monkeypatch):
+    source = tmp_path / 'source'
+    source.mkdir()
+    (source / 'file').write_bytes(os.urandom(3 * 1024 * 1024))
+
+    def sendfile(*args):
+        # sendfile of macOS and BSD only sends to a socket
+        raise OSError(errno.ENOTSOCK, os.strerror(errno.ENOTSOCK))
+
+    monkeypatch.delattr(os, 'copy_file_range', raising=False)
+    monkeypatch.setattr(os, 'sendfile', sendfile)
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+
+    assert (tmp_path / 'destination/file').read_bytes() == (source / 'file').read_bytes()
+
+
+def test_copy_tree_keep_ownership(tmp_path: Path, monkeypatch):
+    source = tmp_path / 'source'
+    source.mkdir()
+    (source / 'file').write_text('content')
+
+    def lchown(*args):
+        raise PermissionError(errno.EPERM, os.strerror(errno.EPERM))
+
+    monkeypatch.setattr(copy_engine, '_is_root', lambda: False)
+    monkeypatch.setattr(os, 'lchown', lchown)
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+    assert (tmp_path / 'destination/file').read_text() == 'content'
+
+    with pytest.raises(PermissionError):
+        copy_engine.copy_tree(source, tmp_path / 'other', keep_ownership=True)
+
+
+def test_copy_tree_worker_initializer(tmp_path: Path):
+    (tmp_path / 'source').mkdir()
+    (tmp_path / 'source/file').write_text('content')
+    initialized_threads = []
+
+    copy_engine.copy_tree(tmp_path / 'source', tmp_path / 'destination', workers=2,
+                          worker_initializer=lambda: initialized_threads.append(threading.get_ident()))
+
+    assert initialized_threads and threading.get_ident() not in initialized_threads
+
+
+def test_copy_tree_bandwidth(tmp_path: Path):
+    source = tmp_path / 'source'
+    source.mkdir()
+    for index in range(4):
+        (source / f'file_{index}').write_bytes(os.urandom(256 * 1024))
+
+    start = time.monotonic()
+    copy_engine.copy_tree(source, tmp_path / 'destination', bytes_per_second=4 * 1024 * 1024)
+
+    # 1M at 4M/s, the last file starts 3/16s after the first one
+    assert time.monotonic() - start >= 0.18
+    assert (tmp_path / 'destination/file_3').read_bytes() == (source / 'file_3').read_bytes()
+
+
+def test_copy_tree_progress(tmp_path: Path):
+    source = tmp_path / 'source'
+    (source / 'folder').mkdir(parents=True)
+    (source / 'file').write_text('content')
+    (source / 'folder/file').write_bytes(os.urandom(2 * 1024 * 1024))
+    (source / 'link').symlink_to('file')
+    progress = CopyProgress('host')
+
+    copy_engine.copy_tree(source, tmp_path / 'destination', progress=progress)
+
+    assert progress.done_bytes == len('content') + 2 * 1024 * 1024
+    assert progress.done_files == 2
+
+
+def test_sync_tree(tmp_path: Path):
+    source = tmp_path / 'source'
+    (source / 'folder/removed').mkdir(parents=True)
+    (source / 'file').write_text('content')
+    (source / 'unchanged').write_text('unchanged')
+    (source / 'folder/removed/file').write_text('removed')
+    (source / 'kind').write_text('file')
+    copy_engine.copy_tree(source, tmp_path / 'destination')
+    destination = tmp_path / 'destination'
+    unchanged_inode = (destination / 'unchanged').stat().st_ino
+    time.sleep(0.05)
+    since_ns = time.time_ns()
+    time.sleep(0.05)
+
+    (source / 'file').write_text('changed content')
+    shutil.rmtree(source / 'folder/removed')
+    (source / 'kind').unlink()
+    (source / 'kind').mkdir()
+    (source / 'new/sub').mkdir(parents=True)
+    (source / 'new/sub/file').write_text('new')
+    os.link(source / 'new/sub/file', source / 'new/hardlink')
+    os.utime(source / 'folder', ns=(3_000_000_000, 4_000_000_000))
+
+    copy_engine.sync_tree(source, destination, since_ns)
+
+    assert sorted(str(path.relative_to(destination)) for path in destination.rglob('*')) == \
+        ['file', 'folder', 'kind', 'new', 'new/hardlink', 'new/sub', 'new/sub/file', 'unchanged']
+    assert (destination / 'file').read_text() == 'changed content'
+    assert (destination / 'unchanged').stat().st_ino == unchanged_inode
+    assert (destination / 'kind').is_dir()
+    assert (destination / 'new/hardlink').stat().st_ino == (destination / 'new/sub/file').stat().st_ino
+    assert (destination / 'folder').stat().st_mtime_ns == 4_000_000_000
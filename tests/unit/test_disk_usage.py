@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+
+from aki._disk_usage import measure_tree
+
+
+def test_measure_tree(tmp_path: Path):
+    (tmp_path / 'folder/sub_folder').mkdir(parents=True)
+    (tmp_path / 'file').write_bytes(b'x' * 8192)
+    (tmp_path / 'folder/sub_folder/file').write_bytes(b'x' * 8192)
+    os.link(tmp_path / 'file', tmp_path / 'folder/hardlink')
+
+    usage = measure_tree(tmp_path)
+
+    assert usage.files == 3
+    assert usage.size >= 2 * 8192
+    assert usage.size < 3 * 8192 + 4 * 4096 * 4
+
+
+def test_measure_tree_empty(tmp_path: Path):
+    usage = measure_tree(tmp_path)
+
+    assert usage.files == 0
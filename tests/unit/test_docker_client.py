@@ -0,0 +1,16 @@
+from unittest.mock import MagicMock
+
+import docker.errors
+
+from aki._docker_client import ensure_helper_image, HELPER_IMAGE
+
+
+def test_ensure_helper_image_pull_once():
+    docker_client = MagicMock()
+    docker_client.images.get.side_effect = docker.errors.ImageNotFound('not found')
+
+    assert ensure_helper_image(docker_client) == HELPER_IMAGE
+    assert ensure_helper_image(docker_client) == HELPER_IMAGE
+
+    docker_client.images.get.assert_called_once_with(HELPER_IMAGE)
+    docker_client.images.pull.assert_called_once_with(HELPER_IMAGE)
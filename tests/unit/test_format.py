@@ -0,0 +1,42 @@
+import pytest
+
+from aki._format import format_size, format_elapsed, format_duration, parse_size, parse_duration
+
+
+def test_format_size():
+    assert format_size(None) == '-'
+    assert format_size(512) == '512B'
+    assert format_size(1536) == '1.5K'
+    assert format_size(5 * 1024 ** 3) == '5.0G'
+
+
+def test_format_elapsed():
+    assert format_elapsed(None) == '-'
+    assert format_elapsed(30) == 'now'
+    assert format_elapsed(7200) == '2h ago'
+    assert format_elapsed(3 * 86400 + 10) == '3d ago'
+
+
+def test_format_duration():
+    assert format_duration(12.4) == '12s'
+    assert format_duration(200) == '3m 20s'
+    assert format_duration(3725) == '1h 02m'
+
+
+def test_parse_size():
+    assert parse_size('512') == 512
+    assert parse_size('1.5K') == 1536
+    assert parse_size('10G') == 10 * 1024 ** 3
+    assert parse_size('10gb') == 10 * 1024 ** 3
+
+    with pytest.raises(ValueError):
+        parse_size('big')
+
+
+def test_parse_duration():
+    assert parse_duration('90') == 90
+    assert parse_duration('12h') == 12 * 3600
+    assert parse_duration('30d') == 30 * 86400
+
+    with pytest.raises(ValueError):
+        parse_duration('soon')
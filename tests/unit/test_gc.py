@@ -0,0 +1,70 @@
+import pytest
+
+from aki import cli
+from aki._gc import GcPolicy, GcUsage, plan_eviction
+
+NOW = 1_700_000_000.0
+DAY = 86400
+
+
+def _usages():
+    return [
+        GcUsage('dev', 10, NOW - 1 * DAY),
+        GcUsage('feature-a', 30, NOW - 40 * DAY),
+        GcUsage('feature-b', 20, NOW - 10 * DAY),
+        GcUsage('unknown', 5, None),
+    ]
+
+
+def _evicted_names(evictions):
+    return [eviction.usage.aki_name for eviction in evictions]
+
+
+def test_plan_eviction_empty_policy():
+    assert plan_eviction(_usages(), set(), GcPolicy(), NOW) == []
+
+
+def test_plan_eviction_keep():
+    evictions = plan_eviction(_usages(), set(), GcPolicy(keep=2), NOW)
+
+    assert _evicted_names(evictions) == ['unknown', 'feature-a']
+    assert evictions[0].reason == 'keep 2 most recently used'
+
+
+def test_plan_eviction_keep_protected():
+    evictions = plan_eviction(_usages(), {'feature-a'}, GcPolicy(keep=1), NOW)
+
+    assert _evicted_names(evictions) == ['unknown', 'feature-b']
+
+
+def test_plan_eviction_older_than():
+    evictions = plan_eviction(_usages(), set(), GcPolicy(older_than=30 * DAY), NOW)
+
+    # A volume never used by aki is not evicted by age
+    assert _evicted_names(evictions) == ['feature-a']
+    assert evictions[0].reason == 'not used since 40d ago'
+
+
+def test_plan_eviction_max_size():
+    evictions = plan_eviction(_usages(), {'unknown'}, GcPolicy(max_size=40), NOW)
+
+    assert _evicted_names(evictions) == ['feature-a']
+    assert evictions[0].reason == 'total size above 40B'
+
+
+def test_plan_eviction_max_size_after_other_rules():
+    evictions = plan_eviction(_usages(), set(), GcPolicy(max_size=10, older_than=30 * DAY), NOW)
+
+    assert _evicted_names(evictions) == ['unknown', 'feature-a', 'feature-b']
+
+
+@pytest.mark.parametrize('arguments', [['gc', '--keep', '-1'], ['gc', '--parallel', '0'], ['gc', '-p', 'two']])
+def test_gc_arguments_rejected(arguments):
+    with pytest.raises(SystemExit):
+        cli._create_parser().parse_args(arguments)
+
+
+def test_gc_arguments():
+    arguments = cli._create_parser().parse_args(['gc', '--keep', '0', '--parallel', '3'])
+
+    assert (arguments.keep, arguments.parallel) == (0, 3)
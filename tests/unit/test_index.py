@@ -0,0 +1,95 @@
+from pathlib import Path
+
+from aki._index import VolumeIndex
+from aki.volume import Volume
+
+
+def _volume(aki_name: str) -> Volume:
+    return Volume(f'prefix_{aki_name}', aki_name)
+
+
+def test_reconcile(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+    index.reconcile('postgres', [_volume('dev'), _volume('test')])
+
+    assert sorted(index.fetch('postgres').keys()) == ['dev', 'test']
+    assert index.fetch('mongo') == {}
+
+    index.reconcile('postgres', [_volume('dev'), _volume('feature')])
+    assert sorted(index.fetch('postgres').keys()) == ['dev', 'feature']
+
+
+def test_reconcile_keep_metadata(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+    index.mark_created('postgres', _volume('dev-x'), source='dev', size=1024)
+    index.mark_used('postgres', _volume('dev-x'))
+
+    index.reconcile('postgres', [_volume('dev-x')])
+
+    metadata = index.fetch('postgres')['dev-x']
+    assert metadata.external_name == 'prefix_dev-x'
+    assert metadata.source == 'dev'
+    assert metadata.size == 1024
+    assert metadata.created_at is not None
+    assert metadata.last_used_at >= metadata.created_at
+
+
+def test_reconcile_metadata_of_volume(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+
+    index.reconcile('postgres', [Volume('prefix_dev-x', 'dev-x', created_at=1000.0, source='dev')])
+
+    metadata = index.fetch('postgres')['dev-x']
+    assert metadata.created_at == 1000.0
+    assert metadata.source == 'dev'
+
+
+def test_persistent(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+    index.mark_used('postgres', _volume('dev'))
+    index.set_size('postgres', 'dev', 42)
+    index.close()
+
+    metadata = VolumeIndex(tmp_path / '.aki').fetch('postgres')['dev']
+    assert metadata.size == 42
+    assert metadata.last_used_at is not None
+
+
+def test_remove(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+    index.mark_used('postgres', _volume('dev'))
+    index.mark_used('mongo', _volume('dev'))
+
+    index.remove('postgres', 'dev')
+
+    assert index.fetch('postgres') == {}
+    assert list(index.fetch('mongo').keys()) == ['dev']
+
+
+def test_disabled_when_state_path_is_not_writable(tmp_path: Path):
+    (tmp_path / '.aki').write_text('not a folder')
+    index = VolumeIndex(tmp_path / '.aki')
+
+    index.mark_used('postgres', _volume('dev'))
+
+    assert index.fetch('postgres') == {}
+
+
+def test_throughput(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+    assert index.fetch_throughput('postgres') is None
+
+    index.add_copy_stat('postgres', 100, 1)
+    index.add_copy_stat('postgres', 300, 1)
+
+    assert index.fetch_throughput('postgres') == 200
+    assert index.fetch_throughput('mongo') is None
+
+
+def test_throughput_keep_recent_copies(tmp_path: Path):
+    index = VolumeIndex(tmp_path / '.aki')
+    index.add_copy_stat('postgres', 1, 1)
+    for _ in range(10):
+        index.add_copy_stat('postgres', 100, 1)
+
+    assert index.fetch_throughput('postgres') == 100
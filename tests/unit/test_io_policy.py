@@ -0,0 +1,43 @@
+import os
+import threading
+
+from aki._io_policy import IoPolicy
+
+
+def test_io_policy_override():
+    policy = IoPolicy('idle', 10, 1000, '/dev/sda')
+
+    assert policy.override(IoPolicy()) == policy
+    assert policy.override(IoPolicy(priority='normal', bandwidth=0)) == IoPolicy('normal', 10, 0, '/dev/sda')
+    assert policy.override(IoPolicy(workers=8)) == IoPolicy('idle', 10, 1000, '/dev/sda', 8)
+
+
+def test_io_policy_wrap_command():
+    assert IoPolicy().wrap_command('cp -a /source/. /destination') == 'cp -a /source/. /destination'
+    assert IoPolicy('normal', 0).wrap_command('cp') == 'cp'
+    assert IoPolicy('idle', 10).wrap_command('cp') == 'ionice -c 3 -n 0 nice -n 10 cp'
+    assert IoPolicy('low').wrap_command('cp') == 'ionice -c 2 -n 7 cp'
+
+
+def test_io_policy_container_options():
+    assert IoPolicy().container_options() == {}
+    assert IoPolicy(bandwidth=1000).container_options() == {}
+
+    options = IoPolicy('idle', 19, 1000, '/dev/sda').container_options()
+
+    assert options['blkio_weight'] == 10
+    assert 2 <= options['cpu_shares'] < 1024
+    assert options['device_write_bps'] == [{'Path': '/dev/sda', 'Rate': 1000}]
+    assert options['device_read_bps'] == [{'Path': '/dev/sda', 'Rate': 1000}]
+
+
+def test_io_policy_run_in_thread(monkeypatch):
+    niced_threads = []
+    monkeypatch.setattr(os, 'setpriority', lambda which, who, nice: niced_threads.append(threading.get_ident()))
+
+    thread_id = IoPolicy(nice=10).run_in_thread(threading.get_ident)
+
+    # Only the thread that runs the work is niced, not the calling thread
+    assert thread_id != threading.get_ident()
+    assert niced_threads == [thread_id]
+    assert IoPolicy().run_in_thread(threading.get_ident) == threading.get_ident()
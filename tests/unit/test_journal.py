@@ -0,0 +1,90 @@
+from pathlib import Path
+
+from aki._journal import CopyJournal
+
+
+def test_journal_not_in_progress(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+
+    assert not journal.is_in_progress()
+    assert journal.completed_files == {}
+
+
+def test_journal_reload_progress(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('source')
+    journal.record('file', 10, 1, 2)
+    journal.record('folder/file', 5, 3, 4)
+    journal.flush()
+
+    reloaded_journal = CopyJournal(tmp_path, 'host', 'volume')
+
+    assert reloaded_journal.is_in_progress()
+    assert reloaded_journal.source == 'source'
+    assert reloaded_journal.completed_files == {'file': (10, 1, 2), 'folder/file': (5, 3, 4)}
+    assert reloaded_journal.completed_bytes == 15
+
+
+def test_journal_ignore_truncated_line(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('source')
+    journal.record('file', 10, 1, 2)
+    journal.flush()
+    with open(journal.path, 'a') as file:
+        file.write('[3, "trunc')
+
+    assert set(CopyJournal(tmp_path, 'host', 'volume').completed_files) == {'file'}
+
+
+def test_journal_start_other_source_reset_progress(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('source')
+    journal.record('file', 10, 1, 2)
+    journal.flush()
+
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('other_source')
+
+    assert journal.completed_files == {}
+    assert CopyJournal(tmp_path, 'host', 'volume').source == 'other_source'
+
+
+def test_journal_complete(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('source')
+    journal.record('file', 10, 1, 2)
+    journal.complete()
+
+    assert not journal.path.exists()
+    assert not CopyJournal(tmp_path, 'host', 'volume').is_in_progress()
+
+
+def test_journal_not_resumable(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('source', is_resumable=False)
+    journal.record('file', 10, 1, 2)
+    journal.flush()
+
+    reloaded_journal = CopyJournal(tmp_path, 'host', 'volume')
+    assert reloaded_journal.is_in_progress()
+    assert not reloaded_journal.is_resumable
+
+    reloaded_journal.start('source')
+
+    assert reloaded_journal.completed_files == {}
+    assert CopyJournal(tmp_path, 'host', 'volume').is_resumable
+
+
+def test_journal_record_changed_file(tmp_path: Path):
+    journal = CopyJournal(tmp_path, 'host', 'volume')
+    journal.start('source')
+    journal.set_source_root([1, 2, 3])
+    journal.record('file', 10, 1, 2)
+    journal.record('file', 12, 5, 6)
+    journal.flush()
+
+    reloaded_journal = CopyJournal(tmp_path, 'host', 'volume')
+    assert reloaded_journal.source_root == [1, 2, 3]
+    assert reloaded_journal.completed_bytes == 12
+    assert reloaded_journal.is_completed('file', 12, 5, 6)
+    assert not reloaded_journal.is_completed('file', 10, 1, 2)
@@ -0,0 +1,138 @@
+import threading
+from pathlib import Path
+
+import pytest
+
+from aki._lock import LOCK_FOLDER_ENV, fetch_held_locks, hold_locks, use_held_locks
+from aki.error import ScriptError
+
+
+@pytest.fixture(autouse=True)
+def lock_folder(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv(LOCK_FOLDER_ENV, str(tmp_path))
+
+
+def _hold_in_thread(key: str, release: threading.Event):
+    acquired = threading.Event()
+
+    def hold():
+        with hold_locks([key]):
+            acquired.set()
+            release.wait()
+
+    threading.Thread(target=hold, daemon=True).start()
+    acquired.wait()
+
+
+def test_hold_locks_reentrant():
+    with hold_locks(['volume:dev']):
+        with hold_locks(['volume:dev', 'container:mongo']):
+            pass
+
+        # Still held after the inner block, another thread cannot take it
+        with pytest.raises(ScriptError):
+            _take_in_thread('volume:dev', timeout=0.1)
+
+    _take_in_thread('volume:dev', timeout=0.1)
+
+
+def test_hold_locks_timeout():
+    release = threading.Event()
+    _hold_in_thread('env:/project/.env', release)
+
+    with pytest.raises(ScriptError) as e:
+        with hold_locks(['env:/project/.env'], timeout=0.2):
+            pass
+
+    assert 'waiting for env:/project/.env' in str(e.value)
+    release.set()
+
+
+def test_hold_locks_wait_for_release():
+    release = threading.Event()
+    _hold_in_thread('container:mongo', release)
+    threading.Timer(0.2, release.set).start()
+
+    with hold_locks(['container:mongo', 'volume:other'], timeout=5):
+        assert release.is_set()
+
+
+def _take_in_thread(key: str, timeout: float):
+    errors = []
+
+    def take():
+        try:
+            with hold_locks([key], timeout=timeout):
+                pass
+        except ScriptError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=take)
+    thread.start()
+    thread.join()
+    if errors:
+        raise errors[0]
+
+
+def test_hold_locks_shared():
+    release = threading.Event()
+    acquired = threading.Event()
+
+    def hold():
+        with hold_locks([], shared_keys=['volume:dev']):
+            acquired.set()
+            release.wait()
+
+    threading.Thread(target=hold, daemon=True).start()
+    acquired.wait()
+
+    with hold_locks(['volume:pr-1'], timeout=0.2, shared_keys=['volume:dev']):
+        pass
+    with pytest.raises(ScriptError):
+        with hold_locks(['volume:dev'], timeout=0.2):
+            pass
+    release.set()
+
+
+def test_use_held_locks():
+    with hold_locks(['container:mongo']):
+        held_locks = fetch_held_locks()
+
+        def work():
+            with use_held_locks(held_locks):
+                with hold_locks(['container:mongo'], timeout=0.2):
+                    pass
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+        # The lock is still held by this thread
+        with pytest.raises(ScriptError):
+            _take_in_thread('container:mongo', timeout=0.1)
+
+
+def test_hold_locks_upgrade_shared():
+    def take_shared():
+        errors = []
+
+        def take():
+            try:
+                with hold_locks([], timeout=0.1, shared_keys=['volume:dev']):
+                    pass
+            except ScriptError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=take)
+        thread.start()
+        thread.join()
+        return not errors
+
+    with hold_locks([], shared_keys=['volume:dev']):
+        assert take_shared()
+        with hold_locks(['volume:dev'], timeout=0.2):
+            # The source of a copy is written in the same thread, readers wait
+            assert not take_shared()
+        assert not take_shared()
+
+    assert take_shared()
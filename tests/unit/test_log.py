@@ -0,0 +1,79 @@
+import io
+import json
+import threading
+from pathlib import Path
+
+from aki._log import log_context, log_operation, open_log_file, verbose
+from aki._print import print_info, print_verbose, redirect_output, _set_print_verbose
+
+
+class _Formatted:
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return 'formatted'
+
+
+def test_print_verbose_lazy():
+    value = _Formatted()
+    output = io.StringIO()
+
+    with redirect_output(output):
+        print_verbose('value %s', value)
+
+    assert value.count == 0
+    assert output.getvalue() == ''
+
+
+def test_print_verbose_thread():
+    output = io.StringIO()
+    other_output = io.StringIO()
+
+    def print_in_other_thread():
+        with redirect_output(other_output):
+            print_verbose('other thread')
+
+    with redirect_output(output), verbose(True):
+        print_verbose('value %s', 10)
+        thread = threading.Thread(target=print_in_other_thread)
+        thread.start()
+        thread.join()
+
+    assert output.getvalue().endswith('] value 10\n')
+    assert other_output.getvalue() == ''
+
+
+def test_print_verbose_default():
+    output = io.StringIO()
+    _set_print_verbose(True)
+    try:
+        with redirect_output(output):
+            print_verbose('verbose')
+            with verbose(False):
+                print_verbose('quiet')
+    finally:
+        _set_print_verbose(False)
+
+    assert output.getvalue().endswith('] verbose\n')
+
+
+def test_log_file(tmp_path: Path):
+    log_path = tmp_path / 'logs/aki.log'
+    open_log_file(log_path)
+    try:
+        with redirect_output(io.StringIO()), log_context(volume_type='mongo', container='db'):
+            with log_operation('cp'):
+                print_verbose('copy %s', 'dev')
+                print_info('Copy done')
+    finally:
+        open_log_file(None)
+
+    entries = [json.loads(line) for line in log_path.read_text().splitlines()]
+    assert [entry['message'] for entry in entries] == ['cp started', 'copy dev', 'Copy done', entries[-1]['message']]
+    assert [entry['level'] for entry in entries] == ['debug', 'debug', 'info', 'debug']
+    assert all(entry['volume_type'] == 'mongo' and entry['operation'] == 'cp' for entry in entries)
+    assert entries[-1]['success'] is True
+    assert entries[-1]['duration'] >= 0
+    assert entries[0]['elapsed'] <= entries[-1]['elapsed']
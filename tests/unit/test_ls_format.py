@@ -0,0 +1,84 @@
+import json
+
+from aki import _ls_format as ls_format
+from aki._catalog import volume_sort_key
+from aki._ls_format import VolumeRow
+from aki.volume import Volume
+
+
+def _volume(prefix: str, aki_name: str) -> Volume:
+    return Volume(f'{prefix}{aki_name}', aki_name)
+
+
+def test_merge_volumes_by_aki_name():
+    def sort_key(volume: Volume):
+        return volume_sort_key(volume.aki_name)
+
+    volumes_by_type = {
+        'host': sorted([_volume('/data/', 'test'), _volume('/data/', 'Dev')], key=sort_key),
+        'docker': sorted([_volume('d_', 'dev'), _volume('d_', 'test'), _volume('d_', 'alpha')], key=sort_key),
+    }
+
+    merged = list(ls_format.merge_volumes_by_aki_name(volumes_by_type))
+
+    assert merged == [
+        {'docker': _volume('d_', 'alpha')},
+        {'host': _volume('/data/', 'Dev')},
+        {'docker': _volume('d_', 'dev')},
+        {'host': _volume('/data/', 'test'), 'docker': _volume('d_', 'test')},
+    ]
+
+
+def test_write_rows_ndjson(capsys):
+    rows = [
+        VolumeRow('dev', {'host': _volume('/data/', 'dev')}, ['host'], 2048, 1_700_000_000.0),
+        VolumeRow('test', {'host': _volume('/data/', 'test'), 'docker': _volume('d_', 'test')}, []),
+    ]
+
+    ls_format.write_rows(ls_format.LS_FORMAT_NDJSON, ['host', 'docker'], iter(rows), details=True)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {'name': 'dev', 'volumes': {'host': {'name': '/data/dev', 'current': True}}, 'size': 2048,
+         'last_used_at': 1_700_000_000.0},
+        {'name': 'test', 'volumes': {'host': {'name': '/data/test', 'current': False},
+                                     'docker': {'name': 'd_test', 'current': False}},
+         'size': None, 'last_used_at': None},
+    ]
+
+
+def test_write_rows_json(capsys):
+    rows = [VolumeRow('dev', {'host': _volume('/data/', 'dev')}, []), VolumeRow('test', {}, [])]
+
+    ls_format.write_rows(ls_format.LS_FORMAT_JSON, ['host'], iter(rows))
+
+    assert [row['name'] for row in json.loads(capsys.readouterr().out)] == ['dev', 'test']
+
+
+def test_write_rows_json_empty(capsys):
+    ls_format.write_rows(ls_format.LS_FORMAT_JSON, ['host'], iter([]))
+
+    assert json.loads(capsys.readouterr().out) == []
+
+
+def test_write_records(capsys):
+    rows = [VolumeRow('dev', {'host': _volume('/data/', 'dev')}, [])]
+    records = [ls_format.row_to_record(row, False, project_name) for project_name in ['backend', 'front']
+               for row in rows]
+
+    ls_format.write_records(ls_format.LS_FORMAT_JSON, iter(records))
+
+    assert [(row['project'], row['name']) for row in json.loads(capsys.readouterr().out)] == [
+        ('backend', 'dev'), ('front', 'dev')
+    ]
+
+
+def test_write_rows_tsv(capsys):
+    rows = [VolumeRow('dev', {'docker': _volume('d_', 'dev')}, ['docker'], 10, 1_700_000_000.4)]
+
+    ls_format.write_rows(ls_format.LS_FORMAT_TSV, ['host', 'docker'], iter(rows), details=True)
+
+    assert capsys.readouterr().out.splitlines() == [
+        'volume\thost\tdocker\tcurrent\tsize\tlast_used_at',
+        'dev\t\td_dev\tdocker\t10\t1700000000',
+    ]
@@ -0,0 +1,50 @@
+import pytest
+
+from aki._matcher import VolumeMatcher
+from aki.error import ScriptError
+
+NAMES = ['dev', 'feat-a', 'feat-b', 'fix-c', 'x.y']
+
+
+def test_match_patterns_union():
+    matcher = VolumeMatcher.from_patterns(['^feat', 'c$'])
+
+    assert [name for name in NAMES if matcher.match(name)] == ['feat-a', 'feat-b', 'fix-c']
+
+
+def test_match_patterns_reverse_intersection():
+    matcher = VolumeMatcher.from_patterns(['^feat', 'c$'], reverse_match=True)
+
+    assert [name for name in NAMES if matcher.match(name)] == ['dev', 'x.y']
+
+
+def test_match_patterns_with_groups():
+    matcher = VolumeMatcher.from_patterns([r'(f)eat-\w', r'^(\w)ev'])
+
+    assert [name for name in NAMES if matcher.match(name)] == ['dev', 'feat-a', 'feat-b']
+
+
+def test_match_patterns_with_global_flag():
+    matcher = VolumeMatcher.from_patterns(['^dev', '(?i)^FIX'])
+
+    assert [name for name in NAMES if matcher.match(name)] == ['dev', 'fix-c']
+
+
+def test_match_patterns_global_flag_not_combined():
+    matcher = VolumeMatcher.from_patterns(['^dev', r'^feat-\w', '(?i)^FIX'])
+
+    # The flag of a pattern does not apply to the others, whatever the python version
+    assert len(matcher._regexes) == 2
+    assert not matcher.match('DEV')
+    assert matcher.match('Fix-d')
+
+
+def test_match_names_are_literal():
+    matcher = VolumeMatcher.from_names(['x.y', 'dev'])
+
+    assert [name for name in NAMES + ['xzy', 'dev2'] if matcher.match(name)] == ['dev', 'x.y']
+
+
+def test_match_error_invalid_pattern():
+    with pytest.raises(ScriptError, match="Pattern '\\(' is invalid"):
+        VolumeMatcher.from_patterns(['('])
@@ -0,0 +1,94 @@
+import io
+import time
+
+import pytest
+
+from aki._progress import CopyProgress
+
+
+class _Terminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_progress_format():
+    progress = CopyProgress('docker', total_bytes=4 * 1024 * 1024)
+    progress.add(1024 * 1024, 3)
+
+    text = progress.format()
+
+    assert text.startswith('docker - 1.0M / 4.0M (25%) - 3 files - ')
+    assert 'ETA' in text
+
+
+def test_progress_format_without_total():
+    progress = CopyProgress('host')
+    progress.update(2048, 5)
+
+    text = progress.format()
+
+    assert text.startswith('host - 2.0K - 5 files')
+    assert 'ETA' not in text
+
+
+def test_progress_resumed_copy_throughput():
+    progress = CopyProgress('host', total_bytes=2000, done_bytes=1000, done_files=1)
+    progress._start -= 10
+    progress.add(500)
+
+    assert progress.throughput() == pytest.approx(50, rel=0.05)
+    assert progress.eta() == pytest.approx(10, rel=0.05)
+
+
+def test_progress_percent_capped():
+    progress = CopyProgress('docker', total_bytes=1000)
+    progress.update(1500)
+
+    assert '(100%)' in progress.format()
+
+
+def test_progress_log_lines(monkeypatch):
+    monkeypatch.setattr('aki._progress.LOG_RENDER_INTERVAL', 0.01)
+    file = io.StringIO()
+
+    with CopyProgress('host', file=file) as progress:
+        progress.add(1024, 1)
+        time.sleep(0.05)
+
+    lines = file.getvalue().splitlines()
+    assert lines
+    assert all(line.startswith('host - ') for line in lines)
+
+
+def test_progress_tty_line(monkeypatch):
+    monkeypatch.setattr('aki._progress.TTY_RENDER_INTERVAL', 0.01)
+    file = _Terminal()
+
+    with CopyProgress('host', file=file) as progress:
+        progress.add(1024, 1)
+        time.sleep(0.05)
+
+    output = file.getvalue()
+    assert '\n' not in output
+    assert output.startswith('\rhost - ')
+    # The line is erased once the copy is done
+    assert output.endswith('\r')
+    assert output.rstrip('\r').split('\r')[-1].strip() == ''
+
+
+
+def test_progress_callback(monkeypatch):
+    monkeypatch.setattr('aki._progress.TTY_RENDER_INTERVAL', 0.01)
+    file = io.StringIO()
+    done_bytes = []
+
+    with CopyProgress('host', total_bytes=2048, file=file, callback=lambda p: done_bytes.append(p.done_bytes)) \
+            as progress:
+        progress.add(1024, 1)
+        time.sleep(0.05)
+        progress.add(1024, 1)
+
+    assert file.getvalue() == ''
+    # The last call reports the completed copy
+    assert done_bytes[-1] == 2048
+    assert len(done_bytes) > 1
@@ -0,0 +1,98 @@
+import os
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from aki import _shard as shard
+from aki import platform_info
+
+_MB = 1024 * 1024
+
+
+def _listing():
+    return {
+        '.': (10 * _MB, 2),
+        './indices': (0, 0),
+        './indices/a': (400 * _MB, 50),
+        './indices/b': (300 * _MB, 40),
+        './indices/c': (300 * _MB, 40),
+        './logs': (1 * _MB, 1000),
+    }
+
+
+def _run(command: str) -> str:
+    return subprocess.run(command, shell=True, check=True, capture_output=True, text=True).stdout
+
+
+def _tree(folder: Path):
+    entries = {}
+    for path in [folder, *folder.rglob('*')]:
+        path_stat = os.lstat(path)
+        content = path.read_bytes() if path.is_file() and not path.is_symlink() else None
+        entries[str(path.relative_to(folder))] = (path_stat.st_mode, path_stat.st_mtime_ns, content)
+    return entries
+
+
+def test_parse_listing():
+    output = 'aki-shard\t8\t2\t.\naki-shard\t4\t1\t./a b\ncp: message\n'
+
+    assert shard.parse_listing(output) == {'.': (8192, 2), './a b': (4096, 1)}
+    assert shard.parse_listing('aki-shard-single\n') is None
+    assert shard.parse_listing('') is None
+
+
+def test_plan_copy_single_worker():
+    assert shard.plan_copy(_listing(), 1) is None
+    assert shard.plan_copy(None, 4) is None
+    assert shard.plan_copy({'.': (10 * _MB, 3)}, 4) is None
+
+
+def test_plan_copy_balanced():
+    plan = shard.plan_copy(_listing(), 3)
+
+    loads = [sum(unit.weight for unit in units) for units in plan.shards]
+    assert len(plan.shards) == 3
+    assert max(loads) < min(loads) * 1.5
+    assert plan.split_folders[0] == '.'
+    assert {unit.path for units in plan.shards for unit in units} >= {'.', './indices/a', './logs'}
+
+
+def test_copy_command_single():
+    assert shard.copy_command(None) == 'cp -a /source/. /destination'
+    assert shard.copy_command(None, destination_folder='/layer/upper') == 'cp -a /source/. /layer/upper'
+
+
+@pytest.mark.skipif(not platform_info.is_linux(), reason='the copy script runs busybox or coreutils commands')
+def test_sharded_copy_same_as_cp(tmp_path: Path):
+    source = tmp_path / 'source'
+    for index in range(4):
+        folder = source / f'folder {index}' / 'sub' / 'deep' / 'deeper' / 'deepest'
+        folder.mkdir(parents=True)
+        for file_index in range(10):
+            (folder.parent / f'file*[{file_index}]').write_bytes(os.urandom(file_index * 20000))
+            (folder / f'file {file_index}').write_bytes(os.urandom(file_index * 10000))
+    for file_index in range(20):
+        (source / f'loose {file_index}').write_text('content' * file_index)
+    (source / 'empty').mkdir()
+    (source / 'link').symlink_to('loose 1')
+    os.chmod(source / 'folder 1', 0o750)
+    os.utime(source / 'folder 1' / 'sub', ns=(1000, 1000))
+    os.utime(source, ns=(2000, 2000))
+
+    plan = shard.plan_copy(shard.parse_listing(_run(shard.listing_command(str(source)))), 3)
+    (tmp_path / 'destination').mkdir()
+    _run(shard.copy_command(plan, str(source), str(tmp_path / 'destination')))
+    (tmp_path / 'reference').mkdir()
+    _run(f'cp -a {source}/. {tmp_path / "reference"}')
+
+    assert len(plan.shards) == 3
+    assert _tree(tmp_path / 'destination') == _tree(tmp_path / 'reference')
+
+
+@pytest.mark.skipif(not platform_info.is_linux(), reason='the listing script runs busybox or coreutils commands')
+def test_listing_hardlinks_single(tmp_path: Path):
+    (tmp_path / 'file').write_text('content')
+    os.link(tmp_path / 'file', tmp_path / 'link')
+
+    assert shard.parse_listing(_run(shard.listing_command(str(tmp_path)))) is None
@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+import pytest
+
+from aki import _sync as sync
+from aki import platform_info
+
+pytestmark = pytest.mark.skipif(not platform_info.is_linux(),
+                                reason='the sync script runs busybox or coreutils commands')
+
+
+def _tree(folder: Path):
+    entries = {}
+    for path in [folder, *folder.rglob('*')]:
+        path_stat = os.lstat(path)
+        content = path.read_bytes() if path.is_file() and not path.is_symlink() else None
+        entries[str(path.relative_to(folder))] = (path_stat.st_mode, path_stat.st_mtime_ns, content)
+    return entries
+
+
+def _operations(tmp_path: Path, destination_listing: str, source_listing: str, since: int):
+    (tmp_path / 'destination.txt').write_text(destination_listing)
+    (tmp_path / 'source.txt').write_text(source_listing)
+    output = subprocess.run(['awk', '-v', f'since={since}', sync._SYNC_AWK, str(tmp_path / 'destination.txt'),
+                             str(tmp_path / 'source.txt')], check=True, capture_output=True, text=True).stdout
+    return output.splitlines()
+
+
+def test_sync_operations(tmp_path: Path):
+    destination_listing = ('directory|./folder\nregular file|./folder/file\nregular file|./kind\n'
+                           'directory|./removed\nregular file|./removed/file\nregular file|./unchanged\n')
+    source_listing = ('100 directory|./folder\n200 regular file|./folder/file\n200 directory|./kind\n'
+                      '200 regular file|./kind/file\n100 regular file|./unchanged\n200 directory|./new\n'
+                      '200 regular file|./new/file\n')
+
+    operations = _operations(tmp_path, destination_listing, source_listing, 150)
+
+    assert operations == ['R ./removed', 'R ./folder/file', 'C ./folder/file', 'R ./kind', 'C ./kind', 'C ./new',
+                          'M ./folder', 'M .']
+
+
+def test_sync_same_as_cp(tmp_path: Path):
+    source = tmp_path / 'source'
+    (source / 'folder/sub').mkdir(parents=True)
+    (source / 'removed').mkdir()
+    (source / 'removed/file').write_text('removed')
+    (source / 'folder/file').write_text('file')
+    (source / 'folder/sub/file').write_text('sub')
+    (source / 'kind').write_text('file')
+    (source / 'we|ird *[name]').write_text('weird')
+    destination = tmp_path / 'destination'
+    destination.mkdir()
+    subprocess.run(f'cp -a {source}/. {destination}', shell=True, check=True)
+    since = time.time()
+
+    (source / 'folder/file').write_text('changed')
+    shutil.rmtree(source / 'removed')
+    (source / 'kind').unlink()
+    (source / 'kind').mkdir()
+    (source / 'kind/file').write_text('kind')
+    os.rename(source / 'folder/sub', source / 'folder/renamed')
+    (source / 'new/deep').mkdir(parents=True)
+    (source / 'new/deep/file').write_text('new')
+    (source / 'we|ird *[name]').write_text('changed weird')
+    (source / 'link').symlink_to('folder/file')
+    os.utime(source / 'folder', ns=(3_000_000_000, 4_000_000_000))
+
+    subprocess.run(sync.sync_command(since, str(source), str(destination)), shell=True, check=True)
+
+    reference = tmp_path / 'reference'
+    reference.mkdir()
+    subprocess.run(f'cp -a {source}/. {reference}', shell=True, check=True)
+    assert _tree(destination) == _tree(reference)
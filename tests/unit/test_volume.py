@@ -0,0 +1,423 @@
+import fcntl
+import os
+import subprocess
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import docker.errors
+import pytest
+
+from aki import platform_info
+from aki._io_policy import IoPolicy
+from aki._lock import LOCK_FOLDER_ENV, _lock_path, overlay_layers_lock_key
+from aki._progress import CopyProgress
+from aki.volume import AkiDockerVolume, AkiHostVolume, AkiOverlayVolume, FreeSpace, Volume, _OverlayMount, LABEL_AKI_CREATED_AT, \
+    LABEL_AKI_NAME, LABEL_AKI_PREFIX, LABEL_AKI_SOURCE, LABEL_AKI_TYPE, _parse_docker_time, _progress_loop_script
+
+DOCKER_CLIENT = MagicMock()
+
+
+def _create_host_volume(parent_folder: Path) -> AkiHostVolume:
+    return AkiHostVolume(DOCKER_CLIENT, 'container', 'ENV', parent_folder, ['share'])
+
+
+def test_host_move_to_trash(tmp_path: Path):
+    (tmp_path / 'dev').mkdir()
+    (tmp_path / 'dev/file').write_text('content')
+    aki_volume = _create_host_volume(tmp_path)
+
+    assert aki_volume.move_to_trash(Volume(str(tmp_path / 'dev'), 'dev')) is True
+
+    assert not (tmp_path / 'dev').exists()
+    trash = list(aki_volume.fetch_trash())
+    assert len(trash) == 1
+    assert trash[0].aki_name.startswith('dev.')
+    assert (Path(trash[0].external_name) / 'file').read_text() == 'content'
+
+
+def test_host_move_to_trash_not_exists(tmp_path: Path):
+    aki_volume = _create_host_volume(tmp_path)
+
+    assert aki_volume.move_to_trash(Volume(str(tmp_path / 'dev'), 'dev')) is False
+
+
+def test_host_move_to_trash_in_container(tmp_path: Path, monkeypatch):
+    (tmp_path / 'dev').mkdir()
+    docker_client = MagicMock()
+    aki_volume = AkiHostVolume(docker_client, 'container', 'ENV', tmp_path)
+
+    def rename(source, destination):
+        raise PermissionError(13, 'Permission denied')
+
+    monkeypatch.setattr(os, 'rename', rename)
+
+    assert aki_volume.move_to_trash(Volume(str(tmp_path / 'dev'), 'dev')) is True
+    options = docker_client.containers.run.call_args[1]
+    assert options['command'][4] == '/volumes/dev'
+    assert options['command'][5].startswith('/volumes/.aki-trash/dev.')
+    assert options['volumes'] == [f'{tmp_path}:/volumes']
+
+    # Without docker the volume is removed at once, the user is told why
+    docker_client.containers.run.side_effect = docker.errors.APIError('unavailable')
+    assert aki_volume.move_to_trash(Volume(str(tmp_path / 'dev'), 'dev')) is False
+    assert not (tmp_path / 'dev').exists()
+
+
+def test_host_fetch_volumes_hide_trash(tmp_path: Path):
+    for name in ['dev', 'test', 'share']:
+        (tmp_path / name).mkdir()
+    aki_volume = _create_host_volume(tmp_path)
+    aki_volume.move_to_trash(Volume(str(tmp_path / 'test'), 'test'))
+
+    assert [volume.aki_name for volume in aki_volume.fetch_volumes()] == ['dev']
+
+
+def test_host_fetch_volumes_folders_only(tmp_path: Path):
+    (tmp_path / 'dev').mkdir()
+    (tmp_path / 'file').write_text('content')
+    (tmp_path / 'link').symlink_to(tmp_path / 'dev')
+    aki_volume = _create_host_volume(tmp_path)
+
+    volumes = sorted(aki_volume.fetch_volumes(), key=lambda volume: volume.aki_name)
+
+    assert volumes == [Volume(str(tmp_path / 'dev'), 'dev'), Volume(str(tmp_path / 'link'), 'link')]
+
+
+def test_host_fetch_volumes_cache(tmp_path: Path, monkeypatch):
+    (tmp_path / 'dev').mkdir()
+    os.utime(tmp_path, (time.time() - 60, time.time() - 60))
+    scandir = MagicMock(side_effect=os.scandir)
+    monkeypatch.setattr('aki.volume.os.scandir', scandir)
+    aki_volume = _create_host_volume(tmp_path)
+
+    assert [volume.aki_name for volume in aki_volume.fetch_volumes()] == ['dev']
+    assert [volume.aki_name for volume in aki_volume.fetch_volumes()] == ['dev']
+    assert scandir.call_count == 1
+
+    # A new volume changes the mtime of the parent folder, a folder changed recently is not cached
+    (tmp_path / 'feature').mkdir()
+    assert sorted(volume.aki_name for volume in aki_volume.fetch_volumes()) == ['dev', 'feature']
+    assert sorted(volume.aki_name for volume in aki_volume.fetch_volumes()) == ['dev', 'feature']
+    assert scandir.call_count == 3
+
+
+def test_host_purge_trash(tmp_path: Path):
+    (tmp_path / 'dev/folder').mkdir(parents=True)
+    aki_volume = _create_host_volume(tmp_path)
+    aki_volume.move_to_trash(Volume(str(tmp_path / 'dev'), 'dev'))
+
+    aki_volume.purge_trash()
+
+    assert list(aki_volume.fetch_trash()) == []
+
+
+class _FakeDockerVolume:
+    def __init__(self, volumes: dict, name: str, options: dict = None, labels: dict = None):
+        self.volumes = volumes
+        self.name = name
+        self.attrs = {'Name': name, 'Mountpoint': f'/docker/volumes/{name}/_data', 'Options': options,
+                      'Labels': labels}
+
+    def remove(self):
+        del self.volumes[self.name]
+
+
+class _FakeDockerClient:
+    """
+    Docker volumes in memory, containers.run lists layers written by commands in non_empty_layers
+    """
+
+    def __init__(self):
+        self.docker_volumes = {}
+        self.non_empty_layers = set()
+        self.commands = []
+        self.images = MagicMock()
+        self.volumes = MagicMock()
+        self.volumes.create.side_effect = self._create
+        self.volumes.get.side_effect = self._get
+        self.volumes.list.side_effect = lambda filters: list(self.docker_volumes.values())
+        self.containers = MagicMock()
+        self.containers.run.side_effect = self._run
+
+    def _create(self, name, driver='local', driver_opts=None, labels=None):
+        self.docker_volumes[name] = _FakeDockerVolume(self.docker_volumes, name, driver_opts, labels)
+        return self.docker_volumes[name]
+
+    def _get(self, name):
+        if name not in self.docker_volumes:
+            raise docker.errors.NotFound(name)
+        return self.docker_volumes[name]
+
+    def _run(self, image, command, volumes, **kwargs):
+        self.commands.append(command)
+        layer_name = volumes[0].split(':')[0]
+        return b'file\n' if command.startswith('ls') and layer_name in self.non_empty_layers else b''
+
+
+def _mount(client: _FakeDockerClient, name: str) -> _OverlayMount:
+    return _OverlayMount.from_options(client.docker_volumes[name].attrs['Options'])
+
+
+def _layer_name(upper_dir: str) -> str:
+    return upper_dir.split('/')[-3]
+
+
+def test_overlay_copy_full_volume():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+
+    dev_mount, feature_mount = _mount(client, 'pg_dev'), _mount(client, 'pg_feature')
+    assert dev_mount.lower_dirs == feature_mount.lower_dirs
+    assert len(dev_mount.lower_dirs) == 1
+    assert dev_mount.upper_dir != feature_mount.upper_dir
+    assert any('cp -a /source/. /layer/upper' in command for command in client.commands)
+    assert [volume.aki_name for volume in aki_volume.fetch_volumes()] == ['dev', 'feature']
+
+
+def test_overlay_copy_keep_source_without_changes():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+    dev_mount = _mount(client, 'pg_dev')
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_fix', 'fix'))
+
+    assert _mount(client, 'pg_dev') == dev_mount
+    assert _mount(client, 'pg_fix').lower_dirs == dev_mount.lower_dirs
+
+
+def test_overlay_copy_freeze_changes_of_source():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+    dev_mount = _mount(client, 'pg_dev')
+    client.non_empty_layers.add(_layer_name(dev_mount.upper_dir))
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_fix', 'fix'))
+
+    assert _mount(client, 'pg_fix').lower_dirs == [dev_mount.upper_dir, *dev_mount.lower_dirs]
+    assert _mount(client, 'pg_dev').lower_dirs == _mount(client, 'pg_fix').lower_dirs
+    assert _mount(client, 'pg_dev').upper_dir != dev_mount.upper_dir
+    assert _mount(client, 'pg_feature') is not None
+
+
+def test_overlay_remove_unused_layers():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+    feature_mount = _mount(client, 'pg_feature')
+
+    aki_volume.remove(Volume('pg_feature', 'feature'))
+    assert _layer_name(feature_mount.upper_dir) not in client.docker_volumes
+    assert _layer_name(feature_mount.lower_dirs[0]) in client.docker_volumes
+
+    aki_volume.remove(Volume('pg_dev', 'dev'))
+    assert client.docker_volumes == {}
+
+
+def test_overlay_keep_layers_during_copy(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv(LOCK_FOLDER_ENV, str(tmp_path))
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+    feature_mount = _mount(client, 'pg_feature')
+    assert aki_volume.is_copy_writing_source(Volume('pg_dev', 'dev'))
+
+    # Another process copies a volume of the type, its new layers are not used yet
+    fd = os.open(_lock_path(overlay_layers_lock_key('pg_')), os.O_RDWR | os.O_CREAT)
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    aki_volume.remove(Volume('pg_feature', 'feature'))
+    assert _layer_name(feature_mount.upper_dir) in client.docker_volumes
+
+    os.close(fd)
+    aki_volume.remove(Volume('pg_dev', 'dev'))
+    assert client.docker_volumes == {}
+
+
+def test_overlay_flatten():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+
+    assert aki_volume.flatten(Volume('pg_feature', 'feature')) is True
+
+    assert _mount(client, 'pg_feature') is None
+    assert 'cp -a /source/. /destination' in client.commands
+    dev_mount = _mount(client, 'pg_dev')
+    assert set(client.docker_volumes) == {'pg_dev', 'pg_feature', _layer_name(dev_mount.upper_dir),
+                                          _layer_name(dev_mount.lower_dirs[0])}
+    assert aki_volume.flatten(Volume('pg_feature', 'feature')) is False
+
+
+def test_container_copy_progress():
+    client = MagicMock()
+    container = client.containers.run.return_value
+    container.logs.return_value = iter([b'cp: some message\naki-progress 10', b'24 7\n', b'aki-progress 2048 9'])
+    container.wait.return_value = {'StatusCode': 0}
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_')
+    progress = CopyProgress('docker')
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'), progress=progress)
+
+    assert progress.done_bytes == 2048 * 1024
+    assert progress.done_files == 9
+    assert 'du -ak /destination' in client.containers.run.call_args.kwargs['command']
+    container.remove.assert_called_once_with(force=True)
+
+
+@pytest.mark.skipif(not platform_info.is_linux(), reason='the progress loop runs busybox or coreutils commands')
+def test_container_progress_loop_backoff(tmp_path: Path):
+    # Fake sleep records its durations and ends the loop after 3 measures, each measure takes 3 seconds of fake date
+    (tmp_path / 'bin').mkdir()
+    (tmp_path / 'bin/sleep').write_text('#!/bin/sh\necho $1 >> "$AKI_TEST_FOLDER/sleeps"\n'
+                                        '[ $(wc -l < "$AKI_TEST_FOLDER/sleeps") -le 3 ]\n')
+    (tmp_path / 'bin/date').write_text('#!/bin/sh\necho x >> "$AKI_TEST_FOLDER/dates"\n'
+                                       'echo $(( $(wc -l < "$AKI_TEST_FOLDER/dates") * 3 ))\n')
+    for script in (tmp_path / 'bin').iterdir():
+        script.chmod(0o755)
+    (tmp_path / 'destination').mkdir()
+    (tmp_path / 'destination/file').write_bytes(b'x' * 4096)
+    environment = {**os.environ, 'PATH': f'{tmp_path / "bin"}:{os.environ["PATH"]}', 'AKI_TEST_FOLDER': str(tmp_path)}
+
+    output = subprocess.run(['sh', '-c', _progress_loop_script(str(tmp_path / 'destination'))], env=environment,
+                            capture_output=True, text=True).stdout
+
+    assert (tmp_path / 'sleeps').read_text().split() == ['2', '30', '30', '30']
+    assert output.splitlines()[0].split()[::2] == ['aki-progress', '2']
+
+
+def test_docker_fetch_sizes_single_df():
+    client = MagicMock()
+    client.df.return_value = {'Volumes': [{'Name': 'pg_dev', 'UsageData': {'Size': 2048}},
+                                          {'Name': 'pg_test', 'UsageData': {'Size': -1}},
+                                          {'Name': 'other', 'UsageData': {'Size': 10}}]}
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_')
+
+    sizes = aki_volume.fetch_sizes([Volume('pg_dev', 'dev'), Volume('pg_test', 'test'), Volume('pg_new', 'new')])
+
+    assert sizes == {'dev': 2048, 'test': None, 'new': None}
+    client.df.assert_called_once()
+
+
+def test_docker_free_space_remote_daemon():
+    client = MagicMock()
+    client.api.base_url = 'http://10.0.0.2:2375'
+    client.containers.run.return_value = b'Filesystem 1024-blocks Used Available Capacity Mounted on\n' \
+                                         b'/dev/sda1 1000 400 600 40% /volume\n'
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_')
+
+    free_space = aki_volume.fetch_free_space(Volume('pg_dev', 'dev'))
+
+    # The docker root folder of a remote daemon is not a folder of this host
+    assert free_space == FreeSpace('docker:http://10.0.0.2:2375', 600 * 1024)
+    client.info.assert_not_called()
+
+
+def test_container_copy_progress_error():
+    client = MagicMock()
+    container = client.containers.run.return_value
+    container.logs.side_effect = lambda stream=False, follow=False, **kwargs: iter([]) if stream else b'cp: error'
+    container.wait.return_value = {'StatusCode': 1}
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_')
+
+    with pytest.raises(docker.errors.ContainerError):
+        aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'), progress=CopyProgress('docker'))
+
+    container.remove.assert_called_once_with(force=True)
+
+
+def test_docker_copy_create_labeled_volume():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_', labels={LABEL_AKI_TYPE: 'postgres'})
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+
+    labels = client.docker_volumes['pg_feature'].attrs['Labels']
+    assert labels[LABEL_AKI_TYPE] == 'postgres'
+    assert labels[LABEL_AKI_PREFIX] == 'pg_'
+    assert labels[LABEL_AKI_NAME] == 'feature'
+    assert labels[LABEL_AKI_SOURCE] == 'dev'
+    volume = next(volume for volume in aki_volume.fetch_volumes() if volume.aki_name == 'feature')
+    assert volume.source == 'dev'
+    assert volume.created_at is not None
+
+
+def test_docker_copy_sharded():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    listing = 'aki-shard\t8\t2\t.\naki-shard\t409600\t50\t./base\naki-shard\t409600\t50\t./pg_wal\n'
+    client.containers.run.side_effect = lambda image, command, **kwargs: \
+        listing.encode() if 'du -ak' in command else b''
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_', io_policy=IoPolicy(workers=2))
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+
+    command = client.containers.run.call_args.kwargs['command']
+    assert 'cp -a /source/base/. /destination/base' in command
+    assert 'cp -a /source/pg_wal/. /destination/pg_wal' in command
+
+
+def test_docker_copy_single_worker():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_', io_policy=IoPolicy(workers=1))
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+
+    assert client.commands == ['cp -a /source/. /destination']
+
+
+def test_docker_sync():
+    client = _FakeDockerClient()
+    client.info = MagicMock(return_value={'SystemTime': '2024-01-02T03:04:05.5Z'})
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_')
+
+    since = aki_volume.fetch_file_time()
+    aki_volume.sync(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'), since)
+
+    assert since == 1704164645.5
+    assert 'since=1704164643' in client.commands[0]
+    assert client.containers.run.call_args.kwargs['volumes'] == ['pg_dev:/source:ro', 'pg_feature:/destination']
+
+
+def test_parse_docker_time():
+    assert _parse_docker_time('2024-01-02T03:04:05.123456789+01:00') == pytest.approx(1704161045.123456789)
+    assert _parse_docker_time('2024-01-02T03:04:05Z') == 1704164645
+    assert _parse_docker_time('yesterday') is None
+    assert _parse_docker_time(None) is None
+
+
+def test_docker_fetch_volumes_skip_longer_prefix():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev')
+    client.volumes.create('pg_data_dev', labels={LABEL_AKI_PREFIX: 'pg_data_', LABEL_AKI_NAME: 'dev'})
+    client.volumes.create('pg_feature', labels={LABEL_AKI_PREFIX: 'pg_', LABEL_AKI_CREATED_AT: 'invalid'})
+    aki_volume = AkiDockerVolume(client, 'container', 'ENV', 'pg_')
+
+    volumes = list(aki_volume.fetch_volumes())
+
+    assert volumes == [Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature')]
+    assert volumes[1].created_at is None
+
+
+def test_overlay_copy_labels():
+    client = _FakeDockerClient()
+    client.volumes.create('pg_dev', labels={LABEL_AKI_PREFIX: 'pg_', LABEL_AKI_NAME: 'dev'})
+    aki_volume = AkiOverlayVolume(client, 'container', 'ENV', 'pg_')
+
+    aki_volume.copy(Volume('pg_dev', 'dev'), Volume('pg_feature', 'feature'))
+    aki_volume.flatten(Volume('pg_feature', 'feature'))
+
+    # The source is created again as an overlay with its labels
+    assert client.docker_volumes['pg_dev'].attrs['Labels'] == {LABEL_AKI_PREFIX: 'pg_', LABEL_AKI_NAME: 'dev'}
+    assert client.docker_volumes['pg_feature'].attrs['Labels'][LABEL_AKI_SOURCE] == 'dev'
@@ -0,0 +1,126 @@
+import os
+from pathlib import Path
+from typing import List, Union
+
+import pytest
+
+from aki import platform_info
+from aki.error import ScriptError
+from aki._watch import HeadEvents, InotifyHeadEvents, PollingHeadEvents, find_git_head, read_branch, watch_branch
+
+
+def _checkout(head_path: Path, branch: Union[str, None]):
+    # Same as git: write a lock file then rename it. No branch detaches HEAD
+    lock_path = head_path.with_name('HEAD.lock')
+    lock_path.write_text(f'ref: refs/heads/{branch}\n' if branch else '4b825dc642cb6eb9a060e54bf8d69288fbee4904\n')
+    os.replace(lock_path, head_path)
+
+
+class _ScriptedEvents(HeadEvents):
+    """
+    Replay checkouts, a None wait (watch idle) checks out the next group of branches one by one
+    """
+
+    def __init__(self, head_path: Path, checkout_groups: List[List[Union[str, None]]]):
+        self.head_path = head_path
+        self.checkout_groups = checkout_groups
+        self.pending_checkouts: List[Union[str, None]] = []
+
+    def wait(self, timeout):
+        if timeout is None:
+            if not self.checkout_groups:
+                raise KeyboardInterrupt()
+            self.pending_checkouts = self.checkout_groups.pop(0)
+
+        if not self.pending_checkouts:
+            return False
+
+        _checkout(self.head_path, self.pending_checkouts.pop(0))
+        return True
+
+
+def test_read_branch(tmp_path: Path):
+    head_path = tmp_path / 'HEAD'
+    _checkout(head_path, 'feature/login')
+
+    assert read_branch(head_path) == 'feature/login'
+
+
+def test_read_branch_detached(tmp_path: Path):
+    head_path = tmp_path / 'HEAD'
+    _checkout(head_path, None)
+
+    assert read_branch(head_path) is None
+    assert read_branch(tmp_path / 'missing') is None
+
+
+def test_find_git_head_in_parent(tmp_path: Path):
+    (tmp_path / '.git').mkdir()
+    folder = tmp_path / 'docker' / 'dev'
+    folder.mkdir(parents=True)
+
+    assert find_git_head(folder) == tmp_path / '.git' / 'HEAD'
+
+
+def test_find_git_head_of_worktree(tmp_path: Path):
+    git_folder = tmp_path / 'repo' / '.git' / 'worktrees' / 'feature'
+    git_folder.mkdir(parents=True)
+    worktree = tmp_path / 'feature'
+    worktree.mkdir()
+    (worktree / '.git').write_text(f'gitdir: {git_folder}\n')
+
+    assert find_git_head(worktree) == git_folder.resolve() / 'HEAD'
+
+
+def test_find_git_head_not_in_repository(tmp_path: Path):
+    with pytest.raises(ScriptError):
+        find_git_head(tmp_path)
+
+
+def test_watch_branch_coalesce_checkouts(tmp_path: Path):
+    head_path = tmp_path / 'HEAD'
+    _checkout(head_path, 'master')
+    branches = []
+
+    events = _ScriptedEvents(head_path, [['a', 'b', 'c'], ['d', 'master'], ['e']])
+    with pytest.raises(KeyboardInterrupt):
+        watch_branch(head_path, branches.append, debounce=0, events=events)
+
+    assert branches == ['c', 'master', 'e']
+
+
+def test_watch_branch_ignore_same_branch_and_detached_head(tmp_path: Path):
+    head_path = tmp_path / 'HEAD'
+    _checkout(head_path, 'master')
+    branches = []
+
+    events = _ScriptedEvents(head_path, [['master'], ['a', None], ['master'], ['c']])
+    with pytest.raises(KeyboardInterrupt):
+        watch_branch(head_path, branches.append, debounce=0, events=events)
+
+    assert branches == ['c']
+
+
+def test_polling_head_events(tmp_path: Path):
+    head_path = tmp_path / 'HEAD'
+    _checkout(head_path, 'master')
+    events = PollingHeadEvents(head_path, interval=0.01)
+
+    assert not events.wait(0.05)
+    _checkout(head_path, 'feature')
+    assert events.wait(0.05)
+
+
+@pytest.mark.skipif(not platform_info.is_linux(), reason='inotify is only available on linux')
+def test_inotify_head_events(tmp_path: Path):
+    head_path = tmp_path / 'HEAD'
+    _checkout(head_path, 'master')
+    events = InotifyHeadEvents(head_path)
+    try:
+        (tmp_path / 'index').write_text('other file')
+        assert not events.wait(0.05)
+
+        _checkout(head_path, 'feature')
+        assert events.wait(1)
+    finally:
+        events.close()
@@ -0,0 +1,84 @@
+import argparse
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from aki import _workspace as workspace_loader
+from aki import cli
+from aki.error import ScriptError
+
+
+def _create_project(folder: Path, aki_file_name: str = 'aki.yaml') -> Path:
+    folder.mkdir(parents=True)
+    aki_file = folder / aki_file_name
+    aki_file.write_text('aki: {}\n')
+    return aki_file
+
+
+@patch('docker.from_env')
+def test_import_workspace(from_env, tmp_path: Path):
+    backend_file = _create_project(tmp_path / 'backend')
+    front_file = _create_project(tmp_path / 'apps/front', 'aki.yml')
+    workspace_file = tmp_path / 'workspace.yaml'
+    workspace_file.write_text('workspace:\n  parallel: 2\n  projects:\n    - backend\n    - apps/front/aki.yml\n')
+
+    workspace = workspace_loader.import_workspace(workspace_file)
+
+    assert workspace.docker_client == from_env.return_value
+    assert workspace.parallel == 2
+    assert [(project.name, project.aki_file) for project in workspace.projects] == [
+        ('backend', backend_file),
+        ('apps/front', front_file),
+    ]
+
+
+@patch('docker.from_env')
+def test_import_workspace_default_parallel(_, tmp_path: Path):
+    _create_project(tmp_path / 'backend')
+    workspace_file = tmp_path / 'workspace.yaml'
+    workspace_file.write_text('workspace:\n  projects:\n    - backend\n')
+
+    assert workspace_loader.import_workspace(workspace_file).parallel == workspace_loader.DEFAULT_WORKSPACE_PARALLEL
+
+
+@patch('docker.from_env')
+def test_import_workspace_error_missing_project(_, tmp_path: Path):
+    workspace_file = tmp_path / 'workspace.yaml'
+    workspace_file.write_text('workspace:\n  projects:\n    - backend/aki.yaml\n')
+
+    with pytest.raises(ScriptError, match='no such file or directory'):
+        workspace_loader.import_workspace(workspace_file)
+
+
+@patch('docker.from_env')
+def test_import_workspace_error_duplicated_project(_, tmp_path: Path):
+    _create_project(tmp_path / 'backend')
+    workspace_file = tmp_path / 'workspace.yaml'
+    workspace_file.write_text('workspace:\n  projects:\n    - backend\n    - backend/aki.yaml\n')
+
+    with pytest.raises(ScriptError, match='contains several times backend'):
+        workspace_loader.import_workspace(workspace_file)
+
+
+def test_run_workspace_ls_records(monkeypatch, capsys):
+    def run_project(arguments, aki_file: Path):
+        if aki_file.name == 'broken.yaml':
+            raise ScriptError('broken project')
+        cli.print_info('not a record')
+        cli.project.record_sink({'project': cli.project.workspace_name, 'name': 'dev'})
+
+    monkeypatch.setattr(cli.config_importer, 'import_config', lambda aki_file, docker_client: aki_file)
+    monkeypatch.setattr(cli, '_run_project', run_project)
+    projects = [workspace_loader.WorkspaceProject(name, Path(f'{name}.yaml')) for name in ['backend', 'front', 'broken']]
+    arguments = argparse.Namespace(action='ls', ls_format='json')
+
+    assert not cli.run_workspace(arguments, workspace_loader.Workspace(MagicMock(), projects, parallel=2))
+
+    out, err = capsys.readouterr()
+    # Records are serialized once for the workspace, other lines of the projects do not break the json output
+    assert sorted((record['project'], record['name']) for record in json.loads(out)) == [
+        ('backend', 'dev'), ('front', 'dev')
+    ]
+    assert 'not a record' in err and 'broken project' in err